@@ -3,13 +3,17 @@ from datetime import datetime, timezone
 import logging
 import math
 import os
+import sys
 # import pprint
 
 import ee
 from google.cloud import storage
 import osgeo
 from osgeo import gdal, ogr, osr
-import pandas as pd
+
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crop_type_remap
 
 logging.getLogger('earthengine-api').setLevel(logging.INFO)
 logging.getLogger('googleapiclient').setLevel(logging.INFO)
@@ -110,17 +114,11 @@ def main(YEARS, overwrite_flag=False):
 
         # Load the California to CDL remap (MB-Changed to read a single remap table for 2016-2023)
         if year == 2014:
-            remap_df = pd.read_csv(
-                os.path.join(map_ws, f'ca{year}_cdl_remap_table.csv'), comment='#'
-            )
+            remap_path = os.path.join(map_ws, f'ca{year}_cdl_remap_table.csv')
         else:
-            remap_df = pd.read_csv(
-                os.path.join(map_ws, f'ca2016_2023_cdl_remap_table.csv'), comment='#'
-            )
-        # remap_df = pd.read_csv(
-        #     os.path.join(map_ws, f'ca{year}_cdl_remap_table.csv'), comment='#'
-        # )
-        ca_cdl_remap = dict(zip(remap_df.IN, remap_df.OUT))
+            remap_path = os.path.join(map_ws, f'ca2016_2023_cdl_remap_table.csv')
+        # remap_path = os.path.join(map_ws, f'ca{year}_cdl_remap_table.csv')
+        ca_cdl_remap = crop_type_remap.load_remap_dict(remap_path)
 
 
         src_path = src_paths[year]
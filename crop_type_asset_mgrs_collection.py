@@ -5,16 +5,29 @@
 
 import argparse
 from datetime import datetime, timezone
+from functools import partial
+import hashlib
+import json
 import logging
 import os
 import pprint
 
 import ee
+from google.cloud import storage
 import pandas as pd
 
 import openet.core
 import openet.core.utils as utils
 
+from crop_type_cdl_annual_remap import cdl_annual_remap_image
+import crop_type_remap
+from ee_async import EEAsyncClient
+from ee_state_cache import EEStateCache
+import export_manifest
+from export_scheduler import ExportScheduler
+from mgrs_state_table import load_mgrs_state_table
+from run_journal import RunJournal
+
 logging.getLogger('earthengine-api').setLevel(logging.INFO)
 logging.getLogger('googleapiclient').setLevel(logging.INFO)
 logging.getLogger('requests').setLevel(logging.INFO)
@@ -24,6 +37,37 @@ TOOL_NAME = 'crop_type_asset_mgrs_collection'
 # TOOL_NAME = os.path.basename(__file__)
 TOOL_VERSION = '0.3.1'
 
+PROJECT_NAME = 'openet'
+
+# California MGRS tiles that are built with the LandIQ images
+CA_MGRS_TILES = ['10S', '10T', '11S']
+
+# CDL remapped version of the NALCMS 2020 image classes
+# Using 47 for the ag class for now
+# Mapping the polar classes to 0 for now (11, 12, 13 lichen-moss)
+# TODO: Doublecheck remap values
+NALCMS_CDL_REMAP = [
+    [1, 142],   # Temperate or sub-polar needleleaf forest
+    [2, 142],   # Sub-polar taiga needleleaf forest
+    [3, 142],   # Tropical or sub-tropical broadleaf evergreen forest
+    [4, 141],   # Tropical or sub-tropical broadleaf deciduous forest
+    [5, 141],   # Temperate or sub-polar broadleaf deciduous forest
+    [6, 143],   # Mixed forest
+    [7, 152],   # Tropical or sub-tropical shrubland
+    [8, 152],   # Temperate or sub-polar shrubland
+    [9, 176],   # Tropical or sub-tropical grassland
+    [10, 176],  # Temperate or sub-polar grassland
+    [11, 0],    # Sub-polar or polar shrubland-lichen-moss
+    [12, 0],    # Sub-polar or polar grassland-lichen-moss
+    [13, 0],    # Sub-polar or polar barren-lichen-moss
+    [14, 195],  # Wetland
+    [15, 47],   # Cropland
+    [16, 131],  # Barren lands
+    [17, 123],  # Urban and built-up
+    [18, 111],  # Water
+    [19, 112],  # Snow and ice
+]
+
 
 def main(
         years=None,
@@ -31,7 +75,18 @@ def main(
         utm_zones=None,
         overwrite_flag=False,
         delay=0,
-        gee_key_file=None
+        gee_key_file=None,
+        max_tasks=0,
+        max_retries=2,
+        workers=4,
+        changed_only_flag=False,
+        stack_flag=False,
+        plan_path=None,
+        plan_eecu_rate=2.0,
+        chunks=1,
+        gcs_flag=False,
+        resume_flag=False,
+        histogram_flag=False,
         ):
     """Build and ingest crop type MGRS tiles from a feature collection
 
@@ -46,6 +101,50 @@ def main(
         Delay time between each export task (the default is 0).
     gee_key_file : str, None, optional
         Earth Engine service account JSON key file (the default is None).
+    max_tasks : int, optional
+        Maximum number of export tasks in flight (the default is 0).
+        If 0, all tasks are started without waiting for them to finish.
+    max_retries : int, optional
+        Number of times a failed export task will be resubmitted
+        (the default is 2).  Only used if max_tasks is set.
+    workers : int, optional
+        Number of threads used to build and start the export tasks
+        (the default is 4).
+    changed_only_flag : bool, optional
+        If True, only rebuild existing images whose inputs have changed
+        since they were built (the default is False).
+    stack_flag : bool, optional
+        If True, export a single multi-band image with a band for each year
+        for each MGRS tile instead of the year images.  The year images are
+        not built in the export collection and are read from the stack by
+        band selection (see crop_type_stack.py).  An existing stack is only
+        rebuilt if all of its years are in the run (the default is False).
+    plan_path : str, optional
+        If set, write the planned action for each tile year to this JSON or
+        CSV file (with a pixel and EECU estimate) without starting any tasks
+        or modifying any assets (the default is None).
+    plan_eecu_rate : float, optional
+        Estimated EECU-hours for compositing one billion tile pixels, used
+        for the plan EECU estimate (the default is 2.0).  The default is a
+        placeholder, not a measured rate.  Calibrate it from completed export
+        tasks as the "batchEecuUsageSeconds" of the task status divided by
+        3600 and by the tile pixel count (in billions) in the plan.
+    chunks : int, optional
+        Split each MGRS tile into a chunks x chunks grid of sub-tiles that are
+        exported separately and then mosaicked into the tile image
+        (the default is 1, export the full tile).
+    gcs_flag : bool, optional
+        If True, export Cloud-Optimized GeoTIFFs to the bucket (with a JSON
+        sidecar of the image properties) instead of exporting to the asset
+        collection.  The files are ingested by crop_type_gcs_ingest.py
+        (the default is False).
+    resume_flag : bool, optional
+        If True, skip the tile years that were completed, copied, or skipped
+        (or are still running) in the last run in the run journal
+        (the default is False).
+    histogram_flag : bool, optional
+        If True, export a CSV table of the class pixel counts of each tile
+        image to the bucket (the default is False).
 
     Returns
     -------
@@ -58,11 +157,25 @@ def main(
     project_id = 'projects/openet/assets'
 
     export_coll_id = f'{project_id}/crop_type/v2023a'
+    # Multi-band (one band per year) tile images for the stack export mode
+    stack_coll_id = f'{export_coll_id}_stack'
+    # Sub-tile images for the chunked export mode
+    chunk_coll_id = f'{export_coll_id}_chunks'
+
+    # Cloud-Optimized GeoTIFF output folder for the bucket export mode
+    gcs_bucket_name = 'openet'
+    gcs_folder = f'crop_type/images/{export_coll_id.split("/")[-1]}'
+    # Class histogram table folder (one CSV per tile image)
+    histogram_folder = f'crop_type/histograms/{export_coll_id.split("/")[-1]}'
     # export_band_name = 'crop_type'
 
     crop_type_folder_id = f'{project_id}/features/fields/2024-02-01'
     # crop_type_folder_id = f'{project_id}/features/fields/temp'
 
+    # Field crop types rasterized to the MGRS tiles by crop_type_field_rasters.py
+    # The tile images are used instead of rasterizing the field collections
+    field_raster_coll_id = f'{project_id}/crop_type/field_rasters/2024-02-01'
+
     # Using ERA5-Land MGRS tiles to avoid clipping outside CONUS
     mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
     mgrs_mask_coll_id = f'{project_id}/mgrs/global/era5land/zone_mask'
@@ -71,13 +184,29 @@ def main(
 
     cdl_coll_id = 'USDA/NASS/CDL'
 
+    # Annual crop remapped CDL images built by crop_type_cdl_annual_remap.py
+    # The images are only used if they were built with the current remap
+    cdl_remap_coll_id = f'{project_id}/crop_type/cdl_annual_remap'
+
+    # CDL remapped NALCMS MGRS tile images built by crop_type_nalcms_remap.py
+    # The images are only used if they were built with the current remap
+    nalcms_remap_coll_id = f'{project_id}/crop_type/nalcms_cdl_remap'
+
     # California specific crop type images built from LandIQ crop mapping data
     ca_coll_id = f'{project_id}/crop_type/california'
 
+    # California MGRS tile masks built by crop_type_ca_mask.py
+    # The masks are used instead of clipping to the California geometry
+    ca_mask_coll_id = f'{project_id}/crop_type/ca_mask'
+
     # The states collection is being used to select the field collections (by name)
     states_coll_id = 'TIGER/2018/States'
     states_name_property = 'STUSPS'
 
+    # Precomputed MGRS tile to state intersection table
+    # The table is rebuilt if the MGRS or state collections change
+    mgrs_state_table_path = os.path.join(os.getcwd(), 'mgrs_state_table.json')
+
     supported_mgrs_tiles = [
         '10S', '10T', '10U', '11R', '11S', '11T', '11U', '12R', '12S', '12T', '12U',
         '13R', '13S', '13T', '13U', '14R', '14S', '14T', '14U', '15R', '15S', '15T', '15U',
@@ -93,6 +222,17 @@ def main(
 
     annual_remap_path = os.path.join(os.getcwd(), 'cdl_annual_crop_remap_table.csv')
 
+    # The manifest records the inputs used to build each image in the collection
+    manifest_path = os.path.join(
+        os.getcwd(), f'{export_coll_id.split("/")[-1]}_manifest.json'
+    )
+
+    # The journal records the state of each tile year as the tool runs
+    #   so an interrupted run can be resumed
+    journal_path = os.path.join(
+        os.getcwd(), f'{export_coll_id.split("/")[-1]}_journal.jsonl'
+    )
+
     year_min = 1985
     year_max = 2023
 
@@ -125,44 +265,29 @@ def main(
         mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs[:2] in utm_zones]
     logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
 
+    if stack_flag and chunks > 1:
+        logging.error('\nThe stack and chunk export modes can not be combined, exiting')
+        return False
+    elif stack_flag and gcs_flag:
+        logging.error('\nThe stack and bucket export modes can not be combined, exiting')
+        return False
+
 
     # Load the CDL annual crop remap
-    # TODO: Get the script path instead (in case it is different than the cwd)
-    remap_df = pd.read_csv(annual_remap_path, comment='#').sort_values(by='IN')
-    cdl_annual_remap = dict(zip(remap_df.IN, remap_df.OUT))
-    # Set all unassigned values to remap to themselves
-    for cdl_code in set(range(1, 256)) - set(cdl_annual_remap.keys()):
-        cdl_annual_remap[cdl_code] = cdl_code
-    cdl_remap_in, cdl_remap_out = map(list, zip(*cdl_annual_remap.items()))
+    # All unassigned values are set to remap to themselves
+    cdl_annual_lut = crop_type_remap.load_remap_table(annual_remap_path, identity=True)
+    cdl_remap_in, cdl_remap_out = cdl_annual_lut.ee_remap_args()
 
 
     # Add a CDL remapped version of the NALCMS 2020 image last
-    # Using 47 for the ag class for now
-    # Mapping the polar classes to 0 for now (11, 12, 13 lichen-moss)
-    # TODO: Doublecheck remap values
     nalcms_img_id = 'USGS/NLCD_RELEASES/2020_REL/NALCMS'
-    nalcms_cdl_remap = [
-        [1, 142],   # Temperate or sub-polar needleleaf forest
-        [2, 142],   # Sub-polar taiga needleleaf forest
-        [3, 142],   # Tropical or sub-tropical broadleaf evergreen forest
-        [4, 141],   # Tropical or sub-tropical broadleaf deciduous forest
-        [5, 141],   # Temperate or sub-polar broadleaf deciduous forest
-        [6, 143],   # Mixed forest
-        [7, 152],   # Tropical or sub-tropical shrubland
-        [8, 152],   # Temperate or sub-polar shrubland
-        [9, 176],   # Tropical or sub-tropical grassland
-        [10, 176],  # Temperate or sub-polar grassland
-        [11, 0],    # Sub-polar or polar shrubland-lichen-moss
-        [12, 0],    # Sub-polar or polar grassland-lichen-moss
-        [13, 0],    # Sub-polar or polar barren-lichen-moss
-        [14, 195],  # Wetland
-        [15, 47],   # Cropland
-        [16, 131],  # Barren lands
-        [17, 123],  # Urban and built-up
-        [18, 111],  # Water
-        [19, 112],  # Snow and ice
-    ]
-    nalcms_cdl_remap = list(zip(*nalcms_cdl_remap))
+    nalcms_lut = crop_type_remap.RemapLUT(NALCMS_CDL_REMAP)
+    nalcms_cdl_remap = nalcms_lut.ee_remap_args()
+
+    # Hash the remap tables so they can be included in the tile year fingerprints
+    remap_hash = hashlib.sha256(
+        f'{cdl_annual_lut.hash}{nalcms_lut.hash}'.encode()
+    ).hexdigest()
 
 
     logging.info('\nInitializing Earth Engine')
@@ -174,32 +299,113 @@ def main(
         ee.Initialize()
 
 
+    # The asset lists and task states are read from a local cache
+    #   that is refreshed incrementally
+    state_cache = EEStateCache()
+
     # Get current running tasks
-    tasks = utils.get_ee_tasks()
+    tasks = state_cache.get_ee_tasks()
     if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
         logging.debug(f'  Tasks: {len(tasks)}')
         input('ENTER')
 
 
+    # Independent metadata requests are made concurrently
+    ee_client = EEAsyncClient()
+
+    # Check which of the collections exist
+    coll_exists = ee_client.gather({
+        coll_id: ee_client.asset_exists(coll_id)
+        for coll_id in [
+            export_coll_id.rsplit('/', 1)[0], export_coll_id, stack_coll_id,
+            chunk_coll_id, field_raster_coll_id, ca_mask_coll_id,
+            nalcms_remap_coll_id, cdl_remap_coll_id,
+        ]
+    })
+
+
     # Build the export collection if it doesn't exist
-    if not ee.data.getInfo(export_coll_id.rsplit('/', 1)[0]):
+    if plan_path:
+        pass
+    elif not coll_exists[export_coll_id.rsplit('/', 1)[0]]:
         logging.info('\nFolder does not exist and will be built'
                       '\n  {}'.format(export_coll_id.rsplit('/', 1)[0]))
         input('Press ENTER to continue')
         ee.data.createAsset({'type': 'FOLDER'}, export_coll_id.rsplit('/', 1)[0])
-    if not ee.data.getInfo(export_coll_id):
+    if plan_path:
+        pass
+    elif not coll_exists[export_coll_id]:
         logging.info('\nExport collection does not exist and will be built'
                      '\n  {}'.format(export_coll_id))
         input('Press ENTER to continue')
         ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, export_coll_id)
+        coll_exists[export_coll_id] = True
+    if stack_flag and not plan_path and not coll_exists[stack_coll_id]:
+        logging.info('\nStack collection does not exist and will be built'
+                     '\n  {}'.format(stack_coll_id))
+        input('Press ENTER to continue')
+        ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, stack_coll_id)
+        coll_exists[stack_coll_id] = True
+    if chunks > 1 and not gcs_flag and not plan_path and not coll_exists[chunk_coll_id]:
+        logging.info('\nChunk collection does not exist and will be built'
+                     '\n  {}'.format(chunk_coll_id))
+        input('Press ENTER to continue')
+        ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, chunk_coll_id)
+        coll_exists[chunk_coll_id] = True
 
 
     # Get list of existing images/files
     # CGM - Note that "projects/earthengine-legacy/assets/" is not in the ID
     logging.debug('\nGetting GEE asset list')
-    asset_list = utils.get_ee_assets(export_coll_id)
+    if coll_exists[export_coll_id]:
+        asset_list = state_cache.get_ee_assets(export_coll_id)
+    else:
+        asset_list = []
     if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
         pprint.pprint(asset_list[:10])
+    if stack_flag and coll_exists[stack_coll_id]:
+        stack_asset_list = state_cache.get_ee_assets(stack_coll_id)
+    elif stack_flag:
+        stack_asset_list = []
+
+    # Get the files in the bucket folder for the bucket export mode
+    # Images with a sidecar file are waiting to be ingested
+    gcs_files = set()
+    if gcs_flag:
+        logging.debug('\nGetting bucket file list')
+        gcs_bucket = storage.Client(project=PROJECT_NAME).bucket(gcs_bucket_name)
+        gcs_files = set(blob.name for blob in gcs_bucket.list_blobs(prefix=f'{gcs_folder}/'))
+
+    # Get the existing chunk images
+    chunk_asset_list = []
+    if chunks > 1 and not gcs_flag and coll_exists[chunk_coll_id]:
+        chunk_asset_list = state_cache.get_ee_assets(chunk_coll_id)
+
+
+    # Read the export manifest
+    logging.info('\nReading export manifest')
+    manifest = export_manifest.read_manifest(manifest_path, export_coll_id)
+    if changed_only_flag and asset_list:
+        logging.info('  Updating manifest from the image collection')
+        manifest = export_manifest.sync_manifest(manifest, export_coll_id)
+
+
+    # Read the run journal
+    # The manifest entries of the resumed run are restored since the
+    #   manifest is only written at the end of the run
+    logging.info('\nReading run journal')
+    journal = RunJournal(journal_path, resume=resume_flag, read_only=bool(plan_path))
+    manifest['images'].update(journal.manifest_entries)
+    journal.write(
+        'start', resume=resume_flag, years=years, mgrs_tiles=mgrs_tiles,
+        tool_version=TOOL_VERSION,
+    )
+    # The tasks of the resumed run may have completed after the tool exited
+    #   (the tool doesn't wait on the tasks without a task limit)
+    if resume_flag:
+        completed_tasks = state_cache.get_ee_tasks(states=['COMPLETED'])
+    else:
+        completed_tasks = {}
 
 
     # Get list of MGRS tiles that intersect the study area
@@ -219,25 +425,128 @@ def main(
     # export_list = sorted(export_list, reverse=reverse_flag, key=lambda i: i['index'])
 
 
-    # Get a list of the available state field feature collections
-    crop_type_states = [
-        asset['id'].split('/')[-1]
-        for asset in ee.data.listAssets({'parent': crop_type_folder_id})['assets']
-        if asset['type'] == 'TABLE'
-    ]
+    # Read the states that intersect each MGRS tile
+    logging.info('\nReading MGRS tile state table')
+    mgrs_state_table = load_mgrs_state_table(
+        mgrs_state_table_path, export_list, mgrs_ftr_coll_id,
+        states_coll_id, states_name_property,
+    )
+
+
+    # Get the tile field raster and California tile mask images
+    #   (if the collections exist)
+    field_raster_list = []
+    if coll_exists[field_raster_coll_id]:
+        field_raster_list = state_cache.get_ee_assets(field_raster_coll_id)
+    logging.info(f'\nMGRS tile field rasters: {len(field_raster_list)}')
+    ca_mask_list = []
+    if coll_exists[ca_mask_coll_id]:
+        ca_mask_list = state_cache.get_ee_assets(ca_mask_coll_id)
+
+
+    # Request the collection lookups concurrently
+    logging.debug('\nGetting collection metadata')
+    lookups = {
+        # The update times are used to track the field collection versions
+        'crop_type_assets': ee_client.list_assets(crop_type_folder_id),
+        # Last available CDL year
+        'cdl_year_max': ee_client.get_info(
+            ee.ImageCollection(cdl_coll_id)
+            .limit(1, 'system:time_start', False).first()
+            .get('system:index')
+        ),
+        # Field raster band names for each tile
+        'field_rasters': ee_client.gather_async({
+            field_raster_id: ee_client.get_asset(field_raster_id)
+            for field_raster_id in field_raster_list
+            if field_raster_id.split('/')[-1] in mgrs_state_table.keys()
+        }),
+    }
+    # Precomputed NALCMS remap tiles and CDL remap years that match the current remap
+    if coll_exists[nalcms_remap_coll_id]:
+        lookups['nalcms_remap_tiles'] = ee_client.get_info(
+            ee.ImageCollection(nalcms_remap_coll_id)
+            .filter(ee.Filter.eq('remap_hash', nalcms_lut.hash))
+            .aggregate_array('system:index')
+        )
+    if coll_exists[cdl_remap_coll_id]:
+        lookups['cdl_remap_years'] = ee_client.get_info(
+            ee.ImageCollection(cdl_remap_coll_id)
+            .filter(ee.Filter.eq('remap_hash', cdl_annual_lut.hash))
+            .aggregate_array('system:index')
+        )
+    # Input hash of the existing chunk images
+    # Chunks built from the current inputs are not exported again
+    if chunk_asset_list:
+        chunk_coll = ee.ImageCollection(chunk_coll_id).filter(ee.Filter.notNull(['input_hash']))
+        lookups['chunk_hashes'] = ee_client.get_info(ee.Dictionary.fromLists(
+            chunk_coll.aggregate_array('system:index'),
+            chunk_coll.aggregate_array('input_hash'),
+        ))
+    lookups = ee_client.gather(lookups)
+
+    crop_type_versions = {
+        asset['id'].split('/')[-1]: asset['updateTime']
+        for asset in lookups['crop_type_assets'] if asset['type'] == 'TABLE'
+    }
+    crop_type_states = sorted(crop_type_versions.keys())
     logging.info(f'\nStates with field feature collections:\n  {", ".join(crop_type_states)}')
 
+    field_raster_infos = lookups['field_rasters']
+    nalcms_remap_tiles = lookups.get('nalcms_remap_tiles', [])
+    logging.info(f'\nNALCMS remap tiles: {len(nalcms_remap_tiles)}')
+    cdl_remap_years = lookups.get('cdl_remap_years', [])
+    logging.info(f'CDL remap years: {", ".join(cdl_remap_years)}')
+    chunk_hashes = lookups.get('chunk_hashes', {})
 
-    # Get the last available CDL year
     cdl_year_min = 2008
-    cdl_year_max = int(utils.get_info(
-        ee.ImageCollection(cdl_coll_id)
-        .limit(1, 'system:time_start', False).first()
-        .get('system:index')
-    ))
+    cdl_year_max = int(lookups['cdl_year_max'])
     logging.info(f'\nLast available CDL year: {cdl_year_max}')
 
 
+    # Get the crop type columns in each state field collection
+    # Years without a column will not have a field layer
+    logging.debug('\nGetting field collection crop type columns')
+    state_field_columns = ee_client.gather({
+        state: ee_client.get_info(
+            ee.FeatureCollection(f'{crop_type_folder_id}/{state}').first().propertyNames()
+        )
+        for state in crop_type_states
+    })
+
+
+    # The bucket export sidecars are written once all of the file export
+    #   tasks of the image have been started (and again if a task is retried),
+    #   so the ingest tool never reads a sidecar for files that aren't being
+    #   exported yet
+    # The sidecar information and the started export IDs are shared by the
+    #   file exports of each image
+    gcs_sidecars = {}
+
+    def task_state(export_id, state, task_id=None):
+        journal.task_state(export_id, state, task_id)
+        if state != 'READY' or export_id not in gcs_sidecars.keys():
+            return
+        sidecar_args, started = gcs_sidecars[export_id]
+        started.add(export_id)
+        if started >= set(sidecar_args['export_ids']):
+            write_gcs_sidecar(**sidecar_args)
+
+    # Export tasks are queued in the tile/year loop and started by the scheduler
+    scheduler = ExportScheduler(
+        max_tasks=max_tasks, workers=workers, max_retries=max_retries, delay=delay,
+        state_fn=task_state,
+    )
+
+    # Images with the same inputs as an exported image are copied after the exports
+    copy_list = []
+    # Tile images that will be mosaicked from the chunk images
+    merge_list = []
+    # Planned action for each tile year (for the plan mode)
+    plan_list = []
+    # Images planned for export or copy in this run
+    planned_ids = set()
+
     # Process each tile separately
     logging.info('\nImage Exports')
     for export_n, export_info in enumerate(export_list):
@@ -248,6 +557,19 @@ def main(
         logging.debug(f'  Extent:     {export_info["extent"]}')
         logging.debug(f'  MaxPixels:  {export_info["maxpixels"]}')
 
+        # Skip the tile without any requests if all of the tile years
+        #   were settled in the resumed run
+        if resume_flag and all(
+                journal.settled(f'crop_type_{mgrs_tile}_{year}0101', tasks, completed_tasks)
+                for year in years):
+            logging.info('  All tile years settled in the run journal, skipping')
+            continue
+
+        # Refresh the task states (incrementally) so the skip/cancel checks
+        #   include the tasks started for the previous tiles
+        if export_n > 0:
+            tasks = state_cache.get_ee_tasks()
+
         mgrs_geom = ee.Geometry.Rectangle(
             export_info['extent'], proj=export_info['crs'], geodesic=False
         )
@@ -259,8 +581,7 @@ def main(
 
         # Get a list of states that could intersect the MGRS tile
         # Use this state list to select the field collections
-        state_coll = ee.FeatureCollection(states_coll_id).filterBounds(mgrs_geom)
-        mgrs_states = state_coll.aggregate_array(states_name_property).getInfo()
+        mgrs_states = mgrs_state_table[mgrs_tile]
         logging.debug(f'  States intersecting the MGRS tile/zone: '
                       f'{", ".join(sorted(mgrs_states))}')
 
@@ -278,6 +599,22 @@ def main(
             crop_type_coll = ee.FeatureCollection(crop_type_coll_id).filterBounds(mgrs_geom)
             field_coll = field_coll.merge(crop_type_coll)
 
+        # Use the rasterized fields for the tile if they have been built
+        #   from the current versions of the field collections
+        field_raster_id = f'{field_raster_coll_id}/{mgrs_tile}'
+        field_raster_bands = []
+        field_raster_versions = json.dumps(
+            {state: crop_type_versions[state] for state in field_states}, sort_keys=True
+        )
+        if field_raster_id in field_raster_infos.keys():
+            field_raster_info = field_raster_infos[field_raster_id]
+            if (field_raster_info.get('properties', {}).get('field_versions') !=
+                    field_raster_versions):
+                logging.info(f'  Field raster image is out of date, not using\n  {field_raster_id}')
+            else:
+                field_raster_bands = [band['id'] for band in field_raster_info['bands']]
+                logging.info(f'  Using field raster image\n  {field_raster_id}')
+
         # CGM - There may be tiles without fields, especially for the eastern
         #   states, but we still want to build an image.  For now, just pause
         #   and force the user to acknowledge that the field count is 0.
@@ -289,6 +626,81 @@ def main(
         #     # logging.info('  No intersecting features - skipping')
         #     # continue
 
+        # Group the tile years that have identical inputs
+        # Only one image is exported for each group and the others are copied
+        field_columns = set(
+            column for state in field_states for column in state_field_columns[state]
+        )
+        year_sources = {}
+        year_fingerprints = {}
+        year_inputs = {}
+        for year in years:
+            year_sources[year] = tile_year_sources(
+                mgrs_tile, year, cdl_year_min, cdl_year_max,
+                cdl_coll_id=cdl_coll_id,
+                ca_coll_id=ca_coll_id,
+                nalcms_img_id=nalcms_img_id,
+            )
+            year_fingerprints[year] = tile_year_fingerprint(
+                year_sources[year], field_columns, remap_hash,
+            )
+            # The field collection versions only matter if there is a field layer
+            if year_sources[year]['fields']['column'] in field_columns:
+                field_versions = {state: crop_type_versions[state] for state in field_states}
+            else:
+                field_versions = {}
+            year_inputs[year] = {
+                'fingerprint': year_fingerprints[year],
+                'field_versions': field_versions,
+                'field_folder': crop_type_folder_id if field_versions else None,
+                'mgrs_mask': mgrs_mask_id,
+                'mgrs_tile': [export_info['crs'], export_info['geo_str'], export_info['shape_str']],
+                'tool_version': TOOL_VERSION,
+            }
+            if field_versions and year_sources[year]['fields']['column'] in field_raster_bands:
+                year_inputs[year]['field_raster'] = {
+                    'update_time': field_raster_info['updateTime'],
+                    'field_versions': field_raster_versions,
+                }
+        logging.debug(f'  Unique tile years: {len(set(year_fingerprints.values()))}')
+
+        # Remove existing images whose inputs have changed since they were built
+        # Images without an input hash (built before the hash was tracked)
+        #   are assumed to be current and are stamped with the current hash,
+        #   so only a real hash mismatch will remove an image
+        if changed_only_flag and not overwrite_flag:
+            for year in years:
+                image_id = f'{mgrs_tile}_{year}0101'
+                asset_id = f'{export_coll_id}/{image_id}'
+                input_hash = export_manifest.inputs_hash(year_inputs[year])
+                if asset_id not in asset_list:
+                    continue
+                elif not manifest['images'].get(image_id, {}).get('hash'):
+                    logging.info(f'  {image_id} - no input hash, setting from the current inputs')
+                    if not plan_path:
+                        ee.data.setAssetProperties(asset_id, {'input_hash': input_hash})
+                    manifest['images'][image_id] = {'hash': input_hash, 'inputs': year_inputs[year]}
+                    continue
+                elif manifest['images'][image_id]['hash'] == input_hash:
+                    continue
+                changed = export_manifest.changed_inputs(manifest, image_id, year_inputs[year])
+                logging.info(f'  {image_id} - inputs changed ({", ".join(changed)}), removing')
+                if not plan_path:
+                    ee.data.deleteAsset(asset_id)
+                    state_cache.remove_asset(asset_id)
+                asset_list.remove(asset_id)
+
+        # Existing images (and submitted tasks) can be the copy source for a group
+        copy_sources = {}
+        if not overwrite_flag and not stack_flag:
+            for year in years:
+                asset_id = f'{export_coll_id}/{mgrs_tile}_{year}0101'
+                if asset_id in asset_list or f'crop_type_{mgrs_tile}_{year}0101' in tasks.keys():
+                    copy_sources.setdefault(year_fingerprints[year], asset_id)
+
+        stack_list = []
+        # Stack years with the same inputs as another year reuse its band
+        stack_aliases = {}
         for year in years:
             image_id = f'{mgrs_tile}_{year}0101'
             asset_id = f'{export_coll_id}/{image_id}'
@@ -299,29 +711,101 @@ def main(
             logging.debug(f'  {asset_short_id}')
             logging.debug(f'  {export_id}')
 
-            if overwrite_flag:
-                if export_id in tasks.keys():
+            plan_info = {
+                'image_id': image_id,
+                'mgrs_tile': mgrs_tile,
+                'year': year,
+                'action': '',
+                'states': len(mgrs_states),
+                'field_states': len(field_states),
+                'field_column': crop_type_field if crop_type_field in field_columns else '',
+                'maxpixels': export_info['maxpixels'],
+                'chunks': chunks * chunks,
+            }
+            for band_name in ['landiq', 'cdl_ca_img', 'cdl_conus_img', 'nalcms_img']:
+                plan_info[f'{band_name}_id'] = year_sources[year].get(band_name, {}).get('id', '')
+            plan_list.append(plan_info)
+
+            if resume_flag and journal.settled(export_id, tasks, completed_tasks):
+                logging.info('  Settled in the run journal, skipping')
+                plan_info['action'] = 'skip_journal'
+                continue
+
+            if stack_flag:
+                # The year images are not built in stack mode, so the year
+                #   assets and tasks are not checked (see the stack check below)
+                pass
+            elif overwrite_flag:
+                if export_id in tasks.keys() and not plan_path:
                     logging.info('  Task already submitted, cancelling')
-                    ee.data.cancelTask(tasks[export_id])
+                    ee.data.cancelTask(tasks[export_id]['id'])
+                    state_cache.set_task_state(tasks[export_id]['id'], 'CANCELLED')
                 # This is intentionally not an "elif" so that a task can be
                 # cancelled and an existing image/file/asset can be removed
-                if asset_id in asset_list or asset_short_id in asset_list:
+                if (asset_id in asset_list or asset_short_id in asset_list) and not plan_path:
                     logging.info('  Asset already exists, removing')
                     ee.data.deleteAsset(asset_id)
+                    state_cache.remove_asset(asset_id)
             else:
                 if export_id in tasks.keys():
                     logging.info('  Task already submitted, exiting')
+                    plan_info['action'] = 'skip_task'
+                    journal.write('submitted', export_id, task_id=tasks[export_id]['id'])
                     continue
                 elif asset_id in asset_list or asset_short_id in asset_list:
                     logging.info('  Asset already exists, skipping')
+                    plan_info['action'] = 'skip_asset'
+                    journal.write('skipped', export_id)
                     continue
 
+            # Copy the image if another year has the same inputs
+            fingerprint = year_fingerprints[year]
+            if fingerprint in copy_sources.keys() and stack_flag:
+                src_year = int(copy_sources[fingerprint].split('_')[-1][:4])
+                logging.info(f'  Same inputs as {src_year}, stack band will be reused')
+                stack_aliases[year] = src_year
+                plan_info['action'] = 'stack_alias'
+                continue
+            elif fingerprint in copy_sources.keys():
+                logging.info(f'  Same inputs as {copy_sources[fingerprint].split("/")[-1]}, '
+                             f'image will be copied')
+                copy_list.append([copy_sources[fingerprint], asset_id, year])
+                plan_info['action'] = 'copy'
+                manifest['images'][image_id] = {
+                    'hash': export_manifest.inputs_hash(year_inputs[year]),
+                    'inputs': year_inputs[year],
+                }
+                journal.write(
+                    'planned', export_id, image_id=image_id,
+                    manifest=manifest['images'][image_id],
+                    copy_source=copy_sources[fingerprint],
+                )
+                planned_ids.add(image_id)
+                continue
+            copy_sources[fingerprint] = asset_id
+
+            # Record the inputs in the manifest and on the image
+            input_hash = export_manifest.inputs_hash(year_inputs[year])
+            if (gcs_flag and not overwrite_flag and
+                    f'{gcs_folder}/{image_id}.json' in gcs_files and
+                    manifest['images'].get(image_id, {}).get('hash') == input_hash):
+                logging.info('  Image already exported to the bucket, skipping')
+                plan_info['action'] = 'skip_gcs'
+                journal.write('skipped', export_id)
+                continue
+            manifest['images'][image_id] = {'hash': input_hash, 'inputs': year_inputs[year]}
+            journal.write(
+                'planned', export_id, image_id=image_id, manifest=manifest['images'][image_id],
+            )
+            planned_ids.add(image_id)
+
             properties = {
                 'system:time_start': ee.Date.fromYMD(year, 1, 1).millis(),
                 'core_version': openet.core.__version__,
                 'crop_type_folder': crop_type_folder_id,
                 'crop_type_states': ','.join(mgrs_states),
                 'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'input_hash': input_hash,
                 'mgrs_tile': mgrs_tile,
                 'tool_name': TOOL_NAME,
                 'tool_version': TOOL_VERSION,
@@ -338,130 +822,184 @@ def main(
             # Start with the MGRS mask set to 0
             output_img = mgrs_mask_img.updateMask(0)
 
+            # Source images for the tile/year
+            # The same rules are used by the local compositing tool
+            sources = year_sources[year]
+
             # Rasterize the fields
             # 176 fields will not be burned in (for now)
             # Long term they should probably be reassigned in the field collections
             # Added the uint8 since image was coming back as a double
             # Filtering on +/-0.5 values to handle floating point numbers in the crop types
-            field_img = (
-                field_coll.filter(ee.Filter.gt(crop_type_field, 0))
-                .filter(ee.Filter.rangeContains(crop_type_field, 80.5, 195.5).Not())
-                .reduceToImage([crop_type_field], ee.Reducer.first())
-                .round().uint8()
-            )
+            # The field raster images were built with the same filtering
+            if crop_type_field in field_raster_bands:
+                field_img = ee.Image(field_raster_id).select([crop_type_field])
+                field_img = field_img.updateMask(field_img.gt(0))
+                properties['field_raster_id'] = field_raster_id
+            else:
+                field_img = (
+                    field_coll.filter(ee.Filter.gt(crop_type_field, 0))
+                    .filter(ee.Filter.rangeContains(crop_type_field, 80.5, 195.5).Not())
+                    .reduceToImage([crop_type_field], ee.Reducer.first())
+                    .round().uint8()
+                )
             output_img = output_img.addBands(field_img.rename(['fields']))
             properties['field_states'] = ','.join(field_states)
 
-
             # Mosaic the California LandIQ image for the UTM zone before any CDL images
-            if mgrs_tile in ['10S', '10T', '11S']:
-                if year in [2014, 2016, 2018, 2019, 2020, 2021, 2022]:
-                    # Using the UTM zone projected version of the California image
-                    ca_img_id = f'{ca_coll_id}/{year}_utm{mgrs_tile[:2]}'
-                    # ca_img_id = f'{ca_coll_id}/{year}'
-                    ca_img = ee.Image(ca_img_id)
-                elif year > 2022:
-                    ca_img_id = f'{ca_coll_id}/2022_utm{mgrs_tile[:2]}'
-                    # ca_img_id = f'{ca_coll_id}/2021'
-                    ca_img = ee.Image(ca_img_id).remap(cdl_remap_in, cdl_remap_out)
-                elif year in [2015, 2017]:
-                    ca_img_id = f'{ca_coll_id}/{year-1}_utm{mgrs_tile[:2]}'
-                    # ca_img_id = f'{ca_coll_id}/{year - 1}'
-                    ca_img = ee.Image(ca_img_id).remap(cdl_remap_in, cdl_remap_out)
-                elif year in [2009, 2010, 2011, 2012, 2013]:
-                    # Use a 2014 remapped annual crop image for pre-2014 years
-                    # Remove the urban and managed wetland polygons
-                    ca_img_id = f'{ca_coll_id}/2014_utm{mgrs_tile[:2]}'
-                    # ca_img_id = f'{ca_coll_id}/2014'
-                    ca_img = (
-                        ee.Image(ca_img_id)
-                        .remap(cdl_remap_in, cdl_remap_out)
-                        .updateMask(ee.Image(ca_img_id).neq(82))
-                        .updateMask(ee.Image(ca_img_id).neq(87))
-                    )
-                elif year < 2009:
-                    # Don't include before 2009
-                    ca_img = None
-                else:
-                    logging.warning(f'unexpected year: {year}')
-                    input('ENTER')
-
-                if ca_img:
-                    output_img = output_img.addBands(ca_img.rename(['landiq']))
-                    properties['custom_ca_img_id'] = ca_img_id
-
+            if 'landiq' in sources.keys():
+                ca_img_id = sources['landiq']['id']
+                ca_img = ee.Image(ca_img_id)
+                if sources['landiq']['remap']:
+                    ca_img = ca_img.remap(cdl_remap_in, cdl_remap_out)
+                # Remove the urban and managed wetland polygons
+                for mask_value in sources['landiq']['mask_values']:
+                    ca_img = ca_img.updateMask(ee.Image(ca_img_id).neq(mask_value))
+                output_img = output_img.addBands(ca_img.rename(['landiq']))
+                properties['custom_ca_img_id'] = ca_img_id
 
             # For California, always use the annual remapped CDL
-            # This is different than the generic CDL section below where the
-            #   annual remap is only used for pre-2008 and current years
-            # Use a 2008 remapped annual crop image for all pre-2008 years
-            # For all years after the last available CDL year,
-            #   use an annual crop remapped version of the last CDL year
-            if mgrs_tile in ['10S', '10T', '11S']:
-                if year < cdl_year_min:
-                    ca_cdl_img_id = f'{cdl_coll_id}/{cdl_year_min}'
-                elif year > cdl_year_max:
-                    ca_cdl_img_id = f'{cdl_coll_id}/{cdl_year_max}'
-                else:
-                    ca_cdl_img_id = f'{cdl_coll_id}/{year}'
-
-                ca_cdl_img = (
-                    ee.Image(ca_cdl_img_id).select(['cropland'])
-                    .remap(cdl_remap_in, cdl_remap_out)
-                )
-                # The clip could be changed to a mask using the CIMIS mask?
-                ca_geom = (
-                    ee.FeatureCollection('TIGER/2018/States')
-                    .filterMetadata('STUSPS', 'equals', 'CA').first().geometry()
+            if 'cdl_ca_img' in sources.keys():
+                ca_cdl_img_id = sources['cdl_ca_img']['id']
+                ca_cdl_img = cdl_annual_remap_image(
+                    ca_cdl_img_id, cdl_remap_in, cdl_remap_out,
+                    cdl_remap_years, cdl_remap_coll_id,
                 )
-                ca_cdl_img = ca_cdl_img.clip(ca_geom)
+                # Mask with the California tile mask image if it is available
+                #   since clipping to the state geometry is expensive
+                ca_mask_id = f'{ca_mask_coll_id}/{mgrs_tile}'
+                if ca_mask_id in ca_mask_list:
+                    ca_cdl_img = ca_cdl_img.updateMask(ee.Image(ca_mask_id))
+                    properties['ca_mask_id'] = ca_mask_id
+                else:
+                    # The clip could be changed to a mask using the CIMIS mask?
+                    ca_geom = (
+                        ee.FeatureCollection('TIGER/2018/States')
+                        .filterMetadata('STUSPS', 'equals', 'CA').first().geometry()
+                    )
+                    ca_cdl_img = ca_cdl_img.clip(ca_geom)
                 output_img = output_img.addBands(ca_cdl_img.rename(['cdl_ca_img']))
                 properties['cdl_ca_img_id'] = ca_cdl_img_id
 
-
-            # For any years after the last available CDL year
-            #   use the annual crop remapped version of the last year image
-            # For pre-2008 years, use the annual crop remapped 2008 images
-            if year > cdl_year_max:
-                cdl_img_id = f'{cdl_coll_id}/{cdl_year_max}'
-                cdl_img = (
-                    ee.Image(cdl_img_id).select(['cropland'])
-                    .remap(cdl_remap_in, cdl_remap_out)
-                )
-            elif year < cdl_year_min:
-                cdl_img_id = f'{cdl_coll_id}/{cdl_year_min}'
-                cdl_img = (
-                    ee.Image(cdl_img_id).select(['cropland'])
-                    .remap(cdl_remap_in, cdl_remap_out)
+            # Only remap the CDL image outside of the available CDL years
+            cdl_img_id = sources['cdl_conus_img']['id']
+            if sources['cdl_conus_img']['remap']:
+                cdl_img = cdl_annual_remap_image(
+                    cdl_img_id, cdl_remap_in, cdl_remap_out,
+                    cdl_remap_years, cdl_remap_coll_id,
                 )
             else:
-                cdl_img_id = f'{cdl_coll_id}/{year}'
                 cdl_img = ee.Image(cdl_img_id).select(['cropland'])
             output_img = output_img.addBands(cdl_img.rename(['cdl_conus_img']))
             properties['cdl_img_id'] = cdl_img_id
 
-
             # Use the remapped NALCMS (North America) image as the fallback image
-            nalcms_img = (
-                ee.Image(nalcms_img_id)
-                .remap(nalcms_cdl_remap[0], nalcms_cdl_remap[1])
-                .rename(['nalcms_img'])
-            )
+            # Use the precomputed remap image for the tile if it is available
+            if mgrs_tile in nalcms_remap_tiles:
+                nalcms_remap_img_id = f'{nalcms_remap_coll_id}/{mgrs_tile}'
+                nalcms_img = ee.Image(nalcms_remap_img_id).rename(['nalcms_img'])
+                properties['nalcms_remap_img_id'] = nalcms_remap_img_id
+            else:
+                nalcms_img = (
+                    ee.Image(sources['nalcms_img']['id'])
+                    .remap(nalcms_cdl_remap[0], nalcms_cdl_remap[1])
+                    .rename(['nalcms_img'])
+                )
             output_img = output_img.addBands(nalcms_img)
-            properties['nalcms_img_id'] = nalcms_img_id
-
+            properties['nalcms_img_id'] = sources['nalcms_img']['id']
 
             # Build the output image from the stack
+            # The 0 values (i.e. the NALCMS classes remapped to 0) are masked
+            #   since 0 is the nodata value of the bucket files and local images
             output_img = (
                 output_img
                 .reduce(ee.Reducer.firstNonNull())
+                .selfMask()
                 .updateMask(mgrs_mask_img)
                 .rename(['cropland'])
                 .set(properties)
             )
 
-            # Build export tasks
-            task = ee.batch.Export.image.toAsset(
+            # In stack mode the year image is exported as a band of the tile stack
+            if stack_flag:
+                stack_list.append([year, output_img, input_hash])
+                plan_info['action'] = 'stack_band'
+                continue
+            plan_info['action'] = 'export'
+
+            # Export the tile (or each chunk) to the bucket as Cloud-Optimized GeoTIFFs
+            # The files are ingested as a single image (with a source for each
+            #   chunk) by crop_type_gcs_ingest.py using the sidecar properties
+            if gcs_flag:
+                if chunks > 1:
+                    file_exports = [
+                        [f'{image_id}_{chunk_info["chunk"]}',
+                         f'{export_id}_{chunk_info["chunk"]}', chunk_info]
+                        for chunk_info in mgrs_export_chunks(export_info, chunks)
+                    ]
+                else:
+                    file_exports = [[image_id, export_id, export_info]]
+                if plan_path:
+                    continue
+                sidecar_info = [{
+                    'bucket': gcs_bucket,
+                    'blob_name': f'{gcs_folder}/{image_id}.json',
+                    'asset_id': asset_id,
+                    'year': year,
+                    'properties': properties,
+                    'file_prefixes': [f'{gcs_folder}/{file_name}' for file_name, *_ in file_exports],
+                    'export_ids': [file_export_id for _, file_export_id, _ in file_exports],
+                }, set()]
+                for file_name, file_export_id, file_info in file_exports:
+                    gcs_sidecars[file_export_id] = sidecar_info
+                    scheduler.submit(file_export_id, partial(
+                        gcs_export_task, output_img, file_export_id,
+                        gcs_bucket_name, f'{gcs_folder}/{file_name}', file_info,
+                    ))
+                continue
+
+            # In chunk mode each sub-tile is exported (and retried) separately
+            #   and the chunks are mosaicked into the tile image after the exports
+            if chunks > 1:
+                chunk_ids = []
+                for chunk_info in mgrs_export_chunks(export_info, chunks):
+                    chunk_id = f'{chunk_coll_id}/{image_id}_{chunk_info["chunk"]}'
+                    chunk_export_id = f'{export_id}_{chunk_info["chunk"]}'
+                    chunk_ids.append(chunk_id)
+                    if plan_path:
+                        continue
+                    elif chunk_export_id in tasks.keys() and not overwrite_flag:
+                        logging.debug(f'  {chunk_info["chunk"]} - task already submitted')
+                        continue
+                    elif chunk_export_id in tasks.keys():
+                        ee.data.cancelTask(tasks[chunk_export_id]['id'])
+                        state_cache.set_task_state(tasks[chunk_export_id]['id'], 'CANCELLED')
+                    elif (chunk_id in chunk_asset_list and not overwrite_flag and
+                            chunk_hashes.get(chunk_id.split('/')[-1]) == input_hash):
+                        logging.debug(f'  {chunk_info["chunk"]} - chunk is current')
+                        continue
+                    if chunk_id in chunk_asset_list:
+                        ee.data.deleteAsset(chunk_id)
+                        state_cache.remove_asset(chunk_id)
+                        chunk_asset_list.remove(chunk_id)
+                    scheduler.submit(chunk_export_id, partial(
+                        ee.batch.Export.image.toAsset,
+                        output_img,
+                        description=chunk_export_id,
+                        assetId=chunk_id,
+                        dimensions=chunk_info['shape_str'],
+                        crs=chunk_info['crs'],
+                        crsTransform=chunk_info['geo_str'],
+                        maxPixels=chunk_info['maxpixels']*2,
+                        pyramidingPolicy={'cropland': 'mode'},
+                    ))
+                merge_list.append([chunk_ids, asset_id, export_id, properties, export_info])
+                continue
+
+            # Queue the export task
+            # The task is rebuilt by the scheduler if it needs to be resubmitted
+            scheduler.submit(export_id, partial(
+                ee.batch.Export.image.toAsset,
                 output_img,
                 description=export_id,
                 assetId=asset_id,
@@ -470,15 +1008,635 @@ def main(
                 crsTransform=export_info['geo_str'],
                 maxPixels=export_info['maxpixels']*2,
                 pyramidingPolicy={'cropland': 'mode'},
+            ))
+
+            logging.debug('')
+
+        # Export a single multi-band image for the tile with a band for each year
+        # The "band_YYYY" properties map each year to its band, so years with
+        #   the same inputs share a band
+        # The stack is reused if it was built from the same year inputs
+        # The stack is only built from the years in this run, so an existing
+        #   stack with other years is never replaced (its other bands would be lost)
+        if stack_list:
+            stack_id = f'{stack_coll_id}/{mgrs_tile}'
+            stack_export_id = f'crop_type_stack_{mgrs_tile}'
+            stack_bands = [f'cropland_{year}' for year, *_ in stack_list]
+            stack_info = {}
+            for year, _, input_hash in stack_list:
+                stack_info[f'band_{year}'] = f'cropland_{year}'
+                stack_info[f'input_hash_{year}'] = input_hash
+            for year, src_year in stack_aliases.items():
+                stack_info[f'band_{year}'] = stack_info[f'band_{src_year}']
+                stack_info[f'input_hash_{year}'] = stack_info[f'input_hash_{src_year}']
+
+            stack_years = sorted([year for year, *_ in stack_list] + list(stack_aliases.keys()))
+
+            stack_properties = {}
+            if stack_id in stack_asset_list:
+                stack_properties = ee.data.getAsset(stack_id).get('properties', {})
+            missing_years = sorted(
+                set(int(year) for year in stack_properties.get('years', '').split(',') if year)
+                - set(stack_years)
             )
+            if (not overwrite_flag and
+                    all(stack_properties.get(k) == v for k, v in stack_info.items())):
+                logging.info(f'  Stack image is current, skipping\n  {stack_id}')
+                for plan_info in plan_list:
+                    if plan_info['mgrs_tile'] == mgrs_tile and plan_info['action'] == 'stack_band':
+                        plan_info['action'] = 'skip_stack'
+                continue
+            elif missing_years:
+                logging.warning(
+                    f'  Stack image has years that are not in this run '
+                    f'({", ".join(map(str, missing_years))}), run with all of the '
+                    f'stack years to rebuild it, skipping\n  {stack_id}'
+                )
+                for plan_info in plan_list:
+                    if (plan_info['mgrs_tile'] == mgrs_tile and
+                            plan_info['action'] in ['stack_band', 'stack_alias']):
+                        plan_info['action'] = 'skip_stack_partial'
+                continue
+            elif plan_path:
+                continue
+            elif stack_export_id in tasks.keys() and not overwrite_flag:
+                logging.info(f'  Stack task already submitted\n  {stack_id}')
+                continue
+            elif stack_export_id in tasks.keys():
+                logging.info('  Stack task already submitted, cancelling')
+                ee.data.cancelTask(tasks[stack_export_id]['id'])
+                state_cache.set_task_state(tasks[stack_export_id]['id'], 'CANCELLED')
+            if stack_id in stack_asset_list:
+                logging.info('  Stack image is out of date, removing')
+                ee.data.deleteAsset(stack_id)
+                state_cache.remove_asset(stack_id)
+
+            logging.info(f'  Stack image ({len(stack_bands)} bands)\n  {stack_id}')
+            stack_img = (
+                ee.Image.cat([img for _, img, *_ in stack_list]).rename(stack_bands)
+                .set({
+                    'core_version': openet.core.__version__,
+                    'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                    'mgrs_tile': mgrs_tile,
+                    'tool_name': TOOL_NAME,
+                    'tool_version': TOOL_VERSION,
+                    'years': ','.join(str(year) for year in stack_years),
+                    **stack_info,
+                })
+            )
+            scheduler.submit(stack_export_id, partial(
+                ee.batch.Export.image.toAsset,
+                stack_img,
+                description=stack_export_id,
+                assetId=stack_id,
+                dimensions=export_info['shape_str'],
+                crs=export_info['crs'],
+                crsTransform=export_info['geo_str'],
+                maxPixels=export_info['maxpixels']*2,
+                pyramidingPolicy={'.default': 'mode'},
+            ))
+
+    if plan_path:
+        write_plan(plan_path, plan_list, plan_eecu_rate)
+        return True
+
+    logging.info('\nStarting export tasks')
+    task_states = scheduler.run()
+    if max_tasks > 0:
+        completed = [k for k, v in task_states.items() if v == 'COMPLETED']
+        cancelled = sorted(k for k, v in task_states.items() if v == 'CANCELLED')
+        failed = sorted(k for k, v in task_states.items() if v == 'FAILED')
+        logging.info(f'  Completed: {len(completed)}')
+        if cancelled:
+            logging.warning(f'  Cancelled: {", ".join(cancelled)}')
+        if failed:
+            logging.warning(f'  Failed: {", ".join(failed)}')
+
+    # Mosaic the chunk images into the tile images
+    # The chunks are on the tile grid so the mosaic doesn't resample
+    # The chunks must all exist, so if the scheduler isn't waiting on the
+    #   tasks, the tile images will be mosaicked the next time the tool is run
+    if merge_list:
+        logging.info('\nMosaicking chunk images')
+        chunk_asset_list = state_cache.get_ee_assets(chunk_coll_id)
+        merge_scheduler = ExportScheduler(
+            max_tasks=max_tasks, workers=workers, max_retries=max_retries, delay=delay,
+            state_fn=journal.task_state,
+        )
+        for chunk_ids, asset_id, export_id, properties, export_info in merge_list:
+            missing_ids = [x for x in chunk_ids if x not in chunk_asset_list]
+            if missing_ids:
+                logging.info(f'  {export_id} - {len(missing_ids)} of {len(chunk_ids)} '
+                             f'chunks not built yet, skipping')
+                continue
+            merge_scheduler.submit(export_id, partial(
+                ee.batch.Export.image.toAsset,
+                ee.ImageCollection(chunk_ids).mosaic().rename(['cropland']).set(properties),
+                description=export_id,
+                assetId=asset_id,
+                dimensions=export_info['shape_str'],
+                crs=export_info['crs'],
+                crsTransform=export_info['geo_str'],
+                maxPixels=export_info['maxpixels']*2,
+                pyramidingPolicy={'cropland': 'mode'},
+            ))
+        merge_scheduler.run()
+
+    # Copy the images that have the same inputs as an exported image
+    # The copy source must exist, so if the scheduler isn't waiting on the
+    #   tasks, the copies will be made the next time the tool is run
+    if copy_list:
+        logging.info('\nCopying images with identical inputs')
+        asset_list = state_cache.get_ee_assets(export_coll_id)
+        for src_id, dst_id, year in copy_list:
+            if src_id not in asset_list:
+                logging.info(f'  {dst_id.split("/")[-1]} - source image '
+                             f'{src_id.split("/")[-1]} not built yet, skipping')
+                continue
+            copy_tile_image(src_id, dst_id, year)
+            journal.write('copied', f'crop_type_{dst_id.split("/")[-1]}')
+
+    # Export the class pixel counts of the tile images to the bucket
+    # The histogram is computed from the finished image (not the composite)
+    #   so the images must exist, and the images planned in this run are
+    #   skipped unless the scheduler waited on the tasks
+    # This is one extra table export task (a full tile reduction) per image
+    # The manifest "histogram" value is the input hash the table was built for
+    #   and is only set once the histogram task has completed, either when
+    #   the scheduler sees the task complete, or on a later run if the table
+    #   was written after the task was submitted ("histogram_pending")
+    if histogram_flag:
+        logging.info('\nExporting class histograms')
+        asset_list = state_cache.get_ee_assets(export_coll_id)
+        tasks = state_cache.get_ee_tasks()
+        histogram_bucket = storage.Client(project=PROJECT_NAME).bucket(gcs_bucket_name)
+        histogram_files = {
+            blob.name: blob.updated
+            for blob in histogram_bucket.list_blobs(prefix=f'{histogram_folder}/')
+        }
+        histogram_ids = {}
+
+        def histogram_state(export_id, state, task_id=None):
+            journal.task_state(export_id, state, task_id)
+            image_manifest = manifest['images'].get(histogram_ids[export_id], {})
+            if state == 'COMPLETED' and image_manifest.get('histogram_pending'):
+                image_manifest['histogram'] = image_manifest.pop('histogram_pending')['hash']
+
+        histogram_scheduler = ExportScheduler(
+            max_tasks=max_tasks, workers=workers, max_retries=max_retries, delay=delay,
+            state_fn=histogram_state,
+        )
+        for export_info in export_list:
+            mgrs_tile = export_info['index'].upper()
+            for year in years:
+                image_id = f'{mgrs_tile}_{year}0101'
+                asset_id = f'{export_coll_id}/{image_id}'
+                export_id = f'crop_type_histogram_{image_id}'
+                histogram_file = f'{histogram_folder}/{image_id}.csv'
+                image_manifest = manifest['images'].get(image_id, {})
+
+                # The table of a pending task was written if it is newer than the task
+                pending = image_manifest.get('histogram_pending', {})
+                if (pending and histogram_file in histogram_files and
+                        export_id not in tasks.keys() and
+                        histogram_files[histogram_file] > datetime.fromisoformat(pending['time'])):
+                    image_manifest['histogram'] = image_manifest.pop('histogram_pending')['hash']
+
+                if asset_id not in asset_list:
+                    continue
+                elif image_id in planned_ids and (max_tasks <= 0 or gcs_flag):
+                    logging.debug(f'  {image_id} - image not built yet, skipping')
+                    continue
+                elif (histogram_file in histogram_files and
+                        image_manifest.get('histogram') == image_manifest.get('hash') and
+                        not overwrite_flag):
+                    continue
+                elif export_id in tasks.keys():
+                    logging.debug(f'  {image_id} - task already submitted, skipping')
+                    continue
+                histogram_ids[export_id] = image_id
+                histogram_scheduler.submit(export_id, partial(
+                    histogram_export_task, asset_id, export_id, gcs_bucket_name,
+                    f'{histogram_folder}/{image_id}', export_info,
+                ))
+                if image_id in manifest['images'].keys():
+                    image_manifest['histogram_pending'] = {
+                        'hash': image_manifest['hash'],
+                        'time': datetime.now(timezone.utc).isoformat(),
+                    }
+        histogram_scheduler.run()
+
+    # Remove the chunk images for the tile images that have been mosaicked
+    if chunks > 1 and chunk_asset_list:
+        asset_list = state_cache.get_ee_assets(export_coll_id)
+        for chunk_id in state_cache.get_ee_assets(chunk_coll_id):
+            image_id = chunk_id.split('/')[-1].rsplit('_', 1)[0]
+            if f'{export_coll_id}/{image_id}' in asset_list:
+                logging.debug(f'  Removing chunk image {chunk_id}')
+                ee.data.deleteAsset(chunk_id)
+                state_cache.remove_asset(chunk_id)
+
+    logging.info('\nWriting export manifest')
+    export_manifest.write_manifest(manifest_path, manifest)
+    journal.write('end')
+
+
+def tile_year_sources(
+        mgrs_tile,
+        year,
+        cdl_year_min,
+        cdl_year_max,
+        cdl_coll_id='USDA/NASS/CDL',
+        ca_coll_id='projects/openet/assets/crop_type/california',
+        nalcms_img_id='USGS/NLCD_RELEASES/2020_REL/NALCMS',
+        ):
+    """Select the source images for a single MGRS tile and year
 
-            logging.info('  Starting export task')
-            utils.ee_task_start(task)
+    The sources are returned in the same order they are stacked for the
+    firstNonNull reducer so the Earth Engine export and the local compositing
+    tool will always apply the same year rules.
 
-            # Pause before starting the next export task
-            utils.delay_task(delay)
+    Parameters
+    ----------
+    mgrs_tile : str
+        MGRS tile/zone (i.e. "10S").
+    year : int
+    cdl_year_min : int
+        First CONUS CDL year.  Earlier years use the remapped first year image.
+    cdl_year_max : int
+        Last available CDL year.  Later years use the remapped last year image.
+    cdl_coll_id : str, optional
+        CDL image collection ID.
+    ca_coll_id : str, optional
+        California LandIQ image collection ID.
+    nalcms_img_id : str, optional
+        NALCMS image ID.
 
-            logging.debug('')
+    Returns
+    -------
+    dict : source information keyed by the stack band name
+
+    Raises
+    ------
+    ValueError if there is no LandIQ rule for a California tile year.
+
+    """
+    mgrs_tile = mgrs_tile.upper()
+    sources = {'fields': {'column': f'CROP_{year}'}}
+
+    # Mosaic the California LandIQ image for the UTM zone before any CDL images
+    # Using the UTM zone projected version of the California image
+    if mgrs_tile in CA_MGRS_TILES:
+        utm_zone = mgrs_tile[:2]
+        if year in [2014, 2016, 2018, 2019, 2020, 2021, 2022]:
+            sources['landiq'] = {
+                'id': f'{ca_coll_id}/{year}_utm{utm_zone}', 'remap': False,
+                'mask_values': [],
+            }
+        elif year > 2022:
+            sources['landiq'] = {
+                'id': f'{ca_coll_id}/2022_utm{utm_zone}', 'remap': True,
+                'mask_values': [],
+            }
+        elif year in [2015, 2017]:
+            sources['landiq'] = {
+                'id': f'{ca_coll_id}/{year-1}_utm{utm_zone}', 'remap': True,
+                'mask_values': [],
+            }
+        elif year in [2009, 2010, 2011, 2012, 2013]:
+            # Use a 2014 remapped annual crop image for pre-2014 years
+            # Remove the urban and managed wetland polygons
+            sources['landiq'] = {
+                'id': f'{ca_coll_id}/2014_utm{utm_zone}', 'remap': True,
+                'mask_values': [82, 87],
+            }
+        elif year < 2009:
+            # Don't include before 2009
+            pass
+        else:
+            raise ValueError(f'unexpected year: {year}')
+
+    # For California, always use the annual remapped CDL
+    # This is different than the generic CDL section below where the
+    #   annual remap is only used for pre-2008 and current years
+    # The CDL image is clipped to the California boundary
+    if mgrs_tile in CA_MGRS_TILES:
+        ca_cdl_year = min(max(year, cdl_year_min), cdl_year_max)
+        sources['cdl_ca_img'] = {
+            'id': f'{cdl_coll_id}/{ca_cdl_year}', 'remap': True, 'clip': 'CA',
+        }
+
+    # For any years after the last available CDL year
+    #   use the annual crop remapped version of the last year image
+    # For pre-2008 years, use the annual crop remapped 2008 images
+    if year > cdl_year_max:
+        sources['cdl_conus_img'] = {'id': f'{cdl_coll_id}/{cdl_year_max}', 'remap': True}
+    elif year < cdl_year_min:
+        sources['cdl_conus_img'] = {'id': f'{cdl_coll_id}/{cdl_year_min}', 'remap': True}
+    else:
+        sources['cdl_conus_img'] = {'id': f'{cdl_coll_id}/{year}', 'remap': False}
+
+    # Use the remapped NALCMS (North America) image as the fallback image
+    sources['nalcms_img'] = {'id': nalcms_img_id, 'remap': True}
+
+    return sources
+
+
+def write_plan(plan_path, plan_list, eecu_hours_per_gpixel):
+    """Write the planned tile year actions and log a summary
+
+    Parameters
+    ----------
+    plan_path : str
+        Output file path.  The plan is written as JSON if the extension is
+        ".json", otherwise as CSV.
+    plan_list : list
+        Planned action dictionaries for each tile year.
+    eecu_hours_per_gpixel : float
+        Estimated EECU-hours for compositing one billion pixels.
+
+    Returns
+    -------
+    None
+
+    """
+    # Only the export and stack band actions composite the source images
+    # The copies and reused stack bands are not included in the cost
+    for plan_info in plan_list:
+        if plan_info['action'] in ['export', 'stack_band']:
+            plan_info['export_pixels'] = plan_info['maxpixels']
+        else:
+            plan_info['export_pixels'] = 0
+        plan_info['eecu_hours'] = round(
+            plan_info['export_pixels'] * eecu_hours_per_gpixel / 1E9, 4
+        )
+
+    logging.info(f'\nWriting plan\n  {plan_path}')
+    if plan_path.lower().endswith('.json'):
+        with open(plan_path, 'w') as f:
+            json.dump(plan_list, f, indent=2)
+    else:
+        pd.DataFrame(plan_list).to_csv(plan_path, index=False)
+
+    logging.info('\nPlan Summary')
+    plan_df = pd.DataFrame(plan_list, columns=['action', 'export_pixels', 'eecu_hours'])
+    for action, count in plan_df['action'].value_counts().sort_index().items():
+        logging.info(f'  {action}: {count}')
+    logging.info(f'  Export pixels: {plan_df["export_pixels"].sum():,}')
+    logging.info(f'  Estimated EECU-hours: {plan_df["eecu_hours"].sum():.1f}')
+
+
+def tile_year_fingerprint(sources, field_columns, remap_hash):
+    """Compute a fingerprint of the resolved inputs for a tile year
+
+    Tile years with the same fingerprint will build identical images.
+
+    Parameters
+    ----------
+    sources : dict
+        Source information from tile_year_sources().
+    field_columns : set
+        Crop type columns that are present in the tile field collections.
+        The field layer is ignored if the column is not present.
+    remap_hash : str
+        Hash of the remap tables.
+
+    Returns
+    -------
+    str
+
+    """
+    sources = {k: dict(v) for k, v in sources.items()}
+    if sources['fields']['column'] not in field_columns:
+        sources['fields']['column'] = None
+    return hashlib.sha256(
+        json.dumps([sources, remap_hash], sort_keys=True).encode()
+    ).hexdigest()
+
+
+def copy_tile_image(src_id, dst_id, year):
+    """Copy a tile image and update the date properties for the new year
+
+    Parameters
+    ----------
+    src_id : str
+        Source image asset ID.
+    dst_id : str
+        Destination image asset ID.
+    year : int
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info(f'  {dst_id.split("/")[-1]} - copying from {src_id.split("/")[-1]}')
+    ee.data.copyAsset(src_id, dst_id)
+    ee.data.updateAsset(
+        dst_id, {'start_time': f'{year}-01-01T00:00:00Z'}, ['start_time']
+    )
+    ee.data.setAssetProperties(dst_id, {
+        'copy_source': src_id,
+        'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+    })
+
+
+def gcs_export_task(image, description, bucket_name, file_prefix, export_info):
+    """Build a Cloud-Optimized GeoTIFF bucket export task on an MGRS tile grid
+
+    Parameters
+    ----------
+    image : ee.Image
+    description : str
+        Export task description.
+    bucket_name : str
+    file_prefix : str
+        Output file path in the bucket (without the ".tif" extension).
+    export_info : dict
+        MGRS tile (or chunk) export information.
+
+    Returns
+    -------
+    ee.batch.Task
+
+    """
+    return ee.batch.Export.image.toCloudStorage(
+        image.uint8(),
+        description=description,
+        bucket=bucket_name,
+        fileNamePrefix=file_prefix,
+        dimensions=export_info['shape_str'],
+        crs=export_info['crs'],
+        crsTransform=export_info['geo_str'],
+        maxPixels=export_info['maxpixels']*2,
+        fileFormat='GeoTIFF',
+        formatOptions={'cloudOptimized': True, 'noData': 0},
+    )
+
+
+def histogram_export_task(asset_id, description, bucket_name, file_prefix, export_info):
+    """Build a bucket CSV export task of the class pixel counts of a tile image
+
+    The frequency histogram of the image is computed on the MGRS tile grid
+    and written with one row per class value, so the class areas can be
+    summarized from the tables without reading the images.
+
+    Parameters
+    ----------
+    asset_id : str
+        Tile image asset ID.
+    description : str
+        Export task description.
+    bucket_name : str
+    file_prefix : str
+        Output file path in the bucket (without the ".csv" extension).
+    export_info : dict
+        MGRS tile export information.
+
+    Returns
+    -------
+    ee.batch.Task
+
+    """
+    image = ee.Image(asset_id)
+    histogram = ee.Dictionary(image.reduceRegion(
+        reducer=ee.Reducer.frequencyHistogram().unweighted(),
+        geometry=ee.Geometry.Rectangle(
+            export_info['extent'], proj=export_info['crs'], geodesic=False
+        ),
+        crs=export_info['crs'],
+        crsTransform=json.loads(export_info['geo_str']),
+        maxPixels=export_info['maxpixels']*2,
+    ).get('cropland'))
+
+    def class_feature(value):
+        pixels = ee.Number(histogram.get(value))
+        return ee.Feature(None, {
+            'image_id': image.get('system:index'),
+            'mgrs_tile': image.get('mgrs_tile'),
+            'year': ee.Date(image.get('system:time_start')).get('year'),
+            'input_hash': image.get('input_hash'),
+            'class': ee.Number.parse(value).int(),
+            'pixels': pixels,
+            # The tile images are all on a 30m grid
+            'acres': pixels.multiply(900).divide(4046.8564224),
+        })
+
+    return ee.batch.Export.table.toCloudStorage(
+        ee.FeatureCollection(histogram.keys().map(class_feature)),
+        description=description,
+        bucket=bucket_name,
+        fileNamePrefix=file_prefix,
+        fileFormat='CSV',
+        selectors=['image_id', 'mgrs_tile', 'year', 'input_hash', 'class', 'pixels', 'acres'],
+    )
+
+
+def write_gcs_sidecar(bucket, blob_name, asset_id, year, properties, file_prefixes, export_ids):
+    """Write the ingestion information for a bucket export as a JSON file
+
+    The image properties are not written to the GeoTIFF by the bucket export,
+    so they are saved next to the files for the ingestion.
+
+    Parameters
+    ----------
+    bucket : google.cloud.storage.Bucket
+    blob_name : str
+        Sidecar file path in the bucket.
+    asset_id : str
+        Asset ID the files will be ingested to.
+    year : int
+    properties : dict
+        Image properties (the "system:" properties are not written).
+    file_prefixes : list
+        Bucket file prefixes of the exported files (one for each chunk).
+    export_ids : list
+        Export task descriptions.
+
+    Returns
+    -------
+    None
+
+    """
+    sidecar = {
+        'asset_id': asset_id,
+        'export_ids': export_ids,
+        'file_prefixes': file_prefixes,
+        'properties': {k: v for k, v in properties.items() if not k.startswith('system:')},
+        'start_time': f'{year}-01-01T00:00:00Z',
+    }
+    bucket.blob(blob_name).upload_from_string(
+        json.dumps(sidecar, indent=2, sort_keys=True), content_type='application/json'
+    )
+
+
+def export_geotransform(export_info):
+    """Return the GDAL geotransform of an MGRS tile export grid
+
+    The geotransform is built from the export crsTransform ("geo_str")
+    instead of the extent and shape, so local images are on the same grid
+    as the Earth Engine exports even if the extent isn't a multiple of the
+    cell size.
+
+    Parameters
+    ----------
+    export_info : dict
+        MGRS tile export information from mgrs_export_tiles().
+
+    Returns
+    -------
+    list : [x origin, cell width, 0, y origin, 0, -cell height]
+
+    """
+    x_scale, x_shear, x_origin, y_shear, y_scale, y_origin = json.loads(export_info['geo_str'])
+    return [x_origin, x_scale, x_shear, y_origin, y_shear, y_scale]
+
+
+def mgrs_export_chunks(export_info, chunks, cell_size=30):
+    """Split an MGRS tile into a grid of sub-tiles on the tile grid
+
+    The sub-tile origins are offset from the tile origin by whole cells so the
+    chunk images can be mosaicked back into the tile image without resampling.
+
+    Parameters
+    ----------
+    export_info : dict
+        MGRS tile export information from mgrs_export_tiles().
+    chunks : int
+        Number of sub-tile rows and columns.
+    cell_size : float, optional
+        Cell size of the tile grid (the default is 30).
+
+    Returns
+    ------
+    list of dicts: export information for each sub-tile, with the row/column
+        of the sub-tile in the "chunk" key (i.e. "r00c01")
+
+    """
+    cols, rows = map(int, export_info['shape_str'].split('x'))
+    xmin, ymax = export_info['extent'][0], export_info['extent'][3]
+
+    chunk_list = []
+    for row_i in range(chunks):
+        row_min, row_max = rows * row_i // chunks, rows * (row_i + 1) // chunks
+        for col_i in range(chunks):
+            col_min, col_max = cols * col_i // chunks, cols * (col_i + 1) // chunks
+            chunk_extent = [
+                xmin + col_min * cell_size, ymax - row_max * cell_size,
+                xmin + col_max * cell_size, ymax - row_min * cell_size,
+            ]
+            chunk_geo = [cell_size, 0, chunk_extent[0], 0, -cell_size, chunk_extent[3]]
+            chunk_shape = [col_max - col_min, row_max - row_min]
+            chunk_list.append({
+                **export_info,
+                'chunk': f'r{row_i:02d}c{col_i:02d}',
+                'extent': chunk_extent,
+                'geo_str': '[' + ','.join(map(str, chunk_geo)) + ']',
+                'maxpixels': chunk_shape[0] * chunk_shape[1],
+                'shape_str': '{0}x{1}'.format(*chunk_shape),
+            })
+
+    return chunk_list
 
 
 def mgrs_export_tiles(
@@ -627,13 +1785,51 @@ def arg_parse():
         help='Comma separated list and/or range of years')
     parser.add_argument(
         '--delay', default=0, type=float,
-        help='Delay (in seconds) between each export tasks')
+        help='Delay (in seconds) between starting each export task '
+             '(the tasks are started after all of the tiles are checked)')
+    parser.add_argument(
+        '--tasks', default=0, type=int, dest='max_tasks',
+        help='Maximum number of export tasks in flight (0 to start all of the '
+             'tasks after all of the tiles are checked and not wait on them)')
+    parser.add_argument(
+        '--retries', default=2, type=int,
+        help='Number of times a failed export task will be resubmitted')
+    parser.add_argument(
+        '--workers', default=4, type=int,
+        help='Number of threads for building and starting export tasks')
     parser.add_argument(
         '--key', type=utils.arg_valid_file, metavar='FILE',
         help='JSON key file')
     parser.add_argument(
         '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--changed-only', default=False, action='store_true', dest='changed_only',
+        help='Only rebuild existing images whose inputs have changed')
+    parser.add_argument(
+        '--stack', default=False, action='store_true',
+        help='Export one multi-band image per MGRS tile instead of the year images '
+             '(the year images are not built in the export collection)')
+    parser.add_argument(
+        '--plan', metavar='FILE',
+        help='Write the planned exports to a JSON/CSV file without starting tasks')
+    parser.add_argument(
+        '--plan-eecu-rate', default=2.0, type=float, dest='plan_eecu_rate',
+        metavar='RATE',
+        help='Estimated EECU-hours per billion export pixels for the plan '
+             '(calibrate from the batchEecuUsageSeconds of completed tasks)')
+    parser.add_argument(
+        '--chunks', default=1, type=int,
+        help='Export each MGRS tile as a N x N grid of sub-tiles and mosaic them')
+    parser.add_argument(
+        '--gcs', default=False, action='store_true',
+        help='Export Cloud-Optimized GeoTIFFs to the bucket for ingestion')
+    parser.add_argument(
+        '--resume', default=False, action='store_true',
+        help='Skip the tile years that were settled in the last run journal')
+    parser.add_argument(
+        '--histograms', default=False, action='store_true',
+        help='Export a CSV table of the class pixel counts of each tile image')
     parser.add_argument(
         '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -654,4 +1850,15 @@ if __name__ == '__main__':
         overwrite_flag=args.overwrite,
         delay=args.delay,
         gee_key_file=args.key,
+        max_tasks=args.max_tasks,
+        max_retries=args.retries,
+        workers=args.workers,
+        changed_only_flag=args.changed_only,
+        stack_flag=args.stack,
+        plan_path=args.plan,
+        plan_eecu_rate=args.plan_eecu_rate,
+        chunks=args.chunks,
+        gcs_flag=args.gcs,
+        resume_flag=args.resume,
+        histogram_flag=args.histograms,
     )
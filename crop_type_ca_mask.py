@@ -0,0 +1,243 @@
+#--------------------------------
+# Name:         crop_type_ca_mask.py
+# Purpose:      Build California mask images for the California MGRS tiles
+#--------------------------------
+
+import argparse
+from datetime import datetime, timezone
+from functools import partial
+import logging
+import os
+
+import ee
+from osgeo import gdal
+
+import openet.core
+import openet.core.utils as utils
+
+from crop_type_asset_mgrs_collection import (
+    CA_MGRS_TILES, export_geotransform, mgrs_export_tiles
+)
+from ee_state_cache import EEStateCache
+from export_scheduler import ExportScheduler
+
+gdal.UseExceptions()
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_ca_mask'
+TOOL_VERSION = '0.1.0'
+
+
+def main(
+        overwrite_flag=False,
+        local_flag=False,
+        delay=0,
+        gee_key_file=None,
+        ):
+    """Build the California mask images on the California MGRS tile grids
+
+    The masks are used to limit the California CDL band with an updateMask
+    instead of clipping to the California state geometry in every export.
+
+    Parameters
+    ----------
+    overwrite_flag : bool, optional
+        If True, overwrite existing images (the default is False).
+    local_flag : bool, optional
+        If True, build local GeoTIFF masks from the TIGER states shapefile
+        instead of Earth Engine assets (the default is False).
+    delay : float, optional
+        Delay time between each export task (the default is 0).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nBuild the California MGRS tile mask images')
+
+    # Hardcoded parameters
+    project_id = 'projects/openet/assets'
+    export_coll_id = f'{project_id}/crop_type/ca_mask'
+    mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
+    states_coll_id = 'TIGER/2018/States'
+    state = 'CA'
+
+    # Local masks are written to the local compositing workspace
+    states_path = os.path.join(os.getcwd(), 'local', 'tiger', 'tl_2018_us_state.shp')
+    output_ws = os.path.join(os.getcwd(), 'local', 'ca_mask')
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    export_list = mgrs_export_tiles(
+        study_area_coll_id=mgrs_ftr_coll_id,
+        mgrs_coll_id=mgrs_ftr_coll_id,
+        mgrs_tiles=CA_MGRS_TILES,
+    )
+    if not export_list:
+        logging.error('\nEmpty export list, exiting')
+        return False
+
+    if local_flag:
+        if not os.path.isdir(output_ws):
+            os.makedirs(output_ws)
+        for export_info in export_list:
+            mgrs_tile = export_info['index'].upper()
+            output_path = os.path.join(output_ws, f'{mgrs_tile}.tif')
+            logging.info(f'{output_path}')
+            if os.path.isfile(output_path) and not overwrite_flag:
+                logging.info('  Image already exists, skipping')
+                continue
+            build_local_mask(output_path, export_info, states_path, state)
+        return True
+
+    if not ee.data.getInfo(export_coll_id):
+        logging.info('\nExport collection does not exist and will be built'
+                     '\n  {}'.format(export_coll_id))
+        input('Press ENTER to continue')
+        ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, export_coll_id)
+
+    state_cache = EEStateCache()
+    asset_list = state_cache.get_ee_assets(export_coll_id)
+    tasks = state_cache.get_ee_tasks()
+
+    state_geom = (
+        ee.FeatureCollection(states_coll_id)
+        .filterMetadata('STUSPS', 'equals', state).first().geometry()
+    )
+
+    scheduler = ExportScheduler(delay=delay)
+
+    logging.info('\nImage Exports')
+    for export_info in export_list:
+        mgrs_tile = export_info['index'].upper()
+        asset_id = f'{export_coll_id}/{mgrs_tile}'
+        export_id = f'crop_type_ca_mask_{mgrs_tile}'
+        logging.info(f'{asset_id}')
+
+        if export_id in tasks.keys():
+            logging.info('  Task already submitted, skipping')
+            continue
+        elif asset_id in asset_list:
+            if not overwrite_flag:
+                logging.info('  Asset already exists, skipping')
+                continue
+            logging.info('  Asset already exists, removing')
+            ee.data.deleteAsset(asset_id)
+            state_cache.remove_asset(asset_id)
+
+        # Build the mask with the same clip call that was used in the exports
+        output_img = (
+            ee.Image.constant(1).uint8().clip(state_geom)
+            .rename(['mask'])
+            .set({
+                'core_version': openet.core.__version__,
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'mgrs_tile': mgrs_tile,
+                'state': state,
+                'states_coll_id': states_coll_id,
+                'tool_name': TOOL_NAME,
+                'tool_version': TOOL_VERSION,
+            })
+        )
+        scheduler.submit(export_id, partial(
+            ee.batch.Export.image.toAsset,
+            output_img,
+            description=export_id,
+            assetId=asset_id,
+            dimensions=export_info['shape_str'],
+            crs=export_info['crs'],
+            crsTransform=export_info['geo_str'],
+            maxPixels=export_info['maxpixels']*2,
+            pyramidingPolicy={'mask': 'mode'},
+        ))
+
+    logging.info('\nStarting export tasks')
+    scheduler.run()
+
+
+def build_local_mask(output_path, export_info, states_path, state):
+    """Rasterize a state boundary on the MGRS tile grid
+
+    Parameters
+    ----------
+    output_path : str
+        Output Cloud-Optimized GeoTIFF path.
+    export_info : dict
+        MGRS tile export information from mgrs_export_tiles().
+    states_path : str
+        TIGER states shapefile path.
+    state : str
+        State abbreviation (STUSPS value).
+
+    Returns
+    -------
+    str : output path
+
+    """
+    # The bounds are built from the export transform so the mask is on the EE grid
+    cols, rows = map(int, export_info['shape_str'].split('x'))
+    xmin, cell_x, _, ymax, _, cell_y = export_geotransform(export_info)
+    temp_path = output_path.replace('.tif', '_temp.tif')
+    gdal.Rasterize(
+        temp_path, states_path, format='GTiff', outputType=gdal.GDT_Byte,
+        outputSRS=export_info['crs'],
+        outputBounds=[xmin, ymax + rows * cell_y, xmin + cols * cell_x, ymax],
+        width=cols, height=rows, where=f"STUSPS = '{state}'",
+        burnValues=[1], initValues=[0], noData=0,
+        creationOptions=['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER'],
+    )
+    gdal.Translate(
+        output_path, temp_path, format='COG',
+        creationOptions=['COMPRESS=DEFLATE', 'OVERVIEW_RESAMPLING=MODE', 'BIGTIFF=IF_SAFER'],
+    )
+    gdal.GetDriverByName('GTiff').Delete(temp_path)
+
+    return output_path
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build the California MGRS tile mask images',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--local', default=False, action='store_true',
+        help='Build local GeoTIFF masks instead of Earth Engine assets')
+    parser.add_argument(
+        '--delay', default=0, type=float,
+        help='Delay (in seconds) between each export tasks')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing images')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(
+        overwrite_flag=args.overwrite,
+        local_flag=args.local,
+        delay=args.delay,
+        gee_key_file=args.key,
+    )
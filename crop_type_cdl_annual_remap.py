@@ -0,0 +1,226 @@
+#--------------------------------
+# Name:         crop_type_cdl_annual_remap.py
+# Purpose:      Build the annual crop remapped CDL image collection
+#--------------------------------
+
+import argparse
+from datetime import datetime, timezone
+from functools import partial
+import logging
+import os
+
+import ee
+
+import openet.core
+import openet.core.utils as utils
+
+import crop_type_remap
+from ee_state_cache import EEStateCache
+from export_scheduler import ExportScheduler
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_cdl_annual_remap'
+TOOL_VERSION = '0.1.0'
+
+REMAP_COLL_ID = 'projects/openet/assets/crop_type/cdl_annual_remap'
+
+
+def main(overwrite_flag=False, delay=0, gee_key_file=None):
+    """Build the annual crop remapped CDL images
+
+    One uint8 image is built for each CONUS CDL year, on the CDL grid.  The
+    images are tagged with the hash of the remap table and are only used by
+    the export tools if they were built with the current remap table.
+
+    Parameters
+    ----------
+    overwrite_flag : bool, optional
+        If True, overwrite existing images (the default is False).
+    delay : float, optional
+        Delay time between each export task (the default is 0).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nBuild the annual crop remapped CDL images')
+
+    # Hardcoded parameters
+    export_coll_id = REMAP_COLL_ID
+    cdl_coll_id = 'USDA/NASS/CDL'
+    cdl_year_min = 2008
+    annual_remap_path = os.path.join(os.getcwd(), 'cdl_annual_crop_remap_table.csv')
+
+    cdl_annual_lut = crop_type_remap.load_remap_table(annual_remap_path, identity=True)
+    cdl_remap_in, cdl_remap_out = cdl_annual_lut.ee_remap_args()
+    logging.info(f'Remap hash: {cdl_annual_lut.hash}')
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    if not ee.data.getInfo(export_coll_id):
+        logging.info('\nExport collection does not exist and will be built'
+                     '\n  {}'.format(export_coll_id))
+        input('Press ENTER to continue')
+        ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, export_coll_id)
+
+    state_cache = EEStateCache()
+    asset_list = state_cache.get_ee_assets(export_coll_id)
+    tasks = state_cache.get_ee_tasks()
+    remap_years = remapped_cdl_years(cdl_annual_lut.hash)
+
+    # Get the last available CDL year
+    cdl_year_max = int(utils.get_info(
+        ee.ImageCollection(cdl_coll_id)
+        .limit(1, 'system:time_start', False).first()
+        .get('system:index')
+    ))
+    logging.info(f'\nCDL years: {cdl_year_min}-{cdl_year_max}')
+
+    scheduler = ExportScheduler(delay=delay)
+
+    logging.info('\nImage Exports')
+    for year in range(cdl_year_min, cdl_year_max + 1):
+        cdl_img_id = f'{cdl_coll_id}/{year}'
+        asset_id = f'{export_coll_id}/{year}'
+        export_id = f'crop_type_cdl_annual_remap_{year}'
+        logging.info(f'{asset_id}')
+
+        if export_id in tasks.keys():
+            logging.info('  Task already submitted, skipping')
+            continue
+        elif asset_id in asset_list:
+            if str(year) in remap_years and not overwrite_flag:
+                logging.info('  Asset already exists, skipping')
+                continue
+            logging.info('  Asset already exists, removing')
+            ee.data.deleteAsset(asset_id)
+            state_cache.remove_asset(asset_id)
+
+        cdl_img = ee.Image(cdl_img_id).select(['cropland'])
+        cdl_proj = utils.get_info(cdl_img.projection())
+        output_img = (
+            cdl_img.remap(cdl_remap_in, cdl_remap_out)
+            .uint8()
+            .rename(['cropland'])
+            .set({
+                'system:time_start': ee.Date.fromYMD(year, 1, 1).millis(),
+                'cdl_img_id': cdl_img_id,
+                'core_version': openet.core.__version__,
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'remap_hash': cdl_annual_lut.hash,
+                'tool_name': TOOL_NAME,
+                'tool_version': TOOL_VERSION,
+            })
+        )
+        scheduler.submit(export_id, partial(
+            ee.batch.Export.image.toAsset,
+            output_img,
+            description=export_id,
+            assetId=asset_id,
+            region=cdl_img.geometry(),
+            crs=cdl_proj.get('crs', cdl_proj.get('wkt')),
+            crsTransform=cdl_proj['transform'],
+            maxPixels=1E13,
+            pyramidingPolicy={'cropland': 'mode'},
+        ))
+
+    logging.info('\nStarting export tasks')
+    scheduler.run()
+
+
+def remapped_cdl_years(remap_hash, remap_coll_id=REMAP_COLL_ID):
+    """Get the CDL years that were remapped with the current remap table
+
+    Parameters
+    ----------
+    remap_hash : str
+        Annual crop remap table hash (RemapLUT.hash).
+    remap_coll_id : str, optional
+        Remapped CDL image collection ID.
+
+    Returns
+    -------
+    list : CDL image IDs (years as strings), empty if the collection doesn't exist
+
+    """
+    if not ee.data.getInfo(remap_coll_id):
+        return []
+    return utils.get_info(
+        ee.ImageCollection(remap_coll_id)
+        .filter(ee.Filter.eq('remap_hash', remap_hash))
+        .aggregate_array('system:index')
+    )
+
+
+def cdl_annual_remap_image(
+        cdl_img_id,
+        remap_in,
+        remap_out,
+        remap_years=[],
+        remap_coll_id=REMAP_COLL_ID,
+        ):
+    """Return the annual crop remapped CDL cropland image
+
+    The precomputed image is used if it was built with the current remap,
+    otherwise the CDL image is remapped.
+
+    Parameters
+    ----------
+    cdl_img_id : str
+        CDL image ID.
+    remap_in : list
+    remap_out : list
+    remap_years : list, optional
+        CDL image IDs from remapped_cdl_years().
+    remap_coll_id : str, optional
+        Remapped CDL image collection ID.
+
+    Returns
+    -------
+    ee.Image
+
+    """
+    cdl_year = cdl_img_id.split('/')[-1]
+    if cdl_year in remap_years:
+        return ee.Image(f'{remap_coll_id}/{cdl_year}').select(['cropland'])
+    return ee.Image(cdl_img_id).select(['cropland']).remap(remap_in, remap_out)
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build the annual crop remapped CDL images',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--delay', default=0, type=float,
+        help='Delay (in seconds) between each export tasks')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing images')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(overwrite_flag=args.overwrite, delay=args.delay, gee_key_file=args.key)
@@ -0,0 +1,438 @@
+#--------------------------------
+# Name:         crop_type_field_rasters.py
+# Purpose:      Rasterize the state field crop types to the MGRS tile grids
+#--------------------------------
+
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import re
+import sys
+
+import ee
+from google.cloud import storage
+from osgeo import gdal, ogr, osr
+
+import openet.core.utils as utils
+
+from crop_type_asset_mgrs_collection import export_geotransform, mgrs_export_tiles
+from mgrs_state_table import load_mgrs_state_table
+
+# The field store module is in the fields folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fields'))
+from field_store import read_fields, state_exists, state_metadata
+
+gdal.UseExceptions()
+ogr.UseExceptions()
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_field_rasters'
+TOOL_VERSION = '0.1.0'
+
+PROJECT_NAME = 'openet'
+BUCKET_NAME = 'openet_temp'
+BUCKET_FOLDER = 'crop_type_fields'
+
+# MGRS latitude bands (without I and O)
+MGRS_LAT_BANDS = 'CDEFGHJKLMNPQRSTUVWX'
+
+
+def main(
+        mgrs_tiles=None,
+        utm_zones=None,
+        overwrite_flag=False,
+        upload_flag=False,
+        gee_key_file=None,
+        ):
+    """Rasterize the state field crop types to multiband MGRS tile images
+
+    Each tile image has a uint8 band for each "CROP_YYYY" column so that the
+    field polygons only need to be rasterized once per release instead of
+    once per tile and year.
+
+    Parameters
+    ----------
+    mgrs_tiles : list, optional
+    utm_zones : list, optional
+    overwrite_flag : bool, optional
+        If True, overwrite existing files (the default is False).
+    upload_flag : bool, optional
+        If True, upload the images to the bucket and ingest them into the
+        field raster collection (the default is False).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nRasterize the state field crop types to the MGRS tiles')
+
+    # Hardcoded parameters
+    project_id = 'projects/openet/assets'
+
+    # The field raster collection is named using the field folder date
+    field_version = '2024-02-01'
+    field_raster_coll_id = f'{project_id}/crop_type/field_rasters/{field_version}'
+    # The update times of the field collections are saved on the images so the
+    #   export tool only uses the images built for the current collections
+    crop_type_folder_id = f'{project_id}/features/fields/{field_version}'
+
+    mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
+    states_coll_id = 'TIGER/2018/States'
+    states_name_property = 'STUSPS'
+    mgrs_state_table_path = os.path.join(os.getcwd(), 'mgrs_state_table.json')
+
+    # The field crop types are read from the field store ("fields/parquet/<STATE>")
+    #   since the field tools only write the crop types to the store
+    # The tile images are written to the local compositing field folder
+    store_ws = os.path.join(os.getcwd(), 'fields', 'parquet')
+    output_ws = os.path.join(os.getcwd(), 'local', 'fields')
+
+    supported_mgrs_tiles = [
+        '10S', '10T', '10U', '11R', '11S', '11T', '11U', '12R', '12S', '12T', '12U',
+        '13R', '13S', '13T', '13U', '14R', '14S', '14T', '14U', '15R', '15S', '15T', '15U',
+        '16R', '16S', '16T', '16U', '17R', '17S', '17T', '17U', '18S', '18T', '18U',
+        '19T', '19U'
+    ]
+
+    if mgrs_tiles:
+        mgrs_tiles = sorted([y.strip() for x in mgrs_tiles for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs in supported_mgrs_tiles]
+    else:
+        mgrs_tiles = supported_mgrs_tiles[:]
+    if utm_zones:
+        utm_zones = sorted([y.strip() for x in utm_zones for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs[:2] in utm_zones]
+    logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
+
+    if not os.path.isdir(output_ws):
+        os.makedirs(output_ws)
+
+    field_states = sorted(
+        state for state in os.listdir(store_ws)
+        if re.match(r'^[A-Z]{2}$', state) and state_exists(store_ws, state)
+    )
+    logging.info(f'\nStates in the field store:\n  {", ".join(field_states)}')
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    crop_type_versions = {
+        asset['id'].split('/')[-1]: asset['updateTime']
+        for asset in ee.data.listAssets({'parent': crop_type_folder_id}).get('assets', [])
+        if asset['type'] == 'TABLE'
+    }
+
+    export_list = mgrs_export_tiles(
+        study_area_coll_id=mgrs_ftr_coll_id,
+        mgrs_coll_id=mgrs_ftr_coll_id,
+        mgrs_tiles=mgrs_tiles,
+    )
+    if not export_list:
+        logging.error('\nEmpty export list, exiting')
+        return False
+
+    logging.info('\nReading MGRS tile state table')
+    mgrs_state_table = load_mgrs_state_table(
+        mgrs_state_table_path, export_list, mgrs_ftr_coll_id,
+        states_coll_id, states_name_property,
+    )
+
+    if upload_flag:
+        if not ee.data.getInfo(field_raster_coll_id.rsplit('/', 1)[0]):
+            logging.info('\nFolder does not exist and will be built'
+                         '\n  {}'.format(field_raster_coll_id.rsplit('/', 1)[0]))
+            input('Press ENTER to continue')
+            ee.data.createAsset({'type': 'FOLDER'}, field_raster_coll_id.rsplit('/', 1)[0])
+        if not ee.data.getInfo(field_raster_coll_id):
+            logging.info('\nField raster collection does not exist and will be built'
+                         '\n  {}'.format(field_raster_coll_id))
+            input('Press ENTER to continue')
+            ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, field_raster_coll_id)
+        asset_list = utils.get_ee_assets(field_raster_coll_id)
+        bucket = storage.Client(project=PROJECT_NAME).bucket(BUCKET_NAME)
+
+    for export_info in export_list:
+        mgrs_tile = export_info['index'].upper()
+        logging.info(f'MGRS Tile: {mgrs_tile}')
+        output_path = os.path.join(output_ws, f'{mgrs_tile}.tif')
+        bucket_path = f'gs://{BUCKET_NAME}/{BUCKET_FOLDER}/{field_version}/{mgrs_tile}.tif'
+        asset_id = f'{field_raster_coll_id}/{mgrs_tile}'
+
+        # The states are in the same order as the export tool field collection
+        tile_states = sorted(s for s in mgrs_state_table[mgrs_tile] if s in field_states)
+        logging.info(f'  States: {", ".join(tile_states)}')
+        if not tile_states:
+            logging.info('  No field store states for tile, skipping')
+            continue
+        field_versions = json.dumps(
+            {state: crop_type_versions.get(state) for state in tile_states}, sort_keys=True
+        )
+
+        if os.path.isfile(output_path) and overwrite_flag:
+            logging.debug('  Image already exists - removing')
+            gdal.GetDriverByName('GTiff').Delete(output_path)
+        elif (os.path.isfile(output_path) and
+                gdal.Info(output_path, format='json').get('metadata', {}).get('', {})
+                .get('field_versions') != field_versions):
+            logging.info('  Field collections have changed, removing image')
+            gdal.GetDriverByName('GTiff').Delete(output_path)
+        if not os.path.isfile(output_path):
+            rasterize_tile_fields(
+                output_path, export_info, store_ws, tile_states, field_versions
+            )
+
+        if not upload_flag:
+            continue
+        elif (asset_id in asset_list and not overwrite_flag and
+                ee.data.getAsset(asset_id).get('properties', {})
+                .get('field_versions') == field_versions):
+            logging.info('  Asset already exists, skipping')
+            continue
+
+        logging.info(f'  Uploading to bucket\n  {bucket_path}')
+        blob = bucket.blob(bucket_path.replace(f'gs://{BUCKET_NAME}/', ''))
+        blob.upload_from_filename(output_path)
+
+        logging.info(f'  Ingesting into Earth Engine\n  {asset_id}')
+        output_ds = gdal.Open(output_path)
+        band_names = [
+            output_ds.GetRasterBand(i).GetDescription()
+            for i in range(1, output_ds.RasterCount + 1)
+        ]
+        output_ds = None
+        params = {
+            'name': asset_id,
+            'bands': [
+                {'id': band_name, 'tilesetId': 'image', 'tilesetBandIndex': i}
+                for i, band_name in enumerate(band_names)
+            ],
+            'tilesets': [{'id': 'image', 'sources': [{'uris': [bucket_path]}]}],
+            'missingData': {'values': [0]},
+            'pyramidingPolicy': 'MODE',
+            'properties': {
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'field_states': ','.join(tile_states),
+                'field_version': field_version,
+                'field_versions': field_versions,
+                'mgrs_tile': mgrs_tile,
+                'tool_name': TOOL_NAME,
+                'tool_version': TOOL_VERSION,
+            },
+        }
+        try:
+            ee.data.startIngestion(ee.data.newTaskId()[0], params, allow_overwrite=True)
+        except Exception as e:
+            logging.exception(f'  Exception: {e}')
+            continue
+
+
+def rasterize_tile_fields(output_path, export_info, store_ws, states, field_versions=''):
+    """Rasterize the field crop type columns for one MGRS tile
+
+    The fields intersecting the tile are read from the field store for each
+    state (only the MGRS zone partitions of the tile and its neighbors, and
+    the row groups that intersect the tile extent) and copied to an in
+    memory layer, then each "CROP_YYYY" column is burned into a separate
+    band.  The same filtering as the Earth Engine field layer is applied
+    (crop type > 0 and not between 80.5 and 195.5).
+
+    The Earth Engine field layer keeps the first field where fields overlap
+    (reduceToImage with a first reducer) and the rasterize keeps the last
+    field burned, so the fields are burned in the reverse of the field
+    collection order (states in order, and the fields in the store order).
+
+    Parameters
+    ----------
+    output_path : str
+        Output Cloud-Optimized GeoTIFF path.
+    export_info : dict
+        MGRS tile export information from mgrs_export_tiles().
+    store_ws : str
+        Field store folder.
+    states : list
+        States intersecting the tile (in the export tool field collection order).
+    field_versions : str, optional
+        Field collection update times (JSON) written to the image metadata.
+
+    Returns
+    -------
+    list : crop type band names
+
+    """
+    # The grid is built from the export transform so it matches the EE grid
+    cols, rows = map(int, export_info['shape_str'].split('x'))
+    geotransform = export_geotransform(export_info)
+    xmin, cell_x, _, ymax, _, cell_y = geotransform
+    xmax, ymin = xmin + cols * cell_x, ymax + rows * cell_y
+
+    tile_srs = osr.SpatialReference()
+    tile_srs.ImportFromEPSG(int(export_info['crs'].split(':')[-1]))
+    tile_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    tile_geom = ogr.CreateGeometryFromWkt(
+        f'POLYGON(({xmin} {ymin}, {xmax} {ymin}, {xmax} {ymax}, {xmin} {ymax}, {xmin} {ymin}))'
+    )
+    tile_geom.AssignSpatialReference(tile_srs)
+
+    # Copy the intersecting fields from all the states to a single layer
+    logging.info('  Reading fields')
+    mem_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    mem_layer = mem_ds.CreateLayer('fields', tile_srs, ogr.wkbMultiPolygon)
+    crop_fields = set()
+    state_fields = []
+    for state in states:
+        schema, geo, _ = state_metadata(store_ws, state)
+        store_srs = osr.SpatialReference()
+        store_srs.SetFromUserInput(json.dumps(geo['columns']['geometry']['crs']))
+        store_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        store_tx = osr.CoordinateTransformation(store_srs, tile_srs)
+        filter_geom = tile_geom.Clone()
+        filter_geom.TransformTo(store_srs)
+
+        state_crop_fields = [c for c in schema.names if re.match(r'^CROP_\d{4}$', c)]
+        fields_df = read_fields(
+            store_ws, state, columns=['geometry'] + state_crop_fields,
+            mgrs_zones=mgrs_neighbor_zones(export_info['index']),
+            bbox=list(filter_geom.GetEnvelope()[i] for i in [0, 2, 1, 3]),
+        )
+        logging.debug(f'    {state}: {len(fields_df)}')
+        for field_name in sorted(set(state_crop_fields) - crop_fields):
+            mem_layer.CreateField(ogr.FieldDefn(field_name, ogr.OFTReal))
+        crop_fields.update(state_crop_fields)
+        state_fields.append([fields_df, state_crop_fields, store_srs, store_tx])
+
+    # Add the fields in reverse order so the first field is burned last
+    mem_defn = mem_layer.GetLayerDefn()
+    for fields_df, state_crop_fields, store_srs, store_tx in state_fields[::-1]:
+        crop_values = [fields_df[c].tolist()[::-1] for c in state_crop_fields]
+        geometries = fields_df['geometry'].tolist()[::-1]
+        for geometry, values in zip(geometries, zip(*crop_values)):
+            if geometry is None:
+                continue
+            geom = ogr.CreateGeometryFromWkb(geometry)
+            geom.AssignSpatialReference(store_srs)
+            geom.Transform(store_tx)
+            mem_ftr = ogr.Feature(mem_defn)
+            mem_ftr.SetGeometry(geom)
+            for field_name, value in zip(state_crop_fields, values):
+                # Skip the missing (None/NaN) values
+                if value is None or value != value:
+                    continue
+                mem_ftr.SetField(field_name, value)
+            mem_layer.CreateFeature(mem_ftr)
+            mem_ftr = None
+    logging.info(f'  Fields: {mem_layer.GetFeatureCount()}')
+
+    band_names = sorted(crop_fields)
+    logging.info(f'  Rasterizing {len(band_names)} crop type columns')
+    temp_path = output_path.replace('.tif', '_temp.tif')
+    temp_ds = gdal.GetDriverByName('GTiff').Create(
+        temp_path, cols, rows, len(band_names), gdal.GDT_Byte,
+        ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER', 'INTERLEAVE=BAND']
+    )
+    temp_ds.SetProjection(tile_srs.ExportToWkt())
+    temp_ds.SetGeoTransform(geotransform)
+    temp_ds.SetMetadata({'field_versions': field_versions})
+    for band_i, band_name in enumerate(band_names):
+        logging.debug(f'    {band_name}')
+        temp_band = temp_ds.GetRasterBand(band_i + 1)
+        temp_band.SetDescription(band_name)
+        temp_band.SetNoDataValue(0)
+        temp_band.Fill(0)
+        # 176 fields will not be burned in (for now)
+        # Filtering on +/-0.5 values to handle floating point numbers in the crop types
+        mem_layer.SetAttributeFilter(
+            f'{band_name} > 0 AND ({band_name} < 80.5 OR {band_name} > 195.5)'
+        )
+        gdal.RasterizeLayer(
+            temp_ds, [band_i + 1], mem_layer, options=[f'ATTRIBUTE={band_name}']
+        )
+    mem_layer.SetAttributeFilter(None)
+    temp_ds = None
+    mem_ds = None
+
+    # Build the COG with mode overviews so the pyramids match the assets
+    gdal.Translate(
+        output_path, temp_path, format='COG',
+        creationOptions=['COMPRESS=DEFLATE', 'OVERVIEW_RESAMPLING=MODE', 'BIGTIFF=IF_SAFER'],
+    )
+    gdal.GetDriverByName('GTiff').Delete(temp_path)
+
+    return band_names
+
+
+def mgrs_neighbor_zones(mgrs_tile):
+    """Return the MGRS zone of a tile and the zones next to it
+
+    The field store is partitioned by the MGRS zone the field was assigned to,
+    so fields that cross the tile edge can be in a neighboring zone.
+
+    Parameters
+    ----------
+    mgrs_tile : str
+        MGRS tile/zone (i.e. "10S").
+
+    Returns
+    -------
+    list
+
+    """
+    utm_zone, lat_band = int(mgrs_tile[:-1]), mgrs_tile[-1].upper()
+    band_i = MGRS_LAT_BANDS.index(lat_band)
+    return sorted(
+        f'{zone}{MGRS_LAT_BANDS[i]}'
+        for zone in range(max(utm_zone - 1, 1), min(utm_zone + 1, 60) + 1)
+        for i in range(max(band_i - 1, 0), min(band_i + 1, len(MGRS_LAT_BANDS) - 1) + 1)
+    )
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Rasterize the state field crop types to the MGRS tiles',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--mgrs', default='', nargs='+',
+        help='Comma/space separated list of MGRS tiles')
+    parser.add_argument(
+        '--utm', default='', nargs='+',
+        help='Comma/space separated list of UTM zones')
+    parser.add_argument(
+        '--upload', default=False, action='store_true',
+        help='Upload and ingest the tile images into Earth Engine')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing files')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(
+        mgrs_tiles=args.mgrs,
+        utm_zones=args.utm,
+        overwrite_flag=args.overwrite,
+        upload_flag=args.upload,
+        gee_key_file=args.key,
+    )
@@ -0,0 +1,231 @@
+#--------------------------------
+# Name:         crop_type_gcs_ingest.py
+# Purpose:      Ingest the bucket crop type MGRS tile exports into the collection
+#--------------------------------
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import tempfile
+
+import ee
+from google.cloud import storage
+from osgeo import gdal
+
+import openet.core.utils as utils
+
+from ee_state_cache import EEStateCache
+
+gdal.UseExceptions()
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_gcs_ingest'
+TOOL_VERSION = '0.1.0'
+
+PROJECT_NAME = 'openet'
+
+
+def main(overwrite_flag=False, overviews_flag=False, workers=8, gee_key_file=None):
+    """Ingest the crop type MGRS tile GeoTIFFs exported to the bucket
+
+    Each image exported by crop_type_asset_mgrs_collection.py with the "--gcs"
+    flag has a JSON sidecar file with the asset ID, start time, properties,
+    and file prefixes.  The ingestion manifests are built from the sidecars
+    and submitted in parallel.  Images that were exported in chunks are
+    ingested as a single image with a tileset source for each chunk file.
+
+    Parameters
+    ----------
+    overwrite_flag : bool, optional
+        If True, ingest images that already exist in the collection
+        (the default is False).
+    overviews_flag : bool, optional
+        If True, rebuild the GeoTIFF overviews with mode resampling before
+        ingesting (the default is False).
+    workers : int, optional
+        Number of threads used to submit the ingestion tasks (the default is 8).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nIngest the crop type MGRS tile bucket exports')
+
+    # Hardcoded parameters
+    # These must match the values in crop_type_asset_mgrs_collection.py
+    project_id = 'projects/openet/assets'
+    export_coll_id = f'{project_id}/crop_type/v2023a'
+    gcs_bucket_name = 'openet'
+    gcs_folder = f'crop_type/images/{export_coll_id.split("/")[-1]}'
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    state_cache = EEStateCache()
+    asset_list = state_cache.get_ee_assets(export_coll_id)
+    tasks = state_cache.get_ee_tasks()
+
+    logging.info('\nGetting bucket file list')
+    bucket = storage.Client(project=PROJECT_NAME).bucket(gcs_bucket_name)
+    gcs_files = sorted(blob.name for blob in bucket.list_blobs(prefix=f'{gcs_folder}/'))
+    sidecar_names = [x for x in gcs_files if x.endswith('.json')]
+    logging.info(f'  Sidecar files: {len(sidecar_names)}')
+
+    ingest_list = []
+    for sidecar_name in sidecar_names:
+        sidecar = json.loads(bucket.blob(sidecar_name).download_as_text())
+        asset_id = sidecar['asset_id']
+        logging.info(f'{asset_id}')
+
+        if asset_id in asset_list and not overwrite_flag:
+            logging.info('  Asset already exists, skipping')
+            continue
+        elif any(export_id in tasks.keys() for export_id in sidecar['export_ids']):
+            logging.info('  Export task not finished, skipping')
+            continue
+
+        # Large exports may be split into multiple files ("<prefix>-<row>-<col>.tif")
+        file_names = [
+            x for prefix in sidecar['file_prefixes'] for x in gcs_files
+            if x == f'{prefix}.tif' or (x.startswith(f'{prefix}-') and x.endswith('.tif'))
+        ]
+        missing = [
+            prefix for prefix in sidecar['file_prefixes']
+            if not any(x.startswith(prefix) for x in file_names)
+        ]
+        if missing:
+            # Remove the sidecar so the export tool will export the image again
+            logging.warning(f'  {len(missing)} export file(s) missing, removing sidecar')
+            bucket.blob(sidecar_name).delete()
+            continue
+
+        ingest_list.append([sidecar, file_names])
+
+    if not ingest_list:
+        logging.info('\nNo images to ingest')
+        return True
+
+    def ingest(sidecar, file_names):
+        if overviews_flag:
+            for file_name in file_names:
+                build_mode_overviews(bucket, file_name)
+        params = {
+            'name': sidecar['asset_id'],
+            'bands': [{'id': 'cropland', 'tilesetId': 'image', 'tilesetBandIndex': 0}],
+            'tilesets': [{
+                'id': 'image',
+                'sources': [
+                    {'uris': [f'gs://{gcs_bucket_name}/{file_name}']}
+                    for file_name in file_names
+                ],
+            }],
+            'missingData': {'values': [0]},
+            'pyramidingPolicy': 'MODE',
+            'startTime': sidecar['start_time'],
+            'properties': {
+                **sidecar['properties'],
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'ingest_tool_name': TOOL_NAME,
+                'ingest_tool_version': TOOL_VERSION,
+            },
+        }
+        ee.data.startIngestion(ee.data.newTaskId()[0], params, allow_overwrite=True)
+        return sidecar['asset_id']
+
+    logging.info(f'\nIngesting {len(ingest_list)} images')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            [sidecar['asset_id'], executor.submit(ingest, sidecar, file_names)]
+            for sidecar, file_names in ingest_list
+        ]
+        for asset_id, future in futures:
+            try:
+                future.result()
+                logging.info(f'  {asset_id.split("/")[-1]} - ingestion started')
+            except Exception as e:
+                logging.warning(f'  {asset_id.split("/")[-1]} - ingestion failed\n  {e}')
+
+
+def build_mode_overviews(bucket, file_name):
+    """Rebuild a bucket Cloud-Optimized GeoTIFF with mode resampled overviews
+
+    The Earth Engine bucket export doesn't have an option for the overview
+    resampling, so the file is rewritten with the same COG settings as the
+    local compositing tool.
+
+    Parameters
+    ----------
+    bucket : google.cloud.storage.Bucket
+    file_name : str
+        GeoTIFF path in the bucket.
+
+    Returns
+    -------
+    None
+
+    """
+    blob = bucket.blob(file_name)
+    blob.reload()
+    if blob.metadata and blob.metadata.get('overview_resampling') == 'MODE':
+        return
+
+    with tempfile.TemporaryDirectory() as temp_ws:
+        input_path = os.path.join(temp_ws, 'input.tif')
+        output_path = os.path.join(temp_ws, 'output.tif')
+        blob.download_to_filename(input_path)
+        gdal.Translate(
+            output_path, input_path, format='COG',
+            creationOptions=['COMPRESS=DEFLATE', 'OVERVIEW_RESAMPLING=MODE', 'BIGTIFF=IF_SAFER'],
+        )
+        blob.metadata = {'overview_resampling': 'MODE'}
+        blob.upload_from_filename(output_path)
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Ingest the crop type MGRS tile bucket exports',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--overviews', default=False, action='store_true',
+        help='Rebuild the GeoTIFF overviews with mode resampling before ingesting')
+    parser.add_argument(
+        '--workers', default=8, type=int,
+        help='Number of threads for submitting the ingestion tasks')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing images')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(
+        overwrite_flag=args.overwrite,
+        overviews_flag=args.overviews,
+        workers=args.workers,
+        gee_key_file=args.key,
+    )
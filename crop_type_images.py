@@ -0,0 +1,67 @@
+#--------------------------------
+# Name:         crop_type_images.py
+# Purpose:      List the crop type MGRS tile year images in a local or bucket folder
+#--------------------------------
+
+import logging
+import os
+import re
+
+from osgeo import gdal
+
+gdal.UseExceptions()
+
+# Tile year image file names
+# Chunked exports have a "_<chunk>" suffix (i.e. "_r00c01") and large Earth
+#   Engine bucket exports are split into "-<row>-<col>" files
+IMAGE_RE = re.compile(r'^(\w+?)_(\d{4})0101(_r\d{2}c\d{2})?(-\d+-\d+)?\.tif$')
+
+
+def list_tile_images(image_ws, vrt_ws, mgrs_tiles=None, years=None):
+    """List the tile year images in a folder
+
+    Images that were exported as multiple files (chunks or split bucket
+    exports) are read through a VRT of all of the files of the image, which
+    is written to the VRT folder.
+
+    Parameters
+    ----------
+    image_ws : str
+        Image folder (a local folder or a GDAL /vsigs/ bucket folder).
+    vrt_ws : str
+        Local folder for the VRT files.
+    mgrs_tiles : list, optional
+        MGRS tiles to include.  If not set, all tiles are included.
+    years : list, optional
+        Years to include.  If not set, all years are included.
+
+    Returns
+    -------
+    dict : image path (or VRT path) keyed by the image ID (i.e. "10S_20200101")
+
+    """
+    image_files = {}
+    for item in gdal.ReadDir(image_ws) or []:
+        image_match = IMAGE_RE.match(item)
+        if not image_match:
+            continue
+        mgrs_tile, year = image_match.group(1), int(image_match.group(2))
+        if mgrs_tiles and mgrs_tile not in mgrs_tiles:
+            continue
+        elif years and year not in years:
+            continue
+        image_files.setdefault(f'{mgrs_tile}_{year}0101', []).append(f'{image_ws}/{item}')
+
+    image_paths = {}
+    for image_id, file_paths in sorted(image_files.items()):
+        if len(file_paths) == 1:
+            image_paths[image_id] = file_paths[0]
+            continue
+        if not os.path.isdir(vrt_ws):
+            os.makedirs(vrt_ws)
+        vrt_path = os.path.join(vrt_ws, f'{image_id}.vrt')
+        logging.debug(f'  {image_id} - building VRT of {len(file_paths)} files')
+        gdal.BuildVRT(vrt_path, sorted(file_paths))
+        image_paths[image_id] = vrt_path
+
+    return image_paths
@@ -0,0 +1,543 @@
+#--------------------------------
+# Name:         crop_type_local_composite.py
+# Purpose:      Build crop type MGRS tiles locally from GeoTIFF/COG inputs
+#--------------------------------
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+import logging
+import os
+import re
+
+import ee
+import numpy as np
+from osgeo import gdal, ogr
+
+import openet.core.utils as utils
+
+import crop_type_remap
+from crop_type_asset_mgrs_collection import (
+    NALCMS_CDL_REMAP, TOOL_VERSION, export_geotransform, mgrs_export_tiles,
+    tile_year_sources
+)
+
+gdal.UseExceptions()
+ogr.UseExceptions()
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_local_composite'
+
+
+def main(
+        years=None,
+        mgrs_tiles=None,
+        utm_zones=None,
+        workers=1,
+        overwrite_flag=False,
+        gee_key_file=None
+        ):
+    """Build crop type MGRS tile COGs locally from GeoTIFF/COG inputs
+
+    Parameters
+    ----------
+    years : list, optional
+    mgrs_tiles : list, optional
+    utm_zones : list, optional
+    workers : int, optional
+        Number of tile/year images to build in parallel (the default is 1).
+    overwrite_flag : bool, optional
+        If True, overwrite existing files (the default is False).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+        Earth Engine is only used to read the MGRS tile grid.
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nBuild crop type MGRS tiles from local images')
+
+    # Hardcoded parameters
+    project_id = 'projects/openet/assets'
+    version = 'v2023a'
+
+    # Using ERA5-Land MGRS tiles to avoid clipping outside CONUS
+    mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
+
+    # The source image IDs are only used to select the local files
+    cdl_coll_id = 'USDA/NASS/CDL'
+    ca_coll_id = f'{project_id}/crop_type/california'
+    nalcms_img_id = 'USGS/NLCD_RELEASES/2020_REL/NALCMS'
+
+    # Local input/output workspaces
+    # Field rasters are multiband images (one "CROP_YYYY" band per year)
+    #   on the MGRS tile grid, named "<MGRS>.tif"
+    # CDL images are the NASS national downloads, named "<YEAR>_30m_cdls.tif"
+    # LandIQ images are the UTM zone images built by ca_shp_to_image_asset.py
+    input_ws = os.path.join(os.getcwd(), 'local')
+    field_ws = os.path.join(input_ws, 'fields')
+    cdl_ws = os.path.join(input_ws, 'cdl')
+    landiq_ws = os.path.join(os.getcwd(), 'california', 'images')
+    nalcms_path = os.path.join(input_ws, 'nalcms', 'NA_NALCMS_landcover_2020_30m.tif')
+    states_path = os.path.join(input_ws, 'tiger', 'tl_2018_us_state.shp')
+    mgrs_mask_ws = os.path.join(input_ws, 'mgrs_mask')
+    # California tile masks built by crop_type_ca_mask.py (with --local)
+    ca_mask_ws = os.path.join(input_ws, 'ca_mask')
+    output_ws = os.path.join(os.getcwd(), 'images', version)
+
+    supported_mgrs_tiles = [
+        '10S', '10T', '10U', '11R', '11S', '11T', '11U', '12R', '12S', '12T', '12U',
+        '13R', '13S', '13T', '13U', '14R', '14S', '14T', '14U', '15R', '15S', '15T', '15U',
+        '16R', '16S', '16T', '16U', '17R', '17S', '17T', '17U', '18S', '18T', '18U',
+        '19T', '19U'
+    ]
+
+    annual_remap_path = os.path.join(os.getcwd(), 'cdl_annual_crop_remap_table.csv')
+
+    year_min = 1985
+    year_max = 2023
+    cdl_year_min = 2008
+
+    # Parse user inputs
+    if not years:
+        years = list(range(year_min, year_max+1))
+    else:
+        years = sorted(list(set(
+            int(year) for year_str in years
+            for year in utils.str_ranges_2_list(year_str)
+            if ((year <= year_max) and (year >= year_min))
+        )))
+    logging.info(f'Years: {", ".join(map(str, years))}')
+
+    if mgrs_tiles:
+        mgrs_tiles = sorted([y.strip() for x in mgrs_tiles for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs in supported_mgrs_tiles]
+    else:
+        mgrs_tiles = supported_mgrs_tiles[:]
+    if utm_zones:
+        utm_zones = sorted([y.strip() for x in utm_zones for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs[:2] in utm_zones]
+    logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
+
+    if not os.path.isdir(output_ws):
+        os.makedirs(output_ws)
+
+    # Build the remap lookup tables
+    # All unassigned CDL values are set to remap to themselves
+    remap_luts = {
+        'cdl_annual': crop_type_remap.load_remap_table(annual_remap_path, identity=True),
+        'nalcms': crop_type_remap.RemapLUT(NALCMS_CDL_REMAP),
+    }
+
+    # Get the last available local CDL year
+    cdl_years = [
+        int(item[:4]) for item in os.listdir(cdl_ws)
+        if re.match(r'^\d{4}_30m_cdls\.tif$', item)
+    ]
+    if not cdl_years:
+        logging.error('\nNo local CDL images, exiting')
+        return False
+    cdl_year_max = max(cdl_years)
+    logging.info(f'\nLast available CDL year: {cdl_year_max}')
+
+    # The MGRS tile grid is read from Earth Engine so that the local images
+    #   are built on exactly the same grid as the Earth Engine exports
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    export_list = mgrs_export_tiles(
+        study_area_coll_id=mgrs_ftr_coll_id,
+        mgrs_coll_id=mgrs_ftr_coll_id,
+        mgrs_tiles=mgrs_tiles,
+    )
+    if not export_list:
+        logging.error('\nEmpty export list, exiting')
+        return False
+
+    def local_path(source_id):
+        """Map an Earth Engine source image ID to the local file"""
+        if source_id == nalcms_img_id:
+            return nalcms_path
+        elif source_id.startswith(f'{ca_coll_id}/'):
+            year, utm_zone = source_id.split('/')[-1].split('_utm')
+            return os.path.join(landiq_ws, f'ca{year}_cdl_utm{utm_zone}.tif')
+        elif source_id.startswith(f'{cdl_coll_id}/'):
+            return os.path.join(cdl_ws, f'{source_id.split("/")[-1]}_30m_cdls.tif')
+        else:
+            raise ValueError(f'unsupported source image: {source_id}')
+
+    # Build the list of tile/year images to composite
+    logging.info('\nBuilding image list')
+    image_list = []
+    for export_info in export_list:
+        mgrs_tile = export_info['index'].upper()
+        mask_path = os.path.join(mgrs_mask_ws, f'{mgrs_tile.lower()}.tif')
+        if not os.path.isfile(mask_path):
+            logging.info(f'  {mgrs_tile} - MGRS mask image does not exist, not masking')
+            mask_path = None
+
+        for year in years:
+            image_id = f'{mgrs_tile}_{year}0101'
+            output_path = os.path.join(output_ws, f'{image_id}.tif')
+            if os.path.isfile(output_path) and not overwrite_flag:
+                logging.debug(f'  {image_id} - image already exists, skipping')
+                continue
+
+            sources = tile_year_sources(
+                mgrs_tile, year, cdl_year_min, cdl_year_max,
+                cdl_coll_id=cdl_coll_id,
+                ca_coll_id=ca_coll_id,
+                nalcms_img_id=nalcms_img_id,
+            )
+            for band_name, source in sources.items():
+                if band_name == 'fields':
+                    source['path'] = os.path.join(field_ws, f'{mgrs_tile}.tif')
+                else:
+                    source['path'] = local_path(source['id'])
+                if band_name == 'cdl_ca_img':
+                    source['clip_path'] = states_path
+                    ca_mask_path = os.path.join(ca_mask_ws, f'{mgrs_tile}.tif')
+                    if os.path.isfile(ca_mask_path):
+                        source['clip_mask_path'] = ca_mask_path
+
+            properties = {
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'mgrs_tile': mgrs_tile,
+                'tool_name': TOOL_NAME,
+                'tool_version': TOOL_VERSION,
+            }
+            for band_name, property_name in [
+                    ['landiq', 'custom_ca_img_id'], ['cdl_ca_img', 'cdl_ca_img_id'],
+                    ['cdl_conus_img', 'cdl_img_id'], ['nalcms_img', 'nalcms_img_id']]:
+                if band_name in sources.keys():
+                    properties[property_name] = sources[band_name]['id']
+            image_list.append([image_id, output_path, export_info, sources,
+                               mask_path, properties])
+
+    logging.info(f'\nBuilding {len(image_list)} images')
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(build_tile_image, *image_args, remap_luts): image_args[0]
+                for image_args in image_list
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.exception(f'{futures[future]} - {e}')
+                    continue
+                logging.info(f'{futures[future]}')
+    else:
+        for image_args in image_list:
+            logging.info(f'{image_args[0]}')
+            build_tile_image(*image_args, remap_luts)
+
+
+def build_tile_image(
+        image_id,
+        output_path,
+        export_info,
+        sources,
+        mask_path,
+        properties,
+        remap_luts,
+        block_rows=2048,
+        ):
+    """Composite the source images for one tile/year and write a COG
+
+    The tile is processed in blocks of rows to limit memory usage.  The class
+    pixel counts are accumulated from the blocks and written to a CSV file
+    next to the image ("<image_id>_histogram.csv").
+
+    Parameters
+    ----------
+    image_id : str
+    output_path : str
+        Output Cloud-Optimized GeoTIFF path.
+    export_info : dict
+        MGRS tile export information from mgrs_export_tiles().
+    sources : dict
+        Source information from tile_year_sources(), with the local "path" set.
+    mask_path : str, None
+        MGRS zone mask image path.  If None the image will not be masked.
+    properties : dict
+        Properties to write to the GeoTIFF metadata.
+    remap_luts : dict
+        RemapLUT objects keyed by remap name.
+    block_rows : int, optional
+        Number of rows to process at a time (the default is 2048).
+
+    Returns
+    -------
+    str : output path
+
+    """
+    # The grid is built from the export transform so it matches the EE grid
+    cols, rows = map(int, export_info['shape_str'].split('x'))
+    geotransform = export_geotransform(export_info)
+    xmin, cell_size, _, ymax, _, _ = geotransform
+    xmax = xmin + cols * cell_size
+
+    # Write the blocks to a temporary tiled GeoTIFF before building the COG
+    temp_path = output_path.replace('.tif', '_temp.tif')
+    temp_ds = gdal.GetDriverByName('GTiff').Create(
+        temp_path, cols, rows, 1, gdal.GDT_Byte,
+        ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER']
+    )
+    temp_ds.SetProjection(export_info['crs'])
+    temp_ds.SetGeoTransform(geotransform)
+    temp_band = temp_ds.GetRasterBand(1)
+    temp_band.SetNoDataValue(0)
+
+    histogram = np.zeros(256, dtype=np.int64)
+    for row_i in range(0, rows, block_rows):
+        block_shape = [min(block_rows, rows - row_i), cols]
+        block_extent = [
+            xmin, ymax - (row_i + block_shape[0]) * cell_size,
+            xmax, ymax - row_i * cell_size,
+        ]
+
+        layers = []
+        for band_name, source in sources.items():
+            if band_name == 'fields':
+                array = read_field_array(
+                    source['path'], source['column'], block_extent, block_shape,
+                    export_info['crs']
+                )
+                if array is None:
+                    continue
+                # 176 and other non-crop fields are not burned in (for now)
+                valid = (array > 0) & ((array < 81) | (array > 195))
+            else:
+                array = read_block_array(
+                    source['path'], block_extent, block_shape, export_info['crs']
+                )
+                valid = array > 0
+                for mask_value in source.get('mask_values', []):
+                    valid &= array != mask_value
+                if source['remap']:
+                    remap = remap_luts[
+                        'nalcms' if band_name == 'nalcms_img' else 'cdl_annual'
+                    ]
+                    # Values that are not in the remap table are masked
+                    #   to match the Earth Engine remap() call
+                    valid &= remap.defined[array]
+                    array = remap.remap(array)
+                if source.get('clip_mask_path'):
+                    valid &= read_block_array(
+                        source['clip_mask_path'], block_extent, block_shape,
+                        export_info['crs']
+                    ) > 0
+                elif source.get('clip_path'):
+                    valid &= read_state_mask(
+                        source['clip_path'], source['clip'], block_extent,
+                        block_shape, export_info['crs']
+                    )
+            layers.append([array, valid])
+
+        if mask_path:
+            mask = read_block_array(
+                mask_path, block_extent, block_shape, export_info['crs']
+            ) > 0
+        else:
+            mask = None
+
+        output = composite_stack(layers, mask)
+        histogram += np.bincount(output.ravel(), minlength=256)
+        temp_band.WriteArray(output, 0, row_i)
+
+    temp_ds.SetMetadata({k: str(v) for k, v in properties.items()})
+    temp_ds = None
+
+    # Build the COG with mode overviews so the pyramids match the assets
+    gdal.Translate(
+        output_path, temp_path, format='COG',
+        creationOptions=['COMPRESS=DEFLATE', 'OVERVIEW_RESAMPLING=MODE', 'BIGTIFF=IF_SAFER'],
+    )
+    gdal.GetDriverByName('GTiff').Delete(temp_path)
+
+    # Same columns as the exporter histogram tables (without the input hash)
+    # Class 0 is the nodata value and is not written
+    with open(output_path.replace('.tif', '_histogram.csv'), 'w') as f:
+        f.write('image_id,mgrs_tile,year,class,pixels,acres\n')
+        for value in np.nonzero(histogram[1:])[0] + 1:
+            f.write(f'{image_id},{properties["mgrs_tile"]},{image_id[-8:-4]},{value},'
+                    f'{histogram[value]},{histogram[value] * cell_size ** 2 / 4046.8564224}\n')
+
+    return output_path
+
+
+def composite_stack(layers, mask=None):
+    """Reduce a stack of images using the first valid (non-null) value
+
+    This is the local equivalent of the ee.Reducer.firstNonNull() reducer.
+
+    Parameters
+    ----------
+    layers : list
+        List of [array, valid] pairs in priority order.
+    mask : ndarray, None, optional
+        Boolean mask of pixels to keep.  All other pixels are set to 0.
+
+    Returns
+    -------
+    ndarray : uint8 array with 0 as the nodata value
+
+    """
+    output = np.zeros(layers[0][0].shape, dtype=np.uint8)
+    filled = np.zeros(layers[0][0].shape, dtype=bool)
+    for array, valid in layers:
+        update = valid & ~filled
+        output[update] = array[update]
+        filled |= update
+    if mask is not None:
+        output[~mask] = 0
+    return output
+
+
+def read_block_array(src_path, extent, shape, crs, band=1):
+    """Read a block of an image warped to the MGRS tile grid
+
+    Parameters
+    ----------
+    src_path : str
+    extent : list
+        Block extent [xmin, ymin, xmax, ymax] in the tile projection.
+    shape : list
+        Block shape [rows, cols].
+    crs : str
+        Tile projection (i.e. "EPSG:32610").
+    band : int, optional
+        Source band number (the default is 1).
+
+    Returns
+    -------
+    ndarray : uint8 array with the source nodata pixels set to 0
+
+    """
+    src_ds = gdal.Open(src_path)
+    if band != 1 or src_ds.RasterCount > 1:
+        src_ds = gdal.Translate('', src_ds, format='VRT', bandList=[band])
+    # Nearest neighbor since all of the images are categorical
+    warp_ds = gdal.Warp(
+        '', src_ds, format='MEM', dstSRS=crs, outputBounds=extent,
+        width=shape[1], height=shape[0], resampleAlg='near',
+        outputType=gdal.GDT_Byte, dstNodata=0,
+    )
+    array = warp_ds.GetRasterBand(1).ReadAsArray()
+    src_ds, warp_ds = None, None
+    return array
+
+
+def read_field_array(src_path, column, extent, shape, crs):
+    """Read the field crop type band for a single year
+
+    Parameters
+    ----------
+    src_path : str
+        Multiband field raster with band descriptions of "CROP_YYYY".
+    column : str
+        Field crop type column/band name.
+    extent : list
+    shape : list
+    crs : str
+
+    Returns
+    -------
+    ndarray, None : uint8 array or None if there is no band for the column
+
+    """
+    if not os.path.isfile(src_path):
+        return None
+    src_ds = gdal.Open(src_path)
+    band_names = [
+        src_ds.GetRasterBand(i).GetDescription()
+        for i in range(1, src_ds.RasterCount + 1)
+    ]
+    src_ds = None
+    if column not in band_names:
+        return None
+    return read_block_array(src_path, extent, shape, crs, band=band_names.index(column) + 1)
+
+
+def read_state_mask(states_path, state, extent, shape, crs):
+    """Rasterize a state boundary on the MGRS tile block grid
+
+    Parameters
+    ----------
+    states_path : str
+        TIGER states shapefile path.
+    state : str
+        State abbreviation (STUSPS value).
+    extent : list
+    shape : list
+    crs : str
+
+    Returns
+    -------
+    ndarray : boolean array that is True inside the state
+
+    """
+    mask_ds = gdal.Rasterize(
+        '', states_path, format='MEM', outputType=gdal.GDT_Byte,
+        outputSRS=crs, outputBounds=extent, width=shape[1], height=shape[0],
+        where=f"STUSPS = '{state}'", burnValues=[1], initValues=[0],
+    )
+    mask = mask_ds.GetRasterBand(1).ReadAsArray() > 0
+    mask_ds = None
+    return mask
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build crop type MGRS tiles from local images',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--mgrs', default='', nargs='+',
+        help='Comma/space separated list of MGRS tiles')
+    parser.add_argument(
+        '--utm', default='', nargs='+',
+        help='Comma/space separated list of UTM zones')
+    parser.add_argument(
+        '--years', default='', nargs='+',
+        help='Comma separated list and/or range of years')
+    parser.add_argument(
+        '--workers', default=1, type=int,
+        help='Number of images to build in parallel')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing files')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(
+        years=args.years,
+        mgrs_tiles=args.mgrs,
+        utm_zones=args.utm,
+        workers=args.workers,
+        overwrite_flag=args.overwrite,
+        gee_key_file=args.key,
+    )
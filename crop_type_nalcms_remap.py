@@ -0,0 +1,209 @@
+#--------------------------------
+# Name:         crop_type_nalcms_remap.py
+# Purpose:      Build the CDL remapped NALCMS images for each MGRS tile
+#--------------------------------
+
+import argparse
+from datetime import datetime, timezone
+from functools import partial
+import logging
+
+import ee
+
+import openet.core
+import openet.core.utils as utils
+
+from crop_type_asset_mgrs_collection import NALCMS_CDL_REMAP, mgrs_export_tiles
+import crop_type_remap
+from ee_state_cache import EEStateCache
+from export_scheduler import ExportScheduler
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+TOOL_NAME = 'crop_type_nalcms_remap'
+TOOL_VERSION = '0.1.0'
+
+
+def main(
+        mgrs_tiles=None,
+        utm_zones=None,
+        overwrite_flag=False,
+        delay=0,
+        gee_key_file=None,
+        ):
+    """Build the CDL remapped NALCMS fallback images on the MGRS tile grids
+
+    The images are tagged with the hash of the remap table, and the crop
+    type export tool will only use images built with the current remap.
+
+    Parameters
+    ----------
+    mgrs_tiles : list, optional
+    utm_zones : list, optional
+    overwrite_flag : bool, optional
+        If True, overwrite existing images (the default is False).
+    delay : float, optional
+        Delay time between each export task (the default is 0).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nBuild the CDL remapped NALCMS MGRS tile images')
+
+    # Hardcoded parameters
+    project_id = 'projects/openet/assets'
+    export_coll_id = f'{project_id}/crop_type/nalcms_cdl_remap'
+    nalcms_img_id = 'USGS/NLCD_RELEASES/2020_REL/NALCMS'
+    mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
+
+    supported_mgrs_tiles = [
+        '10S', '10T', '10U', '11R', '11S', '11T', '11U', '12R', '12S', '12T', '12U',
+        '13R', '13S', '13T', '13U', '14R', '14S', '14T', '14U', '15R', '15S', '15T', '15U',
+        '16R', '16S', '16T', '16U', '17R', '17S', '17T', '17U', '18S', '18T', '18U',
+        '19T', '19U'
+    ]
+
+    if mgrs_tiles:
+        mgrs_tiles = sorted([y.strip() for x in mgrs_tiles for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs in supported_mgrs_tiles]
+    else:
+        mgrs_tiles = supported_mgrs_tiles[:]
+    if utm_zones:
+        utm_zones = sorted([y.strip() for x in utm_zones for y in x.split(',')])
+        mgrs_tiles = [mgrs for mgrs in mgrs_tiles if mgrs[:2] in utm_zones]
+    logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
+
+    nalcms_lut = crop_type_remap.RemapLUT(NALCMS_CDL_REMAP)
+    nalcms_remap_in, nalcms_remap_out = nalcms_lut.ee_remap_args()
+    logging.info(f'Remap hash: {nalcms_lut.hash}')
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    if not ee.data.getInfo(export_coll_id):
+        logging.info('\nExport collection does not exist and will be built'
+                     '\n  {}'.format(export_coll_id))
+        input('Press ENTER to continue')
+        ee.data.createAsset({'type': 'IMAGE_COLLECTION'}, export_coll_id)
+
+    # Get the remap hash of the existing images
+    # Images without a hash will be rebuilt
+    logging.debug('\nGetting existing image remap hashes')
+    state_cache = EEStateCache()
+    asset_list = state_cache.get_ee_assets(export_coll_id)
+    export_coll = ee.ImageCollection(export_coll_id).filter(ee.Filter.notNull(['remap_hash']))
+    image_hashes = utils.get_info(ee.Dictionary.fromLists(
+        export_coll.aggregate_array('system:index'),
+        export_coll.aggregate_array('remap_hash'),
+    ))
+    tasks = state_cache.get_ee_tasks()
+
+    export_list = mgrs_export_tiles(
+        study_area_coll_id=mgrs_ftr_coll_id,
+        mgrs_coll_id=mgrs_ftr_coll_id,
+        mgrs_tiles=mgrs_tiles,
+    )
+    if not export_list:
+        logging.error('\nEmpty export list, exiting')
+        return False
+
+    scheduler = ExportScheduler(delay=delay)
+
+    logging.info('\nImage Exports')
+    for export_info in export_list:
+        mgrs_tile = export_info['index'].upper()
+        asset_id = f'{export_coll_id}/{mgrs_tile}'
+        export_id = f'crop_type_nalcms_remap_{mgrs_tile}'
+        logging.info(f'{asset_id}')
+
+        if export_id in tasks.keys():
+            logging.info('  Task already submitted, skipping')
+            continue
+        elif asset_id in asset_list:
+            if image_hashes.get(mgrs_tile) == nalcms_lut.hash and not overwrite_flag:
+                logging.info('  Asset already exists, skipping')
+                continue
+            logging.info('  Asset already exists, removing')
+            ee.data.deleteAsset(asset_id)
+            state_cache.remove_asset(asset_id)
+
+        output_img = (
+            ee.Image(nalcms_img_id)
+            .remap(nalcms_remap_in, nalcms_remap_out)
+            .uint8()
+            .rename(['nalcms_img'])
+            .set({
+                'core_version': openet.core.__version__,
+                'date_ingested': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                'mgrs_tile': mgrs_tile,
+                'nalcms_img_id': nalcms_img_id,
+                'remap_hash': nalcms_lut.hash,
+                'tool_name': TOOL_NAME,
+                'tool_version': TOOL_VERSION,
+            })
+        )
+        scheduler.submit(export_id, partial(
+            ee.batch.Export.image.toAsset,
+            output_img,
+            description=export_id,
+            assetId=asset_id,
+            dimensions=export_info['shape_str'],
+            crs=export_info['crs'],
+            crsTransform=export_info['geo_str'],
+            maxPixels=export_info['maxpixels']*2,
+            pyramidingPolicy={'nalcms_img': 'mode'},
+        ))
+
+    logging.info('\nStarting export tasks')
+    scheduler.run()
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build the CDL remapped NALCMS MGRS tile images',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--mgrs', default='', nargs='+',
+        help='Comma/space separated list of MGRS tiles')
+    parser.add_argument(
+        '--utm', default='', nargs='+',
+        help='Comma/space separated list of UTM zones')
+    parser.add_argument(
+        '--delay', default=0, type=float,
+        help='Delay (in seconds) between each export tasks')
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing images')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(
+        mgrs_tiles=args.mgrs,
+        utm_zones=args.utm,
+        overwrite_flag=args.overwrite,
+        delay=args.delay,
+        gee_key_file=args.key,
+    )
@@ -0,0 +1,129 @@
+#--------------------------------
+# Name:         crop_type_remap.py
+# Purpose:      Shared crop type remap tables and lookup arrays
+#--------------------------------
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+ANNUAL_REMAP_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cdl_annual_crop_remap_table.csv'
+)
+
+# Loaded tables keyed on the file path, file hash, and identity flag
+_CACHE = {}
+
+
+class RemapLUT:
+    """Crop type remap as a 256 entry uint8 lookup array
+
+    Parameters
+    ----------
+    remap_items : list
+        [IN, OUT] value pairs.
+    identity : bool, optional
+        If True, all values from 1-255 that are not in the table will remap to
+        themselves (the default is False).
+
+    Attributes
+    ----------
+    table : dict
+        Remap values from the table (without the identity values).
+    lut : ndarray
+        uint8 lookup array of the OUT value for each IN value.
+    defined : ndarray
+        Boolean array that is True for IN values that have a remap value.
+    hash : str
+        Hash of the lookup array contents.
+
+    """
+    def __init__(self, remap_items, identity=False):
+        self.table = {int(remap_in): int(remap_out) for remap_in, remap_out in remap_items}
+        self.lut = np.zeros(256, dtype=np.uint8)
+        self.defined = np.zeros(256, dtype=bool)
+        if identity:
+            self.lut[1:] = np.arange(1, 256, dtype=np.uint8)
+            self.defined[1:] = True
+        for remap_in, remap_out in self.table.items():
+            self.lut[remap_in] = remap_out
+            self.defined[remap_in] = True
+        self.hash = hashlib.sha256(self.lut.tobytes() + self.defined.tobytes()).hexdigest()
+
+    def remap(self, array):
+        """Remap a uint8 array (values without a remap value are set to 0)
+
+        Parameters
+        ----------
+        array : ndarray
+
+        Returns
+        -------
+        ndarray
+
+        """
+        return self.lut[array]
+
+    def ee_remap_args(self):
+        """Return the from and to lists for the ee.Image.remap() call
+
+        Returns
+        -------
+        tuple : list of IN values, list of OUT values
+
+        """
+        remap_in = np.nonzero(self.defined)[0]
+        return remap_in.tolist(), self.lut[remap_in].tolist()
+
+
+def file_hash(path):
+    """Compute the hash of a file's contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_remap_table(remap_path=ANNUAL_REMAP_PATH, identity=True):
+    """Load a numeric remap CSV table (IN, OUT columns) as a RemapLUT
+
+    The table is only read once per process for each version of the file.
+
+    Parameters
+    ----------
+    remap_path : str, optional
+        Remap CSV file path (the default is the CDL annual crop remap table).
+    identity : bool, optional
+        If True, all values from 1-255 that are not in the table will remap to
+        themselves (the default is True).
+
+    Returns
+    -------
+    RemapLUT
+
+    """
+    cache_key = (os.path.abspath(remap_path), file_hash(remap_path), identity)
+    if cache_key not in _CACHE.keys():
+        remap_df = pd.read_csv(remap_path, comment='#')
+        _CACHE[cache_key] = RemapLUT(zip(remap_df.IN, remap_df.OUT), identity=identity)
+    return _CACHE[cache_key]
+
+
+def load_remap_dict(remap_path):
+    """Load a remap CSV table with string IN values (i.e. LandIQ crop codes)
+
+    Parameters
+    ----------
+    remap_path : str
+        Remap CSV file path.
+
+    Returns
+    -------
+    dict
+
+    """
+    cache_key = (os.path.abspath(remap_path), file_hash(remap_path), 'dict')
+    if cache_key not in _CACHE.keys():
+        remap_df = pd.read_csv(remap_path, comment='#')
+        _CACHE[cache_key] = dict(zip(remap_df.IN, remap_df.OUT.astype(int)))
+    return dict(_CACHE[cache_key])
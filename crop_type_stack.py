@@ -0,0 +1,63 @@
+#--------------------------------
+# Name:         crop_type_stack.py
+# Purpose:      Read the year images from the crop type tile stack images
+#--------------------------------
+
+import ee
+
+
+def stack_year_image(stack_id, year):
+    """Select a year image from a tile stack image
+
+    Parameters
+    ----------
+    stack_id : str
+        Tile stack image asset ID.
+    year : int
+
+    Returns
+    -------
+    ee.Image : single "cropland" band image
+
+    """
+    return _select_year(ee.Image(stack_id), year)
+
+
+def stack_year_collection(stack_coll_id, year):
+    """Build the crop type image collection for a year from the tile stacks
+
+    The year images are selected from the stack image bands, so no images
+    are exported or copied.  Tiles without a band for the year are not
+    included.
+
+    Parameters
+    ----------
+    stack_coll_id : str
+        Tile stack image collection ID.
+    year : int
+
+    Returns
+    -------
+    ee.ImageCollection : single "cropland" band image for each MGRS tile
+
+    """
+    return (
+        ee.ImageCollection(stack_coll_id)
+        .filter(ee.Filter.notNull([f'band_{year}']))
+        .map(lambda img: _select_year(img, year))
+    )
+
+
+def _select_year(stack_img, year):
+    """Select the band of a year using the stack "band_YYYY" property"""
+    return (
+        ee.Image(stack_img)
+        .select([ee.String(stack_img.get(f'band_{year}'))], ['cropland'])
+        .set({
+            'system:index': ee.String(stack_img.get('mgrs_tile')).cat(f'_{year}0101'),
+            'system:time_start': ee.Date.fromYMD(year, 1, 1).millis(),
+            'mgrs_tile': stack_img.get('mgrs_tile'),
+            'year': year,
+            'input_hash': stack_img.get(f'input_hash_{year}'),
+        })
+    )
@@ -0,0 +1,311 @@
+#--------------------------------
+# Name:         crop_type_version_diff.py
+# Purpose:      Compare the crop type MGRS tile images of two versions
+#--------------------------------
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+
+import openet.core.utils as utils
+
+from crop_type_images import list_tile_images
+
+gdal.UseExceptions()
+
+TOOL_NAME = 'crop_type_version_diff'
+TOOL_VERSION = '0.1.0'
+
+
+def main(
+        old_version,
+        new_version,
+        years=None,
+        mgrs_tiles=None,
+        workers=1,
+        gcs_flag=False,
+        top_n=5,
+        ):
+    """Compare the crop type MGRS tile images of two versions
+
+    The images are read in blocks of rows, so the full images are never
+    loaded into memory.  For each tile/year the changed pixel counts and the
+    class transition matrix (old class to new class) are computed, and a
+    report with one row per tile/year and a table of the transition counts
+    summed over all of the tiles are written.
+
+    Parameters
+    ----------
+    old_version : str
+        Previous collection version (i.e. "v2023a").
+    new_version : str
+        New collection version (i.e. "v2024a").
+    years : list, optional
+    mgrs_tiles : list, optional
+    workers : int, optional
+        Number of tile/year images to compare in parallel (the default is 1).
+    gcs_flag : bool, optional
+        If True, read the bucket exports (crop_type_asset_mgrs_collection.py
+        "--gcs") instead of the local images (the default is False).
+    top_n : int, optional
+        Number of the largest class transitions to list for each tile/year
+        (the default is 5).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nCompare the crop type MGRS tile images of two versions')
+
+    # Hardcoded parameters
+    # The local images are built by crop_type_local_composite.py
+    # The bucket images are read in windows with the GDAL /vsigs/ driver
+    if gcs_flag:
+        image_ws = '/vsigs/openet/crop_type/images'
+    else:
+        image_ws = os.path.join(os.getcwd(), 'images')
+    output_ws = os.path.join(os.getcwd(), 'diff')
+    report_path = os.path.join(output_ws, f'{old_version}_{new_version}_diff.csv')
+    transition_path = os.path.join(output_ws, f'{old_version}_{new_version}_transitions.csv')
+
+    if years:
+        years = sorted(list(set(
+            int(year) for year_str in years for year in utils.str_ranges_2_list(year_str)
+        )))
+        logging.info(f'Years: {", ".join(map(str, years))}')
+    if mgrs_tiles:
+        mgrs_tiles = sorted([y.strip().upper() for x in mgrs_tiles for y in x.split(',')])
+        logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
+
+    if not os.path.isdir(output_ws):
+        os.makedirs(output_ws)
+
+    # Get the tile/year images in each version
+    # Images exported as multiple files (chunks or split bucket exports)
+    #   are read through a VRT of the files
+    image_paths = {}
+    for version in [old_version, new_version]:
+        image_paths[version] = list_tile_images(
+            f'{image_ws}/{version}', os.path.join(output_ws, 'vrt', version),
+            mgrs_tiles=mgrs_tiles, years=years,
+        )
+        logging.info(f'{version} images: {len(image_paths[version])}')
+
+    image_ids = sorted(set(image_paths[old_version]) | set(image_paths[new_version]))
+    if not image_ids:
+        logging.error('\nNo images to compare, exiting')
+        return False
+
+    # Images that are only in one version are reported without a comparison
+    report_list = []
+    diff_list = []
+    for image_id in image_ids:
+        if image_id not in image_paths[old_version]:
+            report_list.append({'image_id': image_id, 'status': 'added'})
+        elif image_id not in image_paths[new_version]:
+            report_list.append({'image_id': image_id, 'status': 'removed'})
+        else:
+            diff_list.append([
+                image_id, image_paths[old_version][image_id],
+                image_paths[new_version][image_id],
+            ])
+
+    logging.info(f'\nComparing {len(diff_list)} images')
+    transitions = np.zeros((256, 256), dtype=np.int64)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(diff_tile_image, old_path, new_path): image_id
+                for image_id, old_path, new_path in diff_list
+            }
+            results = []
+            for future in as_completed(futures):
+                try:
+                    results.append([futures[future], future.result()])
+                except Exception as e:
+                    logging.exception(f'{futures[future]} - {e}')
+                    report_list.append({'image_id': futures[future], 'status': 'error'})
+                    continue
+                logging.info(f'{futures[future]}')
+    else:
+        results = []
+        for image_id, old_path, new_path in diff_list:
+            logging.info(f'{image_id}')
+            try:
+                results.append([image_id, diff_tile_image(old_path, new_path)])
+            except Exception as e:
+                logging.exception(f'{image_id} - {e}')
+                report_list.append({'image_id': image_id, 'status': 'error'})
+
+    for image_id, tile_transitions in results:
+        transitions += tile_transitions
+        report_list.append({
+            'image_id': image_id,
+            'status': 'compared',
+            **transition_summary(tile_transitions, top_n),
+        })
+
+    # The tile and year are split from the image ID for sorting/filtering
+    report_df = pd.DataFrame(report_list)
+    report_df['mgrs_tile'] = report_df['image_id'].str.split('_').str[0]
+    report_df['year'] = report_df['image_id'].str.split('_').str[1].str[:4].astype(int)
+    report_df = report_df.sort_values(['mgrs_tile', 'year'])
+    report_df = report_df[
+        ['image_id', 'mgrs_tile', 'year', 'status'] +
+        [c for c in report_df.columns if c not in ['image_id', 'mgrs_tile', 'year', 'status']]
+    ]
+    logging.info(f'\nWriting report\n  {report_path}')
+    report_df.to_csv(report_path, index=False)
+
+    # Only the non-zero transitions are written
+    old_values, new_values = np.nonzero(transitions)
+    transition_df = pd.DataFrame({
+        'old': old_values, 'new': new_values,
+        'pixels': transitions[old_values, new_values],
+    })
+    logging.info(f'Writing transitions\n  {transition_path}')
+    transition_df.to_csv(transition_path, index=False)
+
+    logging.info('\nSummary')
+    for status, count in report_df['status'].value_counts().sort_index().items():
+        logging.info(f'  {status}: {count}')
+    summary = transition_summary(transitions, 0)
+    logging.info(f'  Changed pixels: {summary["changed_pixels"]:,} '
+                 f'({summary["changed_pct"]:.3f}%)')
+
+
+def diff_tile_image(old_path, new_path, block_rows=2048):
+    """Compute the class transition matrix between two versions of an image
+
+    The images are read in blocks of rows and the transition counts for each
+    block are computed with a single bincount of the combined class values.
+
+    Parameters
+    ----------
+    old_path : str
+    new_path : str
+    block_rows : int, optional
+        Number of rows to read at a time (the default is 2048).
+
+    Returns
+    -------
+    ndarray : 256 x 256 array of the pixel counts for each old (row) and
+        new (column) class value
+
+    Raises
+    ------
+    ValueError if the images are not on the same grid.
+
+    """
+    old_ds = gdal.Open(old_path)
+    new_ds = gdal.Open(new_path)
+    if ((old_ds.RasterXSize, old_ds.RasterYSize, old_ds.GetGeoTransform()) !=
+            (new_ds.RasterXSize, new_ds.RasterYSize, new_ds.GetGeoTransform())):
+        raise ValueError('images are not on the same grid')
+    old_band = old_ds.GetRasterBand(1)
+    new_band = new_ds.GetRasterBand(1)
+    cols, rows = old_ds.RasterXSize, old_ds.RasterYSize
+
+    transitions = np.zeros(256 * 256, dtype=np.int64)
+    for row_i in range(0, rows, block_rows):
+        block_rows_i = min(block_rows, rows - row_i)
+        old_array = old_band.ReadAsArray(0, row_i, cols, block_rows_i).astype(np.uint16)
+        new_array = new_band.ReadAsArray(0, row_i, cols, block_rows_i).astype(np.uint16)
+        transitions += np.bincount(
+            (old_array * 256 + new_array).ravel(), minlength=256 * 256
+        )
+
+    old_ds = None
+    new_ds = None
+
+    return transitions.reshape(256, 256)
+
+
+def transition_summary(transitions, top_n=5):
+    """Summarize a class transition matrix
+
+    Class 0 is the nodata value, so pixels that are 0 in both versions are not
+    counted and pixels that change to/from 0 are counted separately.
+
+    Parameters
+    ----------
+    transitions : ndarray
+        256 x 256 array of pixel counts from diff_tile_image().
+    top_n : int, optional
+        Number of the largest class transitions to list (the default is 5).
+
+    Returns
+    -------
+    dict
+
+    """
+    total = int(transitions.sum() - transitions[0, 0])
+    unchanged = int(np.trace(transitions) - transitions[0, 0])
+    summary = {
+        'pixels': total,
+        'changed_pixels': total - unchanged,
+        'changed_pct': round(100 * (total - unchanged) / total, 4) if total else 0,
+        'added_pixels': int(transitions[0, 1:].sum()),
+        'removed_pixels': int(transitions[1:, 0].sum()),
+    }
+    if top_n:
+        changes = transitions.copy()
+        np.fill_diagonal(changes, 0)
+        top_i = np.argsort(changes, axis=None)[::-1][:top_n]
+        summary['top_transitions'] = ';'.join(
+            f'{i // 256}>{i % 256}:{changes.flat[i]}' for i in top_i if changes.flat[i] > 0
+        )
+    return summary
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Compare the crop type MGRS tile images of two versions',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        'old', help='Previous collection version (i.e. v2023a)')
+    parser.add_argument(
+        'new', help='New collection version (i.e. v2024a)')
+    parser.add_argument(
+        '--mgrs', default='', nargs='+',
+        help='Comma/space separated list of MGRS tiles')
+    parser.add_argument(
+        '--years', default='', nargs='+',
+        help='Comma separated list and/or range of years')
+    parser.add_argument(
+        '--workers', default=1, type=int,
+        help='Number of images to compare in parallel')
+    parser.add_argument(
+        '--gcs', default=False, action='store_true',
+        help='Read the bucket exports instead of the local images')
+    parser.add_argument(
+        '--top', default=5, type=int,
+        help='Number of the largest class transitions to list for each image')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+
+    main(
+        old_version=args.old,
+        new_version=args.new,
+        years=args.years,
+        mgrs_tiles=args.mgrs,
+        workers=args.workers,
+        gcs_flag=args.gcs,
+        top_n=args.top,
+    )
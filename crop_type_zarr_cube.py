@@ -0,0 +1,397 @@
+#--------------------------------
+# Name:         crop_type_zarr_cube.py
+# Purpose:      Build per MGRS tile crop type time series Zarr cubes
+#--------------------------------
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import math
+import os
+import shutil
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+import zarr
+
+import openet.core.utils as utils
+
+from crop_type_images import list_tile_images
+
+gdal.UseExceptions()
+
+TOOL_NAME = 'crop_type_zarr_cube'
+TOOL_VERSION = '0.1.0'
+
+
+def main(
+        version,
+        years=None,
+        mgrs_tiles=None,
+        overwrite_flag=False,
+        workers=1,
+        gcs_flag=False,
+        chunk_size=256,
+        ):
+    """Build a (year, y, x) Zarr cube of the crop type images for each MGRS tile
+
+    The cubes are chunked with all of the years in each chunk, so the history
+    of a pixel or a small window is a single chunk read.  Years without an
+    image are left as 0 (nodata).
+
+    Parameters
+    ----------
+    version : str
+        Collection version (i.e. "v2023a").
+    years : list, optional
+        Cube years.  If not set, all of the years with an image are used.
+    mgrs_tiles : list, optional
+    overwrite_flag : bool, optional
+        If True, rebuild existing cubes (the default is False).
+    workers : int, optional
+        Number of tiles to build in parallel (the default is 1).
+    gcs_flag : bool, optional
+        If True, read the bucket exports (crop_type_asset_mgrs_collection.py
+        "--gcs") instead of the local images (the default is False).
+    chunk_size : int, optional
+        Number of rows and columns in each chunk (the default is 256).
+
+    Returns
+    -------
+    None
+
+    """
+    logging.info('\nBuild the crop type MGRS tile time series cubes')
+
+    # Hardcoded parameters
+    # The local images are built by crop_type_local_composite.py
+    # The bucket images are read with the GDAL /vsigs/ driver
+    if gcs_flag:
+        image_ws = f'/vsigs/openet/crop_type/images/{version}'
+    else:
+        image_ws = os.path.join(os.getcwd(), 'images', version)
+    cube_ws = os.path.join(os.getcwd(), 'cubes', version)
+
+    if years:
+        years = sorted(list(set(
+            int(year) for year_str in years for year in utils.str_ranges_2_list(year_str)
+        )))
+        logging.info(f'Years: {", ".join(map(str, years))}')
+    if mgrs_tiles:
+        mgrs_tiles = sorted([y.strip().upper() for x in mgrs_tiles for y in x.split(',')])
+        logging.info(f'MGRS Tiles: {", ".join(mgrs_tiles)}')
+
+    if not os.path.isdir(cube_ws):
+        os.makedirs(cube_ws)
+
+    # Get the year images for each tile
+    # Images exported as multiple files (chunks or split bucket exports)
+    #   are read through a VRT of the files
+    tile_images = {}
+    image_paths = list_tile_images(
+        image_ws, os.path.join(cube_ws, 'vrt'), mgrs_tiles=mgrs_tiles, years=years
+    )
+    for image_id, image_path in image_paths.items():
+        mgrs_tile, year = image_id.rsplit('_', 1)[0], int(image_id[-8:-4])
+        tile_images.setdefault(mgrs_tile, {})[year] = image_path
+    if not tile_images:
+        logging.error('\nNo images, exiting')
+        return False
+    if not years:
+        years = sorted(set(year for images in tile_images.values() for year in images))
+        logging.info(f'Years: {years[0]}-{years[-1]}')
+
+    cube_list = []
+    for mgrs_tile, image_paths in sorted(tile_images.items()):
+        cube_path = os.path.join(cube_ws, f'{mgrs_tile}.zarr')
+        if os.path.isdir(cube_path) and not overwrite_flag:
+            logging.debug(f'  {mgrs_tile} - cube already exists, skipping')
+            continue
+        cube_list.append([mgrs_tile, image_paths, cube_path])
+
+    logging.info(f'\nBuilding {len(cube_list)} cubes')
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    build_tile_cube, mgrs_tile, image_paths, cube_path, years, chunk_size
+                ): mgrs_tile
+                for mgrs_tile, image_paths, cube_path in cube_list
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.exception(f'{futures[future]} - {e}')
+                    continue
+                logging.info(f'{futures[future]}')
+    else:
+        for mgrs_tile, image_paths, cube_path in cube_list:
+            logging.info(f'{mgrs_tile}')
+            build_tile_cube(mgrs_tile, image_paths, cube_path, years, chunk_size)
+
+
+def build_tile_cube(mgrs_tile, image_paths, cube_path, years, chunk_size=256):
+    """Write the year images of an MGRS tile to a Zarr cube
+
+    The images are read a chunk row at a time so that each chunk is only
+    written once.  The cube is written to a temporary folder and then moved,
+    so an interrupted build doesn't leave a partial cube.
+
+    Parameters
+    ----------
+    mgrs_tile : str
+    image_paths : dict
+        Image paths keyed by year.  All images must be on the same grid.
+    cube_path : str
+        Output Zarr folder path.
+    years : list
+        Cube years.  Years without an image are filled with 0.
+    chunk_size : int, optional
+        Number of rows and columns in each chunk (the default is 256).
+
+    Returns
+    -------
+    str : cube path
+
+    Raises
+    ------
+    ValueError if the images are not on the same grid.
+
+    """
+    image_datasets = {year: gdal.Open(path) for year, path in image_paths.items()}
+    grids = set(
+        (ds.RasterXSize, ds.RasterYSize, ds.GetGeoTransform())
+        for ds in image_datasets.values()
+    )
+    if len(grids) > 1:
+        raise ValueError(f'{mgrs_tile} - images are not on the same grid')
+    cols, rows, geotransform = grids.pop()
+    projection = next(iter(image_datasets.values())).GetProjection()
+
+    temp_path = cube_path.replace('.zarr', '_temp.zarr')
+    if os.path.isdir(temp_path):
+        shutil.rmtree(temp_path)
+    root = zarr.open_group(temp_path, mode='w')
+    # LZ4 is the fastest of the Blosc codecs to decompress, and the bit
+    #   shuffle helps since the crop type values are small integers
+    cube = root.create_array(
+        'cropland', shape=(len(years), rows, cols), chunks=(len(years), chunk_size, chunk_size),
+        dtype='uint8', fill_value=0,
+        compressors=zarr.codecs.BloscCodec(cname='lz4', clevel=5, shuffle='bitshuffle'),
+    )
+    root.attrs.update({
+        'mgrs_tile': mgrs_tile,
+        'years': [int(year) for year in years],
+        'crs': projection,
+        'geotransform': list(geotransform),
+        'nodata': 0,
+        'tool_name': TOOL_NAME,
+        'tool_version': TOOL_VERSION,
+    })
+
+    for row_i in range(0, rows, chunk_size):
+        block_rows = min(chunk_size, rows - row_i)
+        block = np.zeros((len(years), block_rows, cols), dtype=np.uint8)
+        for year_i, year in enumerate(years):
+            if year in image_datasets.keys():
+                block[year_i] = image_datasets[year].GetRasterBand(1).ReadAsArray(
+                    0, row_i, cols, block_rows
+                )
+        cube[:, row_i:row_i + block_rows, :] = block
+
+    image_datasets = None
+
+    if os.path.isdir(cube_path):
+        shutil.rmtree(cube_path)
+    os.rename(temp_path, cube_path)
+
+    return cube_path
+
+
+class CropTypeCube:
+    """Read the crop type time series from an MGRS tile Zarr cube
+
+    The cube is opened lazily and only the chunks that intersect a request
+    are read, so the history of a pixel is a single chunk read.  Coordinates
+    are in the tile projection unless a "crs" is passed (any OSR user input,
+    i.e. "EPSG:4326", with x/y as longitude/latitude).
+
+        cube = CropTypeCube('cubes/v2023a/10S.zarr')
+        history = cube.pixel(-121.5, 38.5, crs='EPSG:4326')
+
+    Parameters
+    ----------
+    cube_path : str
+        Zarr folder path from build_tile_cube().
+
+    """
+    def __init__(self, cube_path):
+        root = zarr.open_group(cube_path, mode='r')
+        self.array = root['cropland']
+        self.mgrs_tile = root.attrs['mgrs_tile']
+        self.years = list(root.attrs['years'])
+        self.crs = root.attrs['crs']
+        self.geotransform = list(root.attrs['geotransform'])
+        self.srs = osr.SpatialReference()
+        self.srs.ImportFromWkt(self.crs)
+        self.srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    def _transform(self, crs):
+        """Coordinate transformation from a CRS to the cube projection"""
+        src_srs = osr.SpatialReference()
+        src_srs.SetFromUserInput(crs)
+        src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        return osr.CoordinateTransformation(src_srs, self.srs)
+
+    def _window(self, xmin, ymin, xmax, ymax):
+        """Row/column slices of the cells that intersect an extent"""
+        x0, cell_x, _, y0, _, cell_y = self.geotransform
+        col_min = max(int(math.floor((xmin - x0) / cell_x)), 0)
+        col_max = min(int(math.ceil((xmax - x0) / cell_x)), self.array.shape[2])
+        row_min = max(int(math.floor((ymax - y0) / cell_y)), 0)
+        row_max = min(int(math.ceil((ymin - y0) / cell_y)), self.array.shape[1])
+        if col_min >= col_max or row_min >= row_max:
+            raise ValueError('extent does not intersect the cube')
+        return slice(row_min, row_max), slice(col_min, col_max)
+
+    def pixel(self, x, y, crs=None):
+        """Crop type history of the pixel containing a point
+
+        Parameters
+        ----------
+        x : float
+        y : float
+        crs : str, optional
+            Point coordinate system (the default is the cube projection).
+
+        Returns
+        -------
+        dict : crop type value keyed by year (0 is nodata)
+
+        """
+        if crs:
+            x, y = self._transform(crs).TransformPoint(x, y)[:2]
+        x0, cell_x, _, y0, _, cell_y = self.geotransform
+        col = int(math.floor((x - x0) / cell_x))
+        row = int(math.floor((y - y0) / cell_y))
+        if not (0 <= row < self.array.shape[1] and 0 <= col < self.array.shape[2]):
+            raise ValueError('point is outside the cube')
+        return dict(zip(self.years, self.array[:, row, col].tolist()))
+
+    def window(self, xmin, ymin, xmax, ymax, crs=None):
+        """Crop type history of the pixels intersecting an extent
+
+        Parameters
+        ----------
+        xmin, ymin, xmax, ymax : float
+        crs : str, optional
+            Extent coordinate system (the default is the cube projection).
+
+        Returns
+        -------
+        ndarray : uint8 array with shape (year, rows, cols)
+
+        """
+        if crs:
+            transform = self._transform(crs)
+            corners = [
+                transform.TransformPoint(x, y)[:2]
+                for x, y in [[xmin, ymin], [xmin, ymax], [xmax, ymin], [xmax, ymax]]
+            ]
+            xmin, xmax = min(c[0] for c in corners), max(c[0] for c in corners)
+            ymin, ymax = min(c[1] for c in corners), max(c[1] for c in corners)
+        rows, cols = self._window(xmin, ymin, xmax, ymax)
+        return self.array[:, rows, cols]
+
+    def field(self, geometry, crs=None):
+        """Crop type history of the pixels with centers inside a field polygon
+
+        Parameters
+        ----------
+        geometry : ogr.Geometry, str
+            Field polygon (or WKT).
+        crs : str, optional
+            Geometry coordinate system (the default is the cube projection).
+
+        Returns
+        -------
+        ndarray : uint8 array with shape (year, pixels)
+
+        """
+        if isinstance(geometry, str):
+            geometry = ogr.CreateGeometryFromWkt(geometry)
+        else:
+            geometry = geometry.Clone()
+        if crs:
+            geometry.Transform(self._transform(crs))
+        xmin, xmax, ymin, ymax = geometry.GetEnvelope()
+        rows, cols = self._window(xmin, ymin, xmax, ymax)
+
+        # Rasterize the polygon on the window grid
+        x0, cell_x, _, y0, _, cell_y = self.geotransform
+        mask_ds = gdal.GetDriverByName('MEM').Create(
+            '', cols.stop - cols.start, rows.stop - rows.start, 1, gdal.GDT_Byte
+        )
+        mask_ds.SetGeoTransform([
+            x0 + cols.start * cell_x, cell_x, 0, y0 + rows.start * cell_y, 0, cell_y
+        ])
+        mask_ds.SetProjection(self.crs)
+        layer_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+        layer = layer_ds.CreateLayer('field', srs=self.srs)
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetGeometry(geometry)
+        layer.CreateFeature(feature)
+        gdal.RasterizeLayer(mask_ds, [1], layer, burn_values=[1])
+        mask = mask_ds.GetRasterBand(1).ReadAsArray().astype(bool)
+        mask_ds, layer_ds = None, None
+
+        return self.array[:, rows, cols][:, mask]
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build the crop type MGRS tile time series cubes',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        'version', help='Collection version (i.e. v2023a)')
+    parser.add_argument(
+        '--mgrs', default='', nargs='+',
+        help='Comma/space separated list of MGRS tiles')
+    parser.add_argument(
+        '--years', default='', nargs='+',
+        help='Comma separated list and/or range of years')
+    parser.add_argument(
+        '--workers', default=1, type=int,
+        help='Number of tiles to build in parallel')
+    parser.add_argument(
+        '--gcs', default=False, action='store_true',
+        help='Read the bucket exports instead of the local images')
+    parser.add_argument(
+        '--chunk', default=256, type=int,
+        help='Number of rows and columns in each cube chunk')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force overwrite of existing cubes')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+
+    main(
+        version=args.version,
+        years=args.years,
+        mgrs_tiles=args.mgrs,
+        overwrite_flag=args.overwrite,
+        workers=args.workers,
+        gcs_flag=args.gcs,
+        chunk_size=args.chunk,
+    )
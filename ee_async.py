@@ -0,0 +1,139 @@
+#--------------------------------
+# Name:         ee_async.py
+# Purpose:      Concurrent Earth Engine metadata requests using asyncio
+#--------------------------------
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+
+import ee
+
+
+class EEAsyncClient:
+    """Run independent Earth Engine metadata requests concurrently
+
+    The earthengine-api REST client is synchronous, so each request is run in
+    a worker thread from the event loop, with a semaphore limiting the number
+    of requests in flight.  Failed requests are retried with an exponential
+    backoff (with jitter).  Since the requests still go through the
+    earthengine-api client, the client can be tested against a local stub
+    server by initializing Earth Engine with the stub URL (ee.Initialize
+    "opt_url" parameter).
+
+    The coroutine methods only build the requests.  The gather() method runs
+    a dictionary of them and returns the results with the same keys, so the
+    client can be used from the synchronous tools:
+
+        ee_client = EEAsyncClient()
+        results = ee_client.gather({
+            state: ee_client.get_info(ee.FeatureCollection(coll_id).size())
+            for state, coll_id in state_coll_ids.items()
+        })
+
+    Parameters
+    ----------
+    max_concurrency : int, optional
+        Maximum number of requests in flight (the default is 16).
+    max_retries : int, optional
+        Number of times a failed request will be retried (the default is 4).
+    backoff : float, optional
+        Initial retry delay in seconds (the default is 1).
+    backoff_max : float, optional
+        Maximum retry delay in seconds (the default is 30).
+
+    """
+    def __init__(self, max_concurrency=16, max_retries=4, backoff=1, backoff_max=30):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._semaphore = None
+        self._executor = None
+
+    async def call(self, fn, *args, **kwargs):
+        """Run a synchronous Earth Engine function with retries
+
+        Parameters
+        ----------
+        fn : function
+        args, kwargs
+            Function arguments.
+
+        Returns
+        -------
+        Function return value
+
+        """
+        loop = asyncio.get_running_loop()
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                try:
+                    return await loop.run_in_executor(
+                        self._executor, lambda: fn(*args, **kwargs)
+                    )
+                except Exception as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    logging.debug(f'  Request failed, retrying in {delay:.1f}s\n  {e}')
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, self.backoff_max)
+
+    async def get_info(self, ee_obj):
+        """Compute an Earth Engine object (ee.ComputedObject.getInfo)"""
+        return await self.call(ee_obj.getInfo)
+
+    async def get_asset(self, asset_id):
+        """Get the asset metadata (ee.data.getAsset)"""
+        return await self.call(ee.data.getAsset, asset_id)
+
+    async def asset_exists(self, asset_id):
+        """Check if an asset exists (ee.data.getInfo returns None if it doesn't)"""
+        return bool(await self.call(ee.data.getInfo, asset_id))
+
+    async def list_assets(self, parent):
+        """List the assets in a folder or image collection (ee.data.listAssets)"""
+        response = await self.call(ee.data.listAssets, {'parent': parent})
+        return response.get('assets', [])
+
+    async def gather_async(self, requests):
+        """Run a dictionary of requests concurrently (i.e. nested in gather())
+
+        Parameters
+        ----------
+        requests : dict
+            Coroutines from the request methods.
+
+        Returns
+        -------
+        dict : request results with the same keys as the requests
+
+        """
+        results = await asyncio.gather(*requests.values())
+        return dict(zip(requests.keys(), results))
+
+    async def _run(self, requests):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as self._executor:
+            results = await self.gather_async(requests)
+        self._executor = None
+        return results
+
+    def gather(self, requests):
+        """Run the requests concurrently and wait for all of them to finish
+
+        Parameters
+        ----------
+        requests : dict
+            Coroutines from the request methods.
+
+        Returns
+        -------
+        dict : request results with the same keys as the requests
+
+        """
+        if not requests:
+            return {}
+        return asyncio.run(self._run(requests))
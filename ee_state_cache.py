@@ -0,0 +1,317 @@
+#--------------------------------
+# Name:         ee_state_cache.py
+# Purpose:      Local SQLite cache of Earth Engine asset and task states
+#--------------------------------
+
+import datetime
+import logging
+import os
+import re
+import sqlite3
+
+import ee
+
+import openet.core.utils as utils
+
+# The task states are stored with the ee.batch.Task.State names (the names
+#   returned by ee.data.getTaskStatus), so the listed operation states are
+#   converted to these names
+OPERATION_STATES = {
+    'PENDING': 'READY',
+    'RUNNING': 'RUNNING',
+    'CANCELLING': 'CANCEL_REQUESTED',
+    'SUCCEEDED': 'COMPLETED',
+    'FAILED': 'FAILED',
+    'CANCELLED': 'CANCELLED',
+}
+
+# Task states that can block or be cancelled by a new export
+ACTIVE_STATES = ['READY', 'RUNNING']
+# Task states that can still change and are rechecked at each refresh
+UNFINISHED_STATES = ['READY', 'RUNNING', 'CANCEL_REQUESTED']
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ee_state_cache.sqlite')
+
+EPOCH_TIME = '1970-01-01T00:00:00Z'
+
+
+def parse_time(time_str):
+    """Parse an RFC3339 timestamp from the Earth Engine API
+
+    The API timestamps have a variable number of fractional second digits
+    (i.e. "2024-01-01T00:00:00.5Z" and "2024-01-01T00:00:00.123456Z"),
+    so they can't be compared as strings.
+
+    Parameters
+    ----------
+    time_str : str
+        RFC3339 timestamp.
+
+    Returns
+    -------
+    datetime : timezone aware datetime (or None if the timestamp is not set)
+
+    """
+    if not time_str:
+        return None
+    time_match = re.match(
+        r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$',
+        time_str
+    )
+    if not time_match:
+        raise ValueError(f'Unsupported timestamp: {time_str}')
+    date_time, fraction, zone = time_match.groups()
+    # Python datetimes only have microsecond precision
+    fraction = (fraction or '')[:6].ljust(6, '0')
+    zone = '+00:00' if zone in [None, 'Z'] else zone
+    return datetime.datetime.fromisoformat(f'{date_time}.{fraction}{zone}')
+
+
+def max_time(time_strs):
+    """Return the latest of a list of RFC3339 timestamps"""
+    return max(time_strs, key=parse_time)
+
+
+class EEStateCache:
+    """Cache of the asset IDs and task states used for the skip/cancel checks
+
+    The asset lists and task list are refreshed incrementally.  Only the
+    assets updated since the last refresh (by updateTime) and the tasks
+    created since the last refresh (by createTime) are added, and the
+    tasks that were active at the last refresh are rechecked.  The asset
+    list is fully reloaded if the collection image names don't match the
+    cache (i.e. images were deleted outside of the tools).  The timestamps
+    are stored as the API strings but are always compared as datetimes.
+
+    The get_ee_assets() and get_ee_tasks() methods return the same structures
+    as the openet.core.utils functions (an asset ID list, and the task ID and
+    state keyed by description).  The task states always use the
+    ee.batch.Task.State names (i.e. READY and COMPLETED, not the operation
+    PENDING and SUCCEEDED names), but only the READY and RUNNING tasks are
+    returned by default.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        SQLite database path (the default is "ee_state_cache.sqlite" in
+        the repository root folder).
+
+    """
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS assets (
+                id TEXT PRIMARY KEY, parent TEXT, update_time TEXT);
+            CREATE INDEX IF NOT EXISTS assets_parent ON assets (parent);
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY, description TEXT, state TEXT,
+                create_time TEXT, update_time TEXT);
+            CREATE INDEX IF NOT EXISTS tasks_description ON tasks (description);
+            CREATE TABLE IF NOT EXISTS refresh (
+                name TEXT PRIMARY KEY, last_time TEXT);
+        """)
+        # Convert any operation state names written by older versions
+        self.conn.executemany(
+            'UPDATE tasks SET state = ? WHERE state = ?',
+            [[state, op_state] for op_state, state in OPERATION_STATES.items()]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _last_time(self, name):
+        row = self.conn.execute(
+            'SELECT last_time FROM refresh WHERE name = ?', (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_last_time(self, name, last_time):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO refresh (name, last_time) VALUES (?, ?)',
+            (name, last_time)
+        )
+
+    def refresh_assets(self, parent):
+        """Update the cached asset list for a folder or image collection
+
+        Parameters
+        ----------
+        parent : str
+            Folder or image collection asset ID.
+
+        Returns
+        -------
+        None
+
+        """
+        last_time = self._last_time(f'assets:{parent}')
+
+        # Reload everything if the images have changed outside the tools
+        # The image names are compared (not the counts) so that an image
+        #   deleted and another added since the last refresh are both caught
+        if last_time is not None:
+            if ee.data.getAsset(parent)['type'] == 'IMAGE_COLLECTION':
+                cache_names = {
+                    row[0].split('/')[-1] for row in self.conn.execute(
+                        'SELECT id FROM assets WHERE parent = ?', (parent,)
+                    )
+                }
+                ee_names = set(utils.get_info(
+                    ee.ImageCollection(parent).aggregate_array('system:index')
+                ))
+                if ee_names != cache_names:
+                    logging.debug(
+                        f'  Assets changed ({len(cache_names - ee_names)} removed, '
+                        f'{len(ee_names - cache_names)} added), reloading asset list'
+                    )
+                    last_time = None
+
+        params = {'parent': parent}
+        if last_time is None:
+            self.conn.execute('DELETE FROM assets WHERE parent = ?', (parent,))
+        else:
+            params['filter'] = f'updateTime > "{last_time}"'
+        assets = ee.data.listAssets(params).get('assets', [])
+        logging.debug(f'  Updated assets: {len(assets)}')
+
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO assets (id, parent, update_time) VALUES (?, ?, ?)',
+            [[asset['id'], parent, asset.get('updateTime', '')] for asset in assets]
+        )
+        update_times = [asset['updateTime'] for asset in assets if asset.get('updateTime')]
+        if update_times or last_time is None:
+            self._set_last_time(
+                f'assets:{parent}', max_time(update_times + [last_time or EPOCH_TIME])
+            )
+        self.conn.commit()
+
+    def _list_operations(self, last_time=None):
+        """List the operations created after a time
+
+        The operations are listed with the public ee.data.listOperations.
+
+        Parameters
+        ----------
+        last_time : str, optional
+            Only return the operations created after this time.
+
+        Returns
+        -------
+        list : operation dictionaries
+
+        """
+        last_dt = parse_time(last_time)
+        return [
+            op for op in ee.data.listOperations()
+            if last_dt is None or parse_time(op['metadata']['createTime']) > last_dt
+        ]
+
+    def refresh_tasks(self):
+        """Update the cached task states
+
+        Only the operations created since the last refresh are written to the
+        cache.  The tasks that were not finished at the last refresh are then
+        rechecked by ID.
+
+        Returns
+        -------
+        None
+
+        """
+        last_time = self._last_time('tasks')
+        new_tasks = self._list_operations(last_time)
+        logging.debug(f'  New tasks: {len(new_tasks)}')
+
+        if last_time is None:
+            self.conn.execute('DELETE FROM tasks')
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO tasks '
+            '(id, description, state, create_time, update_time) VALUES (?, ?, ?, ?, ?)',
+            [
+                [
+                    op['name'].split('/')[-1], op['metadata'].get('description', ''),
+                    OPERATION_STATES.get(op['metadata']['state'], op['metadata']['state']),
+                    op['metadata']['createTime'],
+                    op['metadata'].get('updateTime', ''),
+                ]
+                for op in new_tasks
+            ]
+        )
+
+        # Recheck the tasks that were not finished at the last refresh
+        if last_time is not None:
+            last_dt = parse_time(last_time)
+            active_ids = [
+                row[0] for row in self.conn.execute(
+                    f'SELECT id, create_time FROM tasks WHERE state IN '
+                    f'({",".join("?" * len(UNFINISHED_STATES))})',
+                    UNFINISHED_STATES
+                )
+                if parse_time(row[1]) <= last_dt
+            ]
+            for i in range(0, len(active_ids), 100):
+                for status in ee.data.getTaskStatus(active_ids[i:i+100]):
+                    self.conn.execute(
+                        'UPDATE tasks SET state = ? WHERE id = ?',
+                        (status['state'], status['id'])
+                    )
+
+        create_times = [op['metadata']['createTime'] for op in new_tasks]
+        if create_times or last_time is None:
+            self._set_last_time('tasks', max_time(create_times + [last_time or EPOCH_TIME]))
+        self.conn.commit()
+
+    def get_ee_assets(self, parent):
+        """Refresh and return the asset IDs in a folder or image collection
+
+        Parameters
+        ----------
+        parent : str
+            Folder or image collection asset ID.
+
+        Returns
+        -------
+        list : asset IDs
+
+        """
+        self.refresh_assets(parent)
+        return [
+            row[0] for row in self.conn.execute(
+                'SELECT id FROM assets WHERE parent = ? ORDER BY id', (parent,)
+            )
+        ]
+
+    def get_ee_tasks(self, states=ACTIVE_STATES):
+        """Refresh and return the active tasks keyed by description
+
+        Parameters
+        ----------
+        states : list, optional
+            Task states to return (the default is READY and RUNNING).
+
+        Returns
+        -------
+        dict : task ID and state keyed by task description
+
+        """
+        self.refresh_tasks()
+        rows = self.conn.execute(
+            f'SELECT description, id, state, create_time FROM tasks '
+            f'WHERE state IN ({",".join("?" * len(states))})',
+            list(states)
+        ).fetchall()
+        # Later tasks with the same description replace the earlier ones
+        rows.sort(key=lambda row: parse_time(row[3]) or parse_time(EPOCH_TIME))
+        return {row[0]: {'id': row[1], 'state': row[2]} for row in rows}
+
+    def remove_asset(self, asset_id):
+        """Remove a deleted asset from the cache"""
+        self.conn.execute('DELETE FROM assets WHERE id = ?', (asset_id,))
+        self.conn.commit()
+
+    def set_task_state(self, task_id, state):
+        """Update the state of a task that was cancelled by the tools"""
+        self.conn.execute('UPDATE tasks SET state = ? WHERE id = ?', (state, task_id))
+        self.conn.commit()
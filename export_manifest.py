@@ -0,0 +1,139 @@
+#--------------------------------
+# Name:         export_manifest.py
+# Purpose:      Track the inputs used to build each crop type image
+#--------------------------------
+
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+
+import ee
+
+import openet.core.utils as utils
+
+# Increment if the structure of the manifest changes
+MANIFEST_VERSION = 1
+
+
+def read_manifest(manifest_path, coll_id):
+    """Read the export manifest for an image collection
+
+    A new empty manifest is returned if the file does not exist, or if it
+    was written for a different collection or manifest version.
+
+    Parameters
+    ----------
+    manifest_path : str
+        Manifest JSON file path.
+    coll_id : str
+        Export image collection asset ID.
+
+    Returns
+    -------
+    dict
+
+    """
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest.get('version') == MANIFEST_VERSION and
+                manifest.get('collection') == coll_id):
+            return manifest
+        logging.info('  Manifest is for a different collection/version, ignoring')
+    return {'version': MANIFEST_VERSION, 'collection': coll_id, 'images': {}}
+
+
+def write_manifest(manifest_path, manifest):
+    """Write the export manifest
+
+    Parameters
+    ----------
+    manifest_path : str
+        Manifest JSON file path.
+    manifest : dict
+
+    Returns
+    -------
+    None
+
+    """
+    manifest['date_updated'] = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def sync_manifest(manifest, coll_id, hash_property='input_hash'):
+    """Update the manifest hashes from the image properties in the collection
+
+    The hash property on the images is the authoritative value, since the
+    manifest entries are written when the export tasks are started (and the
+    tasks may have failed).  Entries are reset if the image hash doesn't
+    match the manifest, and are removed if the image doesn't exist or doesn't
+    have a hash.  Images without a hash are never treated as changed, so the
+    caller should set the hash on them from the current inputs.
+
+    Parameters
+    ----------
+    manifest : dict
+    coll_id : str
+        Export image collection asset ID.
+    hash_property : str, optional
+        Image property with the input hash (the default is 'input_hash').
+
+    Returns
+    -------
+    dict : the updated manifest
+
+    """
+    coll = ee.ImageCollection(coll_id).filter(ee.Filter.notNull([hash_property]))
+    image_hashes = utils.get_info(ee.Dictionary.fromLists(
+        coll.aggregate_array('system:index'), coll.aggregate_array(hash_property)
+    ))
+    for image_id in list(manifest['images'].keys()):
+        if image_id not in image_hashes.keys():
+            del manifest['images'][image_id]
+    for image_id, image_hash in image_hashes.items():
+        if manifest['images'].get(image_id, {}).get('hash') != image_hash:
+            manifest['images'][image_id] = {'hash': image_hash, 'inputs': {}}
+    return manifest
+
+
+def inputs_hash(inputs):
+    """Compute the hash of a tile year inputs dictionary
+
+    Parameters
+    ----------
+    inputs : dict
+
+    Returns
+    -------
+    str
+
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def changed_inputs(manifest, image_id, inputs):
+    """Return the names of the inputs that changed since the image was built
+
+    Parameters
+    ----------
+    manifest : dict
+    image_id : str
+    inputs : dict
+
+    Returns
+    -------
+    list : input names, or ['unknown'] if the inputs of the image were not
+        recorded (only the hash is known)
+
+    """
+    old_inputs = manifest['images'].get(image_id, {}).get('inputs', {})
+    if not old_inputs:
+        return ['unknown']
+    return sorted(
+        k for k in set(inputs.keys()) | set(old_inputs.keys())
+        if inputs.get(k) != old_inputs.get(k)
+    )
@@ -0,0 +1,209 @@
+#--------------------------------
+# Name:         export_scheduler.py
+# Purpose:      Keep a fixed number of Earth Engine export tasks in flight
+#--------------------------------
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+import ee
+
+import openet.core.utils as utils
+
+# Task states (from ee.batch.Task.State)
+FAILED_STATES = ['FAILED']
+DONE_STATES = ['COMPLETED', 'CANCELLED', 'FAILED']
+
+
+class ExportScheduler:
+    """Submit export tasks from a work queue without exceeding a task limit
+
+    Tasks are built and started from a thread pool as slots open up.  The
+    state of the running tasks is polled with an exponential backoff that
+    resets whenever a task finishes, and failed tasks are rebuilt and
+    resubmitted up to the retry limit.
+
+    The start and status functions can be replaced so the scheduler can be
+    driven without Earth Engine (i.e. with a local fake of ee.batch/ee.data).
+
+    Parameters
+    ----------
+    max_tasks : int, optional
+        Maximum number of tasks in flight (the default is 0).  If 0, all tasks
+        are started immediately and the scheduler will not wait for them.
+    workers : int, optional
+        Number of threads used to build and start tasks (the default is 4).
+    max_retries : int, optional
+        Number of times a failed task will be resubmitted (the default is 2).
+    delay : float, optional
+        Delay time between each export task (the default is 0).
+    poll_min : float, optional
+        Minimum number of seconds between task status polls (the default is 10).
+    poll_max : float, optional
+        Maximum number of seconds between task status polls (the default is 300).
+    start_fn : function, optional
+        Function for starting a task (the default is utils.ee_task_start).
+    status_fn : function, optional
+        Function for getting the status of a list of task IDs
+        (the default is ee.data.getTaskStatus).
+    state_fn : function, optional
+        Function called with the export ID, state, and task ID when a task is
+        started or finishes (i.e. for journaling the task states).  The task
+        ID is None if the export failed without a task (the retry limit was
+        reached after a task could not be started).
+
+    """
+    def __init__(
+            self,
+            max_tasks=0,
+            workers=4,
+            max_retries=2,
+            delay=0,
+            poll_min=10,
+            poll_max=300,
+            start_fn=None,
+            status_fn=None,
+            state_fn=None,
+            ):
+        self.max_tasks = max_tasks
+        self.workers = workers
+        self.max_retries = max_retries
+        self.delay = delay
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.start_fn = start_fn if start_fn else utils.ee_task_start
+        self.status_fn = status_fn if status_fn else ee.data.getTaskStatus
+        self.state_fn = state_fn
+
+        self._queue = deque()
+        self._attempts = {}
+        self.states = {}
+
+    def submit(self, export_id, build_fn):
+        """Add an export to the work queue
+
+        Parameters
+        ----------
+        export_id : str
+            Export task description.
+        build_fn : function
+            Function that returns an unstarted ee.batch.Task.  The function is
+            called again for each retry so that a new task is built.
+
+        """
+        self._queue.append([export_id, build_fn])
+        self._attempts[export_id] = 0
+
+    def run(self):
+        """Start the queued exports and wait for them to finish
+
+        Returns
+        -------
+        dict : final task state keyed by export ID
+
+        """
+        if not self._queue:
+            return self.states
+
+        running = {}
+        poll_time = self.poll_min
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while self._queue or running:
+                # Fill the open slots
+                if self.max_tasks > 0:
+                    slots = self.max_tasks - len(running)
+                else:
+                    slots = len(self._queue)
+                starts = []
+                while self._queue and slots > 0:
+                    export_id, build_fn = self._queue.popleft()
+                    self._attempts[export_id] += 1
+                    starts.append([
+                        export_id, build_fn,
+                        executor.submit(self._start, export_id, build_fn)
+                    ])
+                    slots -= 1
+                for export_id, build_fn, future in starts:
+                    try:
+                        task = future.result()
+                    except Exception as e:
+                        logging.warning(f'  {export_id} - task could not be started\n  {e}')
+                        self._retry(export_id, build_fn)
+                        continue
+                    running[task.id] = [export_id, build_fn]
+                    self._set_state(export_id, 'READY', task.id)
+
+                # Don't wait on the tasks if there is no task limit
+                if self.max_tasks <= 0 and not self._queue:
+                    break
+
+                time.sleep(poll_time)
+                finished = self._poll(running)
+                if finished:
+                    poll_time = self.poll_min
+                else:
+                    poll_time = min(poll_time * 2, self.poll_max)
+
+        return self.states
+
+    def _start(self, export_id, build_fn):
+        """Build and start a single export task"""
+        logging.info(f'  Starting export task: {export_id}')
+        task = build_fn()
+        self.start_fn(task)
+        utils.delay_task(self.delay)
+        if not task.id:
+            raise Exception('task ID was not set')
+        return task
+
+    def _poll(self, running):
+        """Update the state of the running tasks
+
+        Returns
+        -------
+        int : number of tasks that finished
+
+        """
+        try:
+            statuses = self.status_fn(list(running.keys()))
+        except Exception as e:
+            logging.warning(f'  Task status request failed\n  {e}')
+            return 0
+
+        finished = 0
+        for status in statuses:
+            if status['id'] not in running.keys():
+                continue
+            export_id, build_fn = running[status['id']]
+            self.states[export_id] = status['state']
+            if status['state'] not in DONE_STATES:
+                continue
+
+            del running[status['id']]
+            finished += 1
+            self._set_state(export_id, status['state'], status['id'])
+            if status['state'] in FAILED_STATES:
+                logging.warning(
+                    f'  {export_id} - task failed: {status.get("error_message", "")}'
+                )
+                self._retry(export_id, build_fn)
+            else:
+                logging.info(f'  {export_id} - {status["state"].lower()}')
+        return finished
+
+    def _retry(self, export_id, build_fn):
+        """Requeue an export if it is under the retry limit"""
+        if self._attempts[export_id] <= self.max_retries:
+            logging.info(f'  {export_id} - resubmitting')
+            self._queue.appendleft([export_id, build_fn])
+        else:
+            logging.warning(f'  {export_id} - retry limit reached')
+            self._set_state(export_id, 'FAILED')
+
+    def _set_state(self, export_id, state, task_id=None):
+        """Set the state of an export and pass it to the state function"""
+        self.states[export_id] = state
+        if self.state_fn:
+            self.state_fn(export_id, state, task_id)
@@ -1,14 +1,20 @@
 import argparse
 import logging
 import os
+import sys
 # import pprint
 
 import ee
 from google.cloud import storage
-import pandas as pd
 
 import openet.core.utils as utils
 
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crop_type_cdl_annual_remap import cdl_annual_remap_image, remapped_cdl_years
+import crop_type_remap
+from ee_state_cache import EEStateCache
+
 PROJECT_NAME = 'openet'
 STORAGE_CLIENT = storage.Client(project=PROJECT_NAME)
 
@@ -41,6 +47,9 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
 
     project_id = 'projects/openet/assets'
 
+    # Annual crop remapped CDL images built by crop_type_cdl_annual_remap.py
+    cdl_remap_coll_id = f'{project_id}/crop_type/cdl_annual_remap'
+
     field_folder_id = f'{project_id}/features/fields/temp'
     # field_folder_id = f'{project_id}/features/fields/2024-02-01'
 
@@ -122,12 +131,9 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
     # Load the CDL annual crop remap
     # TODO: Get the script path instead (in case it is different than the cwd)
     remap_path = os.path.join(os.path.dirname(os.getcwd()), 'cdl_annual_crop_remap_table.csv')
-    remap_df = pd.read_csv(remap_path, comment='#').sort_values(by='IN')
-    cdl_annual_remap = dict(zip(remap_df.IN, remap_df.OUT))
-    # Set all unassigned values to remap to themselves
-    for cdl_code in set(range(1, 256)) - set(cdl_annual_remap.keys()):
-        cdl_annual_remap[cdl_code] = cdl_code
-    cdl_remap_in, cdl_remap_out = map(list, zip(*cdl_annual_remap.items()))
+    # All unassigned values are set to remap to themselves
+    cdl_annual_lut = crop_type_remap.load_remap_table(remap_path, identity=True)
+    cdl_remap_in, cdl_remap_out = cdl_annual_lut.ee_remap_args()
 
 
     # Setting the in between years explicitly
@@ -168,13 +174,19 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
         ee.Initialize()
 
 
-    # Get current running tasks
-    tasks = utils.get_ee_tasks()
+    # Get current running tasks (from the incrementally refreshed local cache)
+    state_cache = EEStateCache()
+    tasks = state_cache.get_ee_tasks()
     if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
         logging.debug(f'  Tasks: {len(tasks)}')
         # input('ENTER')
 
 
+    # Use the precomputed remapped CDL images if they match the current remap
+    cdl_remap_years = remapped_cdl_years(cdl_annual_lut.hash, cdl_remap_coll_id)
+    logging.info(f'\nCDL remap years: {", ".join(cdl_remap_years)}')
+
+
     logging.info('\nGetting bucket file list')
     bucket = STORAGE_CLIENT.get_bucket(bucket_name)
     bucket_files = sorted([
@@ -208,6 +220,7 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
                 if export_id in tasks.keys():
                     logging.info('  Task already submitted, cancelling')
                     ee.data.cancelTask(tasks[export_id]['id'])
+                    state_cache.set_task_state(tasks[export_id]['id'], 'CANCELLED')
                 if export_id in bucket_files:
                     logging.info('  File already exists in bucket, overwriting')
                     # TODO: Uncomment if export doesn't overwrite
@@ -233,21 +246,19 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
                 # The .where() would be needed if the remap was incomplete
                 #     .where(remap_img, 47)
                 cdl_img_id = f'{cdl_coll_id}/{cdl_year_max}'
-                cdl_img = (
-                    ee.Image(cdl_img_id)
-                    .select(['cropland'], [f'CROP_{year}'])
-                    .remap(cdl_remap_in, cdl_remap_out)
-                )
+                cdl_img = cdl_annual_remap_image(
+                    cdl_img_id, cdl_remap_in, cdl_remap_out,
+                    cdl_remap_years, cdl_remap_coll_id,
+                ).rename([f'CROP_{year}'])
                 crop_source = f'{cdl_img_id} - remapped annual crops'
             elif year < cdl_year_min and year not in cdl_state_years[state]:
                 # NOTE: This condition can currently never happen because
                 #   of year filtering at beginning of for loop
                 cdl_img_id = f'{cdl_coll_id}/{cdl_year_min}'
-                cdl_img = (
-                    ee.Image(cdl_img_id)
-                    .select(['cropland'], [f'CROP_{year}'])
-                    .remap(cdl_remap_in, cdl_remap_out)
-                )
+                cdl_img = cdl_annual_remap_image(
+                    cdl_img_id, cdl_remap_in, cdl_remap_out,
+                    cdl_remap_years, cdl_remap_coll_id,
+                ).rename([f'CROP_{year}'])
                 crop_source = f'{cdl_img_id} - remapped annual crops'
             elif year == 2005:
                 if state == 'ID':
@@ -360,6 +371,7 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
                 if export_id in tasks.keys():
                     logging.info('  Task already submitted, cancelling')
                     ee.data.cancelTask(tasks[export_id]['id'])
+                    state_cache.set_task_state(tasks[export_id]['id'], 'CANCELLED')
                 if export_id in bucket_files:
                     logging.info('  File already exists in bucket, overwriting')
                     # TODO: Uncomment if export doesn't overwrite
@@ -468,6 +480,7 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
                 if export_id in tasks.keys():
                     logging.info('  Task already submitted, cancelling')
                     ee.data.cancelTask(tasks[export_id]['id'])
+                    state_cache.set_task_state(tasks[export_id]['id'], 'CANCELLED')
                 if export_id in bucket_files:
                     logging.info('  File already exists in bucket, overwriting')
                     # TODO: Uncomment if export doesn't overwrite
@@ -522,17 +535,19 @@ def main(states, years=[], overwrite_flag=False, gee_key_file=None):
             #     if year not in cdl_state_years[state]:
             #         logging.debug(f'  CDL {year} not available for {state} - skipping')
             #         continue
-            cdl_img = ee.Image(cdl_img_id).select(['cropland'], ['cdl'])
+            # Remap was modified to map all missing values to them self
+            # The .where() would be needed if the remap was incomplete
+            #     .where(remap_img, 47)
+            cdl_img = cdl_annual_remap_image(
+                cdl_img_id, cdl_remap_in, cdl_remap_out,
+                cdl_remap_years, cdl_remap_coll_id,
+            ).rename(['cdl'])
 
             # Mask any cloud/nodata pixels (mostly in pre-2008 years)
             # Probably not needed for California but including to be consistent
+            # 81 is not in the remap table so it can be masked after the remap
             cdl_img = cdl_img.updateMask(cdl_img.neq(81))
 
-            # Remap was modified to map all missing values to them self
-            # The .where() would be needed if the remap was incomplete
-            #     .where(remap_img, 47)
-            cdl_img = cdl_img.remap(cdl_remap_in, cdl_remap_out)
-
             # Select the NLCD year
             # Use the first/last available year if outside the available range
             nlcd_year = min(year, max(nlcd_img_ids.keys()))
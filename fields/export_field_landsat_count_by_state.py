@@ -2,12 +2,18 @@ import argparse
 import logging
 import os
 import pprint
+import sys
 
 import ee
 from google.cloud import storage
 
 import openet.core.utils as utils
 
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ee_async import EEAsyncClient
+from ee_state_cache import EEStateCache
+
 PROJECT_NAME = 'openet'
 STORAGE_CLIENT = storage.Client(project=PROJECT_NAME)
 
@@ -69,8 +75,9 @@ def main(states, overwrite_flag=False, gee_key_file=None):
         ee.Initialize()
 
 
-    # Get current running tasks
-    tasks = utils.get_ee_tasks()
+    # Get current running tasks (from the incrementally refreshed local cache)
+    state_cache = EEStateCache()
+    tasks = state_cache.get_ee_tasks()
     if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
         logging.debug(f'  Tasks: {len(tasks)}')
         input('ENTER')
@@ -85,13 +92,23 @@ def main(states, overwrite_flag=False, gee_key_file=None):
     ])
 
 
+    # Get the MGRS tiles in each state field collection (concurrently)
+    logging.info('\nGetting state field collection MGRS tiles')
+    ee_client = EEAsyncClient()
+    state_mgrs_tiles = ee_client.gather({
+        state: ee_client.get_info(
+            ee.FeatureCollection(f'{field_folder_id}/{state}')
+            .aggregate_histogram('MGRS_TILE').keys()
+        )
+        for state in states
+    })
+
+
     for state in states:
         logging.info(f'\n{state} CDL')
 
         field_coll_id = f'{field_folder_id}/{state}'
-        mgrs_tiles = utils.get_info(
-            ee.FeatureCollection(field_coll_id).aggregate_histogram('MGRS_TILE').keys()
-        )
+        mgrs_tiles = state_mgrs_tiles[state]
         utm_zones = {mgrs_tile[:2] for mgrs_tile in mgrs_tiles}
 
         for utm_zone in utm_zones:
@@ -102,6 +119,7 @@ def main(states, overwrite_flag=False, gee_key_file=None):
                 if export_id in tasks.keys():
                     logging.info('  Task already submitted, cancelling')
                     ee.data.cancelTask(tasks[export_id]['id'])
+                    state_cache.set_task_state(tasks[export_id]['id'], 'CANCELLED')
                 if export_id in bucket_files:
                     logging.info('  File already exists in bucket, overwriting')
                     # TODO: Uncomment if export doesn't overwrite
@@ -0,0 +1,421 @@
+#--------------------------------
+# Name:         field_store.py
+# Purpose:      Read and write the state field GeoParquet store
+#--------------------------------
+
+import json
+import logging
+import os
+import re
+import shutil
+
+import numpy as np
+from osgeo import ogr, osr
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import shapely
+
+ogr.UseExceptions()
+
+# Each state folder is partitioned by the MGRS zone ("<STATE>/MGRS_ZONE=10S/")
+# The zone is the first 3 characters of the MGRS_TILE value
+ZONE_COLUMN = 'MGRS_ZONE'
+BBOX_FIELDS = ['xmin', 'ymin', 'xmax', 'ymax']
+# Crop type and crop source year columns (i.e. "CROP_2020" and "CSRC_2020")
+CROP_COLUMN_RE = re.compile(r'^(CROP|CSRC)_\d{4}$')
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([(ZONE_COLUMN, pa.string())]), flavor='hive')
+
+
+def state_exists(store_ws, state):
+    """Check if a state is in the field store"""
+    return os.path.isdir(os.path.join(store_ws, state))
+
+
+def state_metadata(store_ws, state):
+    """Read the GeoParquet and field width metadata of a state
+
+    Parameters
+    ----------
+    store_ws : str
+        Field store folder.
+    state : str
+
+    Returns
+    -------
+    tuple : arrow schema, GeoParquet "geo" dictionary, and the shapefile
+        field widths ([width, precision] keyed by field name)
+
+    """
+    schema = ds.dataset(
+        os.path.join(store_ws, state), format='parquet', partitioning=_partitioning()
+    ).schema
+    metadata = schema.metadata or {}
+    geo = json.loads(metadata.get(b'geo', b'{}'))
+    field_widths = json.loads(metadata.get(b'field_widths', b'{}'))
+    return schema, geo, field_widths
+
+
+def read_fields(store_ws, state, columns=None, mgrs_zones=None, bbox=None):
+    """Read the fields of a state
+
+    The MGRS zone filter only reads the matching partitions, and the bbox
+    filter is applied to the bbox covering columns so row groups outside the
+    extent are skipped.
+
+    Parameters
+    ----------
+    store_ws : str
+        Field store folder.
+    state : str
+    columns : list, optional
+        Columns to read.  If not set, all columns are read.
+    mgrs_zones : list, optional
+        MGRS zones (i.e. "10S") to read.  If not set, all zones are read.
+    bbox : list, optional
+        [xmin, ymin, xmax, ymax] extent (in the store projection) the field
+        bounding boxes must intersect.
+
+    Returns
+    -------
+    pandas.DataFrame : the geometry column is WKB
+
+    """
+    dataset = ds.dataset(
+        os.path.join(store_ws, state), format='parquet', partitioning=_partitioning()
+    )
+    filter = None
+    if mgrs_zones:
+        filter = ds.field(ZONE_COLUMN).isin(mgrs_zones)
+    if bbox:
+        xmin, ymin, xmax, ymax = bbox
+        bbox_filter = (
+            (ds.field('bbox', 'xmax') >= xmin) & (ds.field('bbox', 'xmin') <= xmax) &
+            (ds.field('bbox', 'ymax') >= ymin) & (ds.field('bbox', 'ymin') <= ymax)
+        )
+        filter = bbox_filter if filter is None else filter & bbox_filter
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c not in ['bbox', ZONE_COLUMN]]
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def write_fields(store_ws, state, fields_df, crs=None, field_widths=None):
+    """Write (replace) the fields of a state
+
+    The bbox covering and MGRS zone partition columns are computed from the
+    geometries and MGRS_TILE values, and the fields are sorted by tile and
+    latitude so nearby fields are in the same row groups.  The crop type and
+    crop source columns are moved after the other columns in sorted order
+    (the shapefile field order), since new year columns are appended to the
+    end of the dataframe.  The new state folder is written next to the
+    existing one and swapped in after all of the files are written.
+
+    Parameters
+    ----------
+    store_ws : str
+        Field store folder.
+    state : str
+    fields_df : pandas.DataFrame
+        All of the state fields, with a WKB "geometry" column.
+    crs : dict, optional
+        Field projection as PROJJSON.  If not set, the existing state
+        projection is kept.
+    field_widths : dict, optional
+        Shapefile field [width, precision] keyed by field name.  If not set,
+        the existing state field widths are kept.
+
+    Returns
+    -------
+    None
+
+    """
+    state_ws = os.path.join(store_ws, state)
+    existing_schema = None
+    if state_exists(store_ws, state):
+        existing_schema, existing_geo, existing_widths = state_metadata(store_ws, state)
+        if crs is None:
+            crs = existing_geo.get('columns', {}).get('geometry', {}).get('crs')
+        if field_widths is None:
+            field_widths = existing_widths
+
+    fields_df = fields_df.drop(columns=['bbox', ZONE_COLUMN], errors='ignore')
+    crop_columns = sorted(c for c in fields_df.columns if CROP_COLUMN_RE.match(c))
+    fields_df = fields_df[
+        [c for c in fields_df.columns if not CROP_COLUMN_RE.match(c)] + crop_columns
+    ]
+
+    table = pa.Table.from_pandas(fields_df, preserve_index=False)
+    # Keep the existing column types, since pandas converts integer columns
+    #   with missing values to floats
+    if existing_schema is not None:
+        for i, name in enumerate(table.column_names):
+            if (name in existing_schema.names and
+                    existing_schema.field(name).type != table.schema.field(name).type):
+                table = table.set_column(
+                    i, existing_schema.field(name), table[name].cast(existing_schema.field(name).type)
+                )
+
+    bounds = shapely.bounds(shapely.from_wkb(table['geometry'].to_numpy(zero_copy_only=False)))
+    table = table.append_column('bbox', pa.StructArray.from_arrays(
+        [pa.array(bounds[:, i]) for i in range(4)], names=BBOX_FIELDS
+    ))
+    if 'MGRS_TILE' in table.column_names:
+        mgrs_zones = pc.utf8_slice_codeunits(table['MGRS_TILE'], 0, 3)
+        mgrs_zones = pc.if_else(pc.equal(mgrs_zones, ''), None, mgrs_zones)
+    else:
+        mgrs_zones = pa.nulls(len(table), pa.string())
+    table = table.append_column(ZONE_COLUMN, mgrs_zones)
+    order = np.lexsort([
+        bounds[:, 1], pc.fill_null(mgrs_zones, '').to_numpy(zero_copy_only=False).astype(str)
+    ])
+    table = table.take(order)
+
+    geo = {
+        'version': '1.1.0',
+        'primary_column': 'geometry',
+        'columns': {
+            'geometry': {
+                'encoding': 'WKB',
+                'geometry_types': [],
+                'crs': crs,
+                'covering': {'bbox': {k: ['bbox', k] for k in BBOX_FIELDS}},
+            },
+        },
+    }
+    table = table.replace_schema_metadata({
+        b'geo': json.dumps(geo).encode(),
+        b'field_widths': json.dumps(field_widths or {}).encode(),
+    })
+
+    temp_ws = f'{state_ws}_temp'
+    if os.path.isdir(temp_ws):
+        shutil.rmtree(temp_ws)
+    ds.write_dataset(
+        table, temp_ws, format='parquet', partitioning=_partitioning(),
+        max_rows_per_group=50000,
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+    )
+    if os.path.isdir(state_ws):
+        os.rename(state_ws, f'{state_ws}_old')
+        os.rename(temp_ws, state_ws)
+        shutil.rmtree(f'{state_ws}_old')
+    else:
+        os.rename(temp_ws, state_ws)
+
+
+def update_fields(store_ws, state, values_df, defaults={}):
+    """Set field values by OPENET_ID
+
+    Parameters
+    ----------
+    store_ws : str
+        Field store folder.
+    state : str
+    values_df : pandas.DataFrame
+        New values indexed by OPENET_ID.  Missing values are not set.
+    defaults : dict, optional
+        Default values of the columns that are not in the store yet.
+
+    Returns
+    -------
+    None
+
+    """
+    fields_df = read_fields(store_ws, state)
+    for column in values_df.columns:
+        if column not in fields_df.columns:
+            fields_df[column] = defaults.get(column)
+        values = fields_df['OPENET_ID'].map(values_df[column])
+        mask = values.notna()
+        fields_df.loc[mask, column] = values[mask]
+    write_fields(store_ws, state, fields_df)
+
+
+def shapefile_to_store(shp_path, store_ws, state, batch_size=100000):
+    """Write the fields of a state shapefile to the store
+
+    Parameters
+    ----------
+    shp_path : str
+    store_ws : str
+        Field store folder.
+    state : str
+    batch_size : int, optional
+        Number of features to read at a time (the default is 100000).
+
+    Returns
+    -------
+    None
+
+    """
+    fields_df, crs, field_widths = read_shapefile(shp_path, batch_size=batch_size)
+    logging.info(f'  Writing {len(fields_df)} fields to the field store')
+    write_fields(store_ws, state, fields_df, crs=crs, field_widths=field_widths)
+
+
+def sync_shapefile(shp_path, store_ws, state, columns, defaults={}, batch_size=100000):
+    """Update the fields of a state in the store from the state shapefile
+
+    Fields that are only in the shapefile are added and fields that are only
+    in the store are removed.  The geometries and the "columns" values of the
+    other fields are copied from the shapefile, and all other store values
+    (i.e. the crop types) are kept.
+
+    Parameters
+    ----------
+    shp_path : str
+    store_ws : str
+        Field store folder.
+    state : str
+    columns : list
+        Columns to copy from the shapefile for the existing fields.
+    defaults : dict, optional
+        Default values of the store columns that are not in the shapefile
+        (for the added fields) or of the columns that are not in the store
+        yet (for the existing fields).
+    batch_size : int, optional
+        Number of features to read at a time (the default is 100000).
+
+    Returns
+    -------
+    dict : number of added, updated (geometry changed), and removed fields
+
+    """
+    shp_df, crs, field_widths = read_shapefile(shp_path, batch_size=batch_size)
+    # Only the first feature of any duplicate IDs is kept
+    shp_df = shp_df[~shp_df['OPENET_ID'].duplicated()]
+    fields_df = read_fields(store_ws, state)
+    for column in columns:
+        if column not in fields_df.columns:
+            fields_df[column] = defaults.get(column)
+
+    # Remove the fields that are not in the shapefile
+    keep_mask = fields_df['OPENET_ID'].isin(shp_df['OPENET_ID'])
+    counts = {'removed': int((~keep_mask).sum())}
+    fields_df = fields_df[keep_mask].reset_index(drop=True)
+
+    # Copy the geometries and values of the existing fields
+    shp_values = shp_df.set_index('OPENET_ID').loc[fields_df['OPENET_ID']]
+    counts['updated'] = int(
+        (shp_values['geometry'].to_numpy() != fields_df['geometry'].to_numpy()).sum()
+    )
+    fields_df['geometry'] = shp_values['geometry'].to_numpy()
+    for column in columns:
+        fields_df[column] = shp_values[column].to_numpy()
+
+    # Add the new fields
+    new_df = shp_df[~shp_df['OPENET_ID'].isin(fields_df['OPENET_ID'])].copy()
+    counts['added'] = len(new_df)
+    for column in fields_df.columns:
+        if column not in new_df.columns:
+            new_df[column] = defaults.get(column)
+    fields_df = pd.concat([fields_df, new_df[fields_df.columns]], ignore_index=True)
+
+    write_fields(
+        store_ws, state, fields_df,
+        field_widths={**state_metadata(store_ws, state)[2], **field_widths},
+    )
+    return counts
+
+
+def read_shapefile(shp_path, batch_size=100000):
+    """Read the features of a shapefile
+
+    Parameters
+    ----------
+    shp_path : str
+    batch_size : int, optional
+        Number of features to read at a time (the default is 100000).
+
+    Returns
+    -------
+    tuple : pandas.DataFrame (with a WKB "geometry" column), projection as
+        PROJJSON, and the field [width, precision] keyed by field name
+
+    """
+    input_ds = ogr.GetDriverByName('ESRI Shapefile').Open(shp_path, 0)
+    input_layer = input_ds.GetLayer()
+    input_lyr_defn = input_layer.GetLayerDefn()
+    field_widths = {
+        input_lyr_defn.GetFieldDefn(i).GetNameRef(): [
+            input_lyr_defn.GetFieldDefn(i).GetWidth(),
+            input_lyr_defn.GetFieldDefn(i).GetPrecision(),
+        ]
+        for i in range(input_lyr_defn.GetFieldCount())
+    }
+    crs = json.loads(input_layer.GetSpatialRef().ExportToPROJJSON())
+    geom_column = input_layer.GetGeometryColumn() or 'wkb_geometry'
+
+    stream = input_layer.GetArrowStreamAsPyArrow(
+        options=['INCLUDE_FID=NO', f'MAX_FEATURES_IN_BATCH={batch_size}']
+    )
+    table = pa.Table.from_batches(list(stream), schema=stream.schema)
+    input_ds = None
+    table = table.rename_columns([
+        'geometry' if name == geom_column else name for name in table.column_names
+    ])
+    return table.to_pandas(), crs, field_widths
+
+
+def store_to_shapefile(store_ws, state, shp_path):
+    """Write the fields of a state to a shapefile
+
+    Parameters
+    ----------
+    store_ws : str
+        Field store folder.
+    state : str
+    shp_path : str
+        Output shapefile path.  An existing shapefile is overwritten.
+
+    Returns
+    -------
+    None
+
+    """
+    schema, geo, field_widths = state_metadata(store_ws, state)
+    fields_df = read_fields(store_ws, state)
+
+    output_osr = osr.SpatialReference()
+    output_osr.SetFromUserInput(json.dumps(geo['columns']['geometry']['crs']))
+    output_osr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
+    if os.path.isfile(shp_path):
+        shp_driver.DeleteDataSource(shp_path)
+    output_ds = shp_driver.CreateDataSource(shp_path)
+    output_layer = output_ds.CreateLayer(
+        os.path.splitext(os.path.basename(shp_path))[0], output_osr, ogr.wkbPolygon
+    )
+    columns = [c for c in fields_df.columns if c != 'geometry']
+    for column in columns:
+        width, precision = field_widths.get(column, [0, 0])
+        if pd.api.types.is_integer_dtype(fields_df[column]):
+            field_defn = ogr.FieldDefn(column, ogr.OFTInteger)
+        elif pd.api.types.is_float_dtype(fields_df[column]):
+            field_defn = ogr.FieldDefn(column, ogr.OFTReal)
+            width, precision = width or 24, precision or 2
+        else:
+            field_defn = ogr.FieldDefn(column, ogr.OFTString)
+            width = width or min(max(int(fields_df[column].str.len().max() or 1), 1), 254)
+        field_defn.SetWidth(width)
+        field_defn.SetPrecision(precision)
+        output_layer.CreateField(field_defn)
+    output_lyr_defn = output_layer.GetLayerDefn()
+
+    column_values = [fields_df[column].tolist() for column in columns]
+    for geometry, values in zip(fields_df['geometry'].tolist(), zip(*column_values)):
+        output_ftr = ogr.Feature(output_lyr_defn)
+        for field_i, value in enumerate(values):
+            # Skip the missing (None/NaN) values
+            if value is None or value != value:
+                continue
+            output_ftr.SetField(field_i, value)
+        if geometry is not None:
+            output_ftr.SetGeometry(ogr.CreateGeometryFromWkb(geometry))
+        output_layer.CreateFeature(output_ftr)
+    output_ds = None
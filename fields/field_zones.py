@@ -0,0 +1,215 @@
+#--------------------------------
+# Name:         field_zones.py
+# Purpose:      Assign the county/HUC12/MGRS zone values to the field polygons
+#--------------------------------
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import logging
+
+import numpy as np
+from osgeo import ogr, osr
+import shapely
+
+ogr.UseExceptions()
+
+# Zone trees built once in each worker process by _init_zone_trees()
+_ZONE_TREES = {}
+
+
+def field_zones(shp_path, zone_sources, method='overlap', workers=4, batch_size=100000):
+    """Spatially join the zone polygon values to each feature of a shapefile
+
+    The zone polygons that intersect the shapefile extent are loaded into a
+    shapely STRtree for each zone source.  The field geometries are read in
+    batches as WKB arrays (GDAL Arrow stream) and each batch is joined to
+    all of the zone trees in a worker process, so the join doesn't make any
+    per feature requests.
+
+    Parameters
+    ----------
+    shp_path : str
+        Field shapefile path.
+    zone_sources : list
+        [output field, zone shapefile path, zone value field] for each zone.
+    method : {'overlap', 'centroid'}, optional
+        Assign the zone with the largest overlap with the field, or the zone
+        that contains a point on the field surface (the default is 'overlap').
+    workers : int, optional
+        Number of processes (the default is 4).
+    batch_size : int, optional
+        Number of fields in each batch (the default is 100000).
+
+    Returns
+    -------
+    dict : zone value arrays indexed by FID keyed by output field
+        ('' for fields that don't intersect a zone)
+
+    """
+    input_ds = ogr.GetDriverByName('ESRI Shapefile').Open(shp_path, 0)
+    input_layer = input_ds.GetLayer()
+    input_lyr_defn = input_layer.GetLayerDefn()
+    input_osr = input_layer.GetSpatialRef()
+    xmin, xmax, ymin, ymax = input_layer.GetExtent()
+
+    zones = {}
+    for field_name, zone_path, zone_field in zone_sources:
+        zones[field_name] = read_zone_polygons(
+            zone_path, zone_field, input_osr, [xmin, ymin, xmax, ymax]
+        )
+        logging.info(f'  {field_name} zones: {len(zones[field_name][1])}')
+
+    # Only the FID and geometry columns are read
+    input_layer.SetIgnoredFields([
+        input_lyr_defn.GetFieldDefn(i).GetNameRef()
+        for i in range(input_lyr_defn.GetFieldCount())
+    ])
+    geom_column = input_layer.GetGeometryColumn() or 'wkb_geometry'
+
+    # Shapefile FIDs are sequential starting at 0
+    feature_count = input_layer.GetFeatureCount()
+    values = {
+        field_name: np.full(feature_count, '', dtype=object) for field_name in zones.keys()
+    }
+
+    def update(future):
+        fids, batch_values = future.result()
+        for field_name, field_values in batch_values.items():
+            values[field_name][fids] = field_values
+
+    stream = input_layer.GetArrowStreamAsNumPy(
+        options=['INCLUDE_FID=YES', f'MAX_FEATURES_IN_BATCH={batch_size}']
+    )
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_zone_trees,
+                             initargs=(zones,)) as executor:
+        pending = set()
+        for batch in stream:
+            # The stream arrays are only valid until the next batch is read
+            pending.add(executor.submit(
+                _assign_batch, np.array(batch['OGC_FID']), list(batch[geom_column]), method
+            ))
+            # Limit the number of batches in memory
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    update(future)
+        for future in wait(pending).done:
+            update(future)
+    input_ds = None
+
+    return values
+
+
+def read_zone_polygons(zone_path, zone_field, dst_osr, extent):
+    """Read the zone polygons that intersect an extent
+
+    Parameters
+    ----------
+    zone_path : str
+        Zone polygon shapefile path.
+    zone_field : str
+        Zone value field.
+    dst_osr : osr.SpatialReference
+        Output projection (the field shapefile projection).
+    extent : list
+        [xmin, ymin, xmax, ymax] in the output projection.
+
+    Returns
+    -------
+    tuple : list of WKB geometries and list of zone values
+        Zones without a geometry or a zone value are not included.
+
+    """
+    zone_ds = ogr.Open(zone_path, 0)
+    zone_layer = zone_ds.GetLayer()
+    zone_osr = zone_layer.GetSpatialRef()
+
+    # Filter the zones to the extent in the zone projection
+    xmin, ymin, xmax, ymax = extent
+    corners = np.array(osr.CoordinateTransformation(dst_osr, zone_osr).TransformPoints(
+        [[xmin, ymin], [xmin, ymax], [xmax, ymin], [xmax, ymax]]
+    ))
+    zone_layer.SetSpatialFilterRect(
+        corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max()
+    )
+
+    transform = osr.CoordinateTransformation(zone_osr, dst_osr)
+    zone_wkbs = []
+    zone_values = []
+    for zone_ftr in zone_layer:
+        zone_geom = zone_ftr.GetGeometryRef()
+        zone_value = zone_ftr.GetField(zone_field)
+        # Skip zones without a value so fields don't get a "None" zone
+        if not zone_geom or zone_value is None or str(zone_value).strip() == '':
+            continue
+        zone_geom = zone_geom.Clone()
+        zone_geom.Transform(transform)
+        zone_wkbs.append(bytes(zone_geom.ExportToWkb()))
+        zone_values.append(str(zone_value))
+    zone_ds = None
+
+    return zone_wkbs, zone_values
+
+
+def assign_zones(geoms, tree, zone_geoms, zone_values, method='overlap'):
+    """Assign a zone value to each geometry
+
+    Parameters
+    ----------
+    geoms : ndarray
+        Field shapely geometries.
+    tree : shapely.STRtree
+        Tree of the zone geometries.
+    zone_geoms : ndarray
+        Zone shapely geometries (in the tree order).
+    zone_values : ndarray
+        Zone values (in the tree order).
+    method : {'overlap', 'centroid'}, optional
+        Assign the zone with the largest overlap with the field, or the zone
+        that contains a point on the field surface (the default is 'overlap').
+
+    Returns
+    -------
+    ndarray : zone value for each geometry ('' if it doesn't intersect a zone)
+
+    """
+    output = np.full(len(geoms), '', dtype=object)
+    if method == 'centroid':
+        # The point on surface is always inside the field (unlike the centroid)
+        field_i, zone_i = tree.query(shapely.point_on_surface(geoms), predicate='intersects')
+    elif method == 'overlap':
+        field_i, zone_i = tree.query(geoms, predicate='intersects')
+        if len(field_i):
+            overlap = shapely.area(shapely.intersection(geoms[field_i], zone_geoms[zone_i]))
+            # Sort the pairs by field and then by descending overlap
+            order = np.lexsort([-overlap, field_i])
+            field_i, zone_i = field_i[order], zone_i[order]
+    else:
+        raise ValueError(f'unsupported method: {method}')
+
+    # Keep the first zone for each field
+    field_i, first_i = np.unique(field_i, return_index=True)
+    output[field_i] = zone_values[zone_i[first_i]]
+
+    return output
+
+
+def _init_zone_trees(zones):
+    """Build the zone trees in a worker process"""
+    for field_name, (zone_wkbs, zone_values) in zones.items():
+        zone_geoms = shapely.from_wkb(zone_wkbs)
+        _ZONE_TREES[field_name] = [
+            shapely.STRtree(zone_geoms), zone_geoms, np.array(zone_values, dtype=object)
+        ]
+
+
+def _assign_batch(fids, wkbs, method='overlap'):
+    """Assign the zone values for a batch of field geometries"""
+    geoms = shapely.from_wkb(wkbs)
+    # The intersection fails for invalid geometries
+    invalid = ~shapely.is_valid(geoms) & ~shapely.is_missing(geoms)
+    geoms[invalid] = shapely.make_valid(geoms[invalid])
+    values = {
+        field_name: assign_zones(geoms, tree, zone_geoms, zone_values, method)
+        for field_name, (tree, zone_geoms, zone_values) in _ZONE_TREES.items()
+    }
+    return fids, values
@@ -1,18 +1,23 @@
 import argparse
 import logging
 import os
+import sys
 # import pprint
 # import re
 
-from osgeo import ogr
+import numpy as np
 import pandas as pd
 
-# import openet.core.utils as utils
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crop_type_remap
+from field_store import read_fields, state_exists, write_fields
+from state_jobs import run_state_jobs
 
-ogr.UseExceptions()
+# import openet.core.utils as utils
 
 
-def main(states, years=[], overwrite_flag=False):
+def main(states, years=[], overwrite_flag=False, jobs=1):
     """Fill missing crop type values
 
     Parameters
@@ -20,12 +25,14 @@ def main(states, years=[], overwrite_flag=False):
     states : list
     years : list, optional
     overwrite_flag : bool, optional
+    jobs : int, optional
+        Number of states to process in parallel (the default is 1).
 
     """
     logging.info('\nFill missing crop type values')
 
     field_ws = os.getcwd()
-    shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
 
     remap_path = os.path.join(os.path.dirname(field_ws), 'cdl_annual_crop_remap_table.csv')
 
@@ -50,12 +57,14 @@ def main(states, years=[], overwrite_flag=False):
         )))
     logging.info(f'States: {", ".join(states)}')
 
-    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
+    if jobs > 1 and len(states) > 1:
+        return run_state_jobs(
+            main, states, jobs, store_ws, years=years, overwrite_flag=overwrite_flag,
+        )
 
     # Load the CDL annual crop remap
     # Values not in the remap table will stay the same
-    remap_df = pd.read_csv(remap_path, comment='#')
-    cdl_annual_remap = dict(zip(remap_df.IN, remap_df.OUT))
+    cdl_annual_remap = crop_type_remap.load_remap_table(remap_path, identity=False).table
     # pprint.pprint(cdl_annual_remap)
     # input('ENTER')
 
@@ -63,28 +72,21 @@ def main(states, years=[], overwrite_flag=False):
     for state in states:
         logging.info(f'\n{state}')
 
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.debug(f'  {shp_path}')
-        if not os.path.isfile(shp_path):
-            logging.info('  State shapefile does not exist - skipping')
+        if not state_exists(store_ws, state):
+            logging.info('  State fields do not exist - skipping')
             continue
+        fields_df = read_fields(store_ws, state)
 
         # Clear any crop type/sources that were copied from another field
         if overwrite_flag:
             logging.info(f'Clearing existing filled values')
-            output_ds = shp_driver.Open(shp_path, 1)
-            output_layer = output_ds.GetLayer()
-            for output_ftr in output_layer:
-                for src_year, tgt_year in cdl_annual_remap_years:
-                    crop_type = output_ftr.GetFieldAsInteger(f'CROP_{tgt_year}')
-                    if crop_type == 0:
-                        continue
-                    crop_src = output_ftr.GetField(f'CSRC_{tgt_year}')
-                    if crop_src.startswith(f'CROP_{src_year}'):
-                        output_ftr.SetField(f'CROP_{tgt_year}', 0)
-                        output_ftr.SetField(f'CSRC_{tgt_year}', '')
-                output_layer.SetFeature(output_ftr)
-            output_ds = None
+            for src_year, tgt_year in cdl_annual_remap_years:
+                mask = (
+                    (fields_df[f'CROP_{tgt_year}'] != 0) &
+                    fields_df[f'CSRC_{tgt_year}'].fillna('').str.startswith(f'CROP_{src_year}')
+                )
+                fields_df.loc[mask, f'CROP_{tgt_year}'] = 0
+                fields_df.loc[mask, f'CSRC_{tgt_year}'] = ''
 
 
         # Processing filling pre-2008 years in reverse order so that a year
@@ -96,56 +98,40 @@ def main(states, years=[], overwrite_flag=False):
         for src_year, tgt_year in cdl_annual_remap_years:
             logging.info(f'Copying CROP_{src_year} to CROP_{tgt_year}')
             logging.debug('  Remapping annual crops to code 47')
-            output_ds = shp_driver.Open(shp_path, 1)
-            output_layer = output_ds.GetLayer()
-            for output_ftr in output_layer:
-                # Get the crop type/source values for the source year
-                crop_type = output_ftr.GetFieldAsInteger(f'CROP_{src_year}')
-                crop_src = output_ftr.GetField(f'CSRC_{src_year}')
-                # print(f'\n{src_year} {tgt_year}')
-                # print(f'Input crop:      {crop_type}')
-                # print(f'Input source:    {crop_src}')
-                if crop_type == 0:
-                    # logging.debug('  source crop_type not set - skipping')
-                    continue
-
-                # Get the crop type/source values for the target year
-                tgt_crop_type = output_ftr.GetFieldAsInteger(f'CROP_{tgt_year}')
-                # tgt_crop_src = output_ftr.GetField(f'CSRC_{tgt_year}')
-                # print(f'Existing crop:   {tgt_crop_type}')
-                if tgt_crop_type > 0 and not overwrite_flag:
-                    # logging.debug('  target crop_type already set - skipping')
-                    continue
-
-                if crop_src.startswith('CROP_'):
-                    # If the "new" crop source was built as a copy of a field,
-                    #   pass that source to the target
-                    tgt_crop_src = crop_src
-                elif 'remapped annual crops' in crop_src:
-                    # If the "old" crop source was remapped (but not a field copy),
-                    #   add the remap note to the source
-                    tgt_crop_src = f'CROP_{src_year} - remapped annual crops'
-                else:
-                    tgt_crop_src = f'CROP_{src_year}'
-                # print(f'Output source:   {tgt_crop_src}')
-
-                # If the source was already remapped it doesn't need it again
-                # Convert the annual crops to the generic annual crop code
-                if ('remapped annual crops' not in tgt_crop_src and
-                      crop_type in cdl_annual_remap.keys()):
-                    tgt_crop_type = cdl_annual_remap[crop_type]
-                    tgt_crop_src += ' - remapped annual crops'
-                    # print(f'Remapped crop:   {tgt_crop_type}')
-                    # print(f'Remapped source: {tgt_crop_src}')
-                else:
-                    tgt_crop_type = crop_type
-                    # print(f'Output crop:     {tgt_crop_type}')
-
-
-                output_ftr.SetField(f'CROP_{tgt_year}', tgt_crop_type)
-                output_ftr.SetField(f'CSRC_{tgt_year}', tgt_crop_src)
-                output_layer.SetFeature(output_ftr)
-            output_ds = None
+            # Get the crop type/source values for the source year
+            crop_type = fields_df[f'CROP_{src_year}']
+            crop_src = fields_df[f'CSRC_{src_year}'].fillna('')
+
+            # Skip fields without a source crop type and (unless overwriting)
+            #   fields with a target crop type
+            mask = crop_type != 0
+            if not overwrite_flag:
+                mask &= fields_df[f'CROP_{tgt_year}'] <= 0
+
+            # If the "new" crop source was built as a copy of a field,
+            #   pass that source to the target
+            # If the "old" crop source was remapped (but not a field copy),
+            #   add the remap note to the source
+            tgt_crop_src = pd.Series(np.select(
+                [crop_src.str.startswith('CROP_'),
+                 crop_src.str.contains('remapped annual crops', regex=False)],
+                [crop_src, f'CROP_{src_year} - remapped annual crops'],
+                default=f'CROP_{src_year}',
+            ), index=fields_df.index)
+
+            # If the source was already remapped it doesn't need it again
+            # Convert the annual crops to the generic annual crop code
+            remap_mask = (
+                ~tgt_crop_src.str.contains('remapped annual crops', regex=False) &
+                crop_type.isin(cdl_annual_remap.keys())
+            )
+            tgt_crop_type = crop_type.where(~remap_mask, crop_type.map(cdl_annual_remap))
+            tgt_crop_src = tgt_crop_src.where(~remap_mask, tgt_crop_src + ' - remapped annual crops')
+
+            fields_df.loc[mask, f'CROP_{tgt_year}'] = tgt_crop_type[mask]
+            fields_df.loc[mask, f'CSRC_{tgt_year}'] = tgt_crop_src[mask]
+
+        write_fields(store_ws, state, fields_df)
 
 
         # # TODO: Add a flag to enable/disable annual crop remapping
@@ -228,6 +214,9 @@ def arg_parse():
     parser.add_argument(
         '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--jobs', default=1, type=int,
+        help='Number of states to process in parallel')
     parser.add_argument(
         '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -240,4 +229,5 @@ if __name__ == '__main__':
     args = arg_parse()
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
-    main(states=args.states, years=args.years, overwrite_flag=args.overwrite)
+    main(states=args.states, years=args.years, overwrite_flag=args.overwrite,
+         jobs=args.jobs)
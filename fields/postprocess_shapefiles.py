@@ -10,6 +10,8 @@ import zipfile
 import ee
 from google.cloud import storage
 
+from field_store import state_exists, store_to_shapefile
+
 logging.getLogger('earthengine-api').setLevel(logging.INFO)
 logging.getLogger('googleapiclient').setLevel(logging.INFO)
 logging.getLogger('requests').setLevel(logging.INFO)
@@ -31,7 +33,8 @@ def main(states, overwrite_flag=False):
     logging.info('\nZip the state field shapefiles')
 
     field_ws = os.getcwd()
-    shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
+    output_shapefile_ws = os.path.join(field_ws, 'updated_shapefiles')
     output_zip_ws = os.path.join(field_ws, 'updated_zips')
 
     bucket_name = 'openet_field_boundaries'
@@ -80,23 +83,30 @@ def main(states, overwrite_flag=False):
 
         # TODO: logging.info('Removing unused fields')
 
-        logging.info('Zipping state shapefiles')
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
+        shp_path = os.path.join(output_shapefile_ws, state, f'{state}.shp')
         zip_name = f'{state}.zip'
         zip_path = os.path.join(output_zip_ws, f'{state}.zip')
         logging.debug(f'  {shp_path}')
         logging.debug(f'  {zip_path}')
-        if not os.path.isfile(shp_path):
-            logging.info('  State shapefile does not exist - skipping')
+        if not state_exists(store_ws, state):
+            logging.info('  State fields do not exist - skipping')
             continue
         elif not overwrite_flag and os.path.isfile(zip_path):
             logging.info('  Zip exists and overwrite is False - skipping')
             continue
+
+        # The shapefiles are only built from the field store for the upload
+        logging.info('Writing state shapefile')
+        if not os.path.isdir(os.path.dirname(shp_path)):
+            os.makedirs(os.path.dirname(shp_path))
+        store_to_shapefile(store_ws, state, shp_path)
+
+        logging.info('Zipping state shapefiles')
         with zipfile.ZipFile(zip_path, 'w') as zip:
-            for file_name in os.listdir(os.path.join(shapefile_ws, state)):
+            for file_name in os.listdir(os.path.join(output_shapefile_ws, state)):
                 if file_name.startswith(state):
                     zip.write(
-                        os.path.join(shapefile_ws, state, file_name),
+                        os.path.join(output_shapefile_ws, state, file_name),
                         arcname=f'{state}/{file_name}'
                     )
 
@@ -11,10 +11,16 @@ import zipfile
 
 import ee
 from google.cloud import storage
+import numpy as np
 from osgeo import ogr, osr
+import shapely
 
 import openet.core.utils as utils
 
+from field_store import shapefile_to_store, state_exists, state_metadata, sync_shapefile
+from field_zones import field_zones
+from state_jobs import pause, run_state_jobs
+
 ogr.UseExceptions()
 
 logging.getLogger('earthengine-api').setLevel(logging.INFO)
@@ -26,7 +32,7 @@ PROJECT_NAME = 'openet'
 STORAGE_CLIENT = storage.Client(project=PROJECT_NAME)
 
 
-def main(states, years=[], overwrite_flag=False):
+def main(states, years=[], overwrite_flag=False, zones_flag=False, workers=4, jobs=1):
     """Download and preprocess the state field shapefiles
 
     Parameters
@@ -35,6 +41,14 @@ def main(states, years=[], overwrite_flag=False):
     years : list, optional
     overwrite_flag : bool, optional
         If True, overwrite existing files (the default is False).
+    zones_flag : bool, optional
+        If True, set the FIPS, HUC12, and MGRS_TILE values from a local
+        spatial join with the zone shapefiles (the default is False).
+    workers : int, optional
+        Number of processes for the zone spatial join (the default is 4).
+        The workers are split between the jobs if jobs is greater than 1.
+    jobs : int, optional
+        Number of states to process in parallel (the default is 1).
 
     """
     logging.info('\nUpdating field crop type values')
@@ -42,6 +56,7 @@ def main(states, years=[], overwrite_flag=False):
     field_ws = os.getcwd()
     input_zip_ws = os.path.join(field_ws, 'source_zips')
     shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
 
     bucket_name = 'openet_field_boundaries'
     bucket_folder = ''
@@ -68,6 +83,17 @@ def main(states, years=[], overwrite_flag=False):
         )))
     logging.info(f'States: {", ".join(states)}')
 
+    if jobs > 1 and len(states) > 1:
+        # Split the spatial join workers between the jobs so that the total
+        #   number of processes is not jobs x workers
+        job_workers = max(1, workers // jobs)
+        if zones_flag:
+            logging.info(f'Zone spatial join workers per state: {job_workers}')
+        return run_state_jobs(
+            main, states, jobs, shapefile_ws, years=years, overwrite_flag=overwrite_flag,
+            zones_flag=zones_flag, workers=job_workers,
+        )
+
     year_min = 1997
     year_max = 2023
     # year_min = 1997
@@ -111,6 +137,17 @@ def main(states, years=[], overwrite_flag=False):
                              '+datum=NAD83 +units=m +no_defs +type=crs')
 
 
+    # Zone polygons for the FIPS, HUC12, and MGRS_TILE fields
+    # Each field is assigned the zone with the largest overlap ("overlap")
+    #   or the zone containing a point on the field surface ("centroid")
+    ancillary_ws = os.path.join(field_ws, 'ancillary')
+    zone_sources = [
+        ['FIPS', os.path.join(ancillary_ws, 'tl_2018_us_county.shp'), 'GEOID'],
+        ['HUC12', os.path.join(ancillary_ws, 'WBDHU12.shp'), 'huc12'],
+        ['MGRS_TILE', os.path.join(ancillary_ws, 'mgrs_100km.shp'), 'MGRS'],
+    ]
+    zone_method = 'overlap'
+
     # CGM - I think Matt used a 2000m2 area threshold, so start smaller than that initially
     area_threshold = 1000
     # area_threshold = 2000
@@ -260,296 +297,78 @@ def main(states, years=[], overwrite_flag=False):
             if os.path.isfile(os.path.join(shapefile_ws, f'{state}.{ext}')):
                 os.remove(os.path.join(shapefile_ws, f'{state}.{ext}'))
 
-        if overwrite_flag:
-            logging.info('  Removing existing crop type/source fields')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            input_lyr_defn = input_layer.GetLayerDefn()
-            input_fields = [
-                [i, input_lyr_defn.GetFieldDefn(i).GetNameRef()]
-                for i in range(input_lyr_defn.GetFieldCount())
-            ]
-            # Delete the fields in reverse order
-            for field_i, field_name in input_fields[::-1]:
-                if re.match('(CROP|CSRC)_\d{4}', field_name):
-                    logging.debug(f'  {field_name}')
-                    input_layer.DeleteField(field_i)
-                elif re.match('CDL_\d{4}', field_name):
-                    logging.debug(f'  {field_name}')
-                    input_layer.DeleteField(field_i)
-                elif field_name in delete_fields:
-                    logging.debug(f'  {field_name}')
-                    input_layer.DeleteField(field_i)
-            input_ds = None
-
-            # Check the field list after removing existing fields
-            input_ds = shp_driver.Open(shp_path, 0)
-            input_layer = input_ds.GetLayer()
-            input_lyr_defn = input_layer.GetLayerDefn()
-            input_fields = [
-                input_lyr_defn.GetFieldDefn(i).GetNameRef()
-                for i in range(input_lyr_defn.GetFieldCount())
-            ]
-            input_ds = None
-
-            # Reorder the non-crop fields
-            # Put the fid and OPENET_ID at the front
-            if 'OPENET_ID' not in input_fields:
-                print('  ID field not present - skipping state')
-                continue
-            reordered_fields = []
-            reordered_fields.append('OPENET_ID')
-            if 'SOURCECODE' in input_fields:
-                reordered_fields.append('SOURCECODE')
-            if 'MOD_DATE' in input_fields:
-                reordered_fields.append('MOD_DATE')
-            if 'FIPS' in input_fields:
-                reordered_fields.append('FIPS')
-            if 'HUC12' in input_fields:
-                reordered_fields.append('HUC12')
-            if 'MGRS_TILE' in input_fields:
-                reordered_fields.append('MGRS_TILE')
-
-            if reordered_fields == input_fields:
-                print(f'  Fields are in order')
-            elif set(reordered_fields) != set(input_fields):
-                print(f'  Field lists are not consistent, skipping state')
-                print(input_fields)
-                print(reordered_fields)
-                input('ENTER')
-                continue
-            else:
-                print(f'  Reording fields')
-                input_ds = shp_driver.Open(shp_path, 1)
-                input_layer = input_ds.GetLayer()
-                input_lyr_defn = input_layer.GetLayerDefn()
-                input_fields = [
-                    input_lyr_defn.GetFieldDefn(i).GetNameRef()
-                    for i in range(input_lyr_defn.GetFieldCount())
-                ]
-                # field_index = list(range(len(input_fields)))
-                field_index = [input_fields.index(f) for f in reordered_fields]
-                input_layer.ReorderFields(field_index)
-                input_ds = None
-
-
-        # Get the updated field list
+        # Build the target schema from the current fields
         input_ds = shp_driver.Open(shp_path, 0)
         input_layer = input_ds.GetLayer()
         input_lyr_defn = input_layer.GetLayerDefn()
-        existing_fields = [
-            input_lyr_defn.GetFieldDefn(i).GetNameRef()
+        input_fields = [
+            {
+                'name': input_lyr_defn.GetFieldDefn(i).GetNameRef(),
+                'type': input_lyr_defn.GetFieldDefn(i).GetType(),
+                'width': input_lyr_defn.GetFieldDefn(i).GetWidth(),
+                'precision': input_lyr_defn.GetFieldDefn(i).GetPrecision(),
+            }
             for i in range(input_lyr_defn.GetFieldCount())
         ]
         input_ds = None
 
-        # Add ancillary fields if not present
-        for f_name, f_size, f_type in [
-                ['FIPS', 5, 'string'],
-                ['HUC12', 12, 'string'],
-                ['MGRS_TILE', 5, 'string'],
-                ['MOD_DATE', 10, 'string'],
-                ['SOURCECODE', 80, 'string'],
-                ['STATE', 2, 'string'],
-                ]:
-            if f_name not in existing_fields:
-                logging.info(f'  Adding {f_name} field')
-                input_ds = shp_driver.Open(shp_path, 1)
-                input_layer = input_ds.GetLayer()
-                # input_lyr_defn = input_layer.GetLayerDefn()
-                field_defn = ogr.FieldDefn(f_name, ogr.OFTString)
-                field_defn.SetWidth(f_size)
-                input_layer.CreateField(field_defn)
-                for input_ftr in input_layer:
-                    if f_name == 'MOD_DATE':
-                        input_ftr.SetField('MOD_DATE', datetime.today().strftime('%Y-%m-%d'))
-                    elif f_name == 'STATE':
-                        input_ftr.SetField('STATE', state.upper())
-                    # else:
-                    #     input_ftr.SetField(f_name, '')
-                    input_layer.SetFeature(input_ftr)
-                input_ds = None
-
-        # Add the area, length, and score fields if not present
-        for f_name, f_type in [
+        schema = migration_schema(
+            input_fields, state, crop_type_fields, crop_src_fields,
+            numeric_fields=[
                 [area_field, 'real'],
                 [length_field, 'real'],
                 [score_field, 'real'],
                 [count_field, 'integer'],
-                ]:
-            if f_name not in existing_fields:
-                logging.info(f'  Adding {f_name} field')
-                input_ds = shp_driver.Open(shp_path, 1)
-                input_layer = input_ds.GetLayer()
-                # input_lyr_defn = input_layer.GetLayerDefn()
-                if f_type == 'real':
-                    field_defn = ogr.FieldDefn(f_name, ogr.OFTReal)
-                    field_defn.SetWidth(24)
-                    field_defn.SetPrecision(2)
-                elif f_type == 'integer':
-                    field_defn = ogr.FieldDefn(f_name, ogr.OFTInteger)
-                else:
-                    raise ValueError(f'unsupported type: {f_type}')
-                input_layer.CreateField(field_defn)
-
-                for input_ftr in input_layer:
-                    # if f_name == count_field:
-                    #     input_ftr.SetField(f_name, 0)
-                    input_ftr.SetField(f_name, 0)
-                    input_layer.SetFeature(input_ftr)
-                input_ds = None
-
-
-        # Compute the area/length/score
-        if overwrite_flag:
-            logging.info(f'  Computing area, length, and PP score')
-            input_ds = shp_driver.Open(shp_path, 0)
-            input_layer = input_ds.GetLayer()
-            # input_osr = osr.SpatialReference()
-            input_osr = input_layer.GetSpatialRef()
-            # input_osr = str(input_osr.ExportToWkt())
-            transform = osr.CoordinateTransformation(input_osr, area_osr)
-            input_geometries = {}
-            input_areas = {}
-            input_lengths = {}
-            for input_ftr in input_layer:
-                # input_fid = input_ftr.GetFID()
-                input_id = input_ftr.GetField('OPENET_ID')
-                try:
-                    input_geom = input_ftr.GetGeometryRef().Clone()
-                except:
-                    print(f'  {input_id} - no geometry')
-                    continue
-                # input_geom.FlattenTo2D()
-                if not input_geom:
-                    print(f'  {input_id} - no geometry')
-                elif not input_geom.IsValid():
-                    print(f'  {input_id} - invalid geometry')
-                input_geometries[input_id] = input_geom
-            inupt_ds = None
-
-            # Compute the area
-            for input_id, input_geom in input_geometries.items():
-                input_geom.Transform(transform)
-                input_areas[input_id] = input_geom.GetArea()
-                input_lengths[input_id] = input_geom.Boundary().Length()
-
-                if input_areas[input_id] < area_threshold:
-                    print(f'  {input_id} - {input_areas[input_id]}')
-
-            # Write the area values back to the shapefile
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for input_ftr in input_layer:
-                # input_fid = input_ftr.GetFID()
-                input_id = input_ftr.GetField('OPENET_ID')
-                input_ftr.SetField(area_field, round(input_areas[input_id], 2))
-                input_ftr.SetField(length_field, round(input_lengths[input_id], 2))
-                # Score is computed as the polygon's area by 4pi dividing by the perimeter squared
-                input_ftr.SetField(score_field, input_areas[input_id] * math.pi * 4 / (input_lengths[input_id] ** 2))
-                input_layer.SetFeature(input_ftr)
-            input_ds = None
-
-
-        # Write the crop type and source fields
-        new_crop_type_fields = [f for f in crop_type_fields if f not in existing_fields]
-        new_crop_src_fields = [f for f in crop_src_fields if f not in existing_fields]
-        # if not new_crop_type_fields and not new_crop_src_fields:
-        #     logging.info('  No new fields to add - skipping')
-        #     continue
-
-        # Add new crop type fields and set value to 0
-        if new_crop_type_fields:
-            logging.info(f'  Adding crop type fields: {", ".join(new_crop_type_fields)}')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for crop_type_field in new_crop_type_fields:
-                field_defn = ogr.FieldDefn(crop_type_field, ogr.OFTInteger)
-                input_layer.CreateField(field_defn)
-                existing_fields.append(crop_type_field)
-            input_ds = None
-
-        # Add new crop source fields and set value to ''
-        if new_crop_src_fields:
-            logging.info(f'  Adding crop source fields: {", ".join(new_crop_src_fields)}')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for crop_src_field in new_crop_src_fields:
-                field_defn = ogr.FieldDefn(crop_src_field, ogr.OFTString)
-                field_defn.SetWidth(64)
-                input_layer.CreateField(field_defn)
-                existing_fields.append(crop_src_field)
-            input_ds = None
-
-        if new_crop_type_fields or new_crop_src_fields:
-            logging.info('  Setting new crop type/source default field values')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for input_ftr in input_layer:
-                for crop_type_field in new_crop_type_fields:
-                    input_ftr.SetField(crop_type_field, 0)
-                for crop_src_field in new_crop_src_fields:
-                    input_ftr.SetField(crop_src_field, '')
-                input_layer.SetFeature(input_ftr)
-            input_ds = None
-
-        # # Get the field list again to check if the fields are sorted
-        # input_ds = shp_driver.Open(shp_path, 0)
-        # input_layer = input_ds.GetLayer()
-        # input_lyr_defn = input_layer.GetLayerDefn()
-        # existing_fields = [
-        #     input_lyr_defn.GetFieldDefn(i).GetNameRef()
-        #     for i in range(input_lyr_defn.GetFieldCount())]
-        # input_ds = None
-
+            ],
+            delete_fields=delete_fields,
+            overwrite_flag=overwrite_flag,
+        )
+        if schema is None:
+            continue
 
-        # Check if the crop type/source fields are in order
-        crop_fields = [f for f in existing_fields if re.match('(CROP|CSRC)_\d{4}', f)]
-        if crop_fields != sorted(crop_fields):
-            logging.info('  Crop type/source fields are out of order')
-            # input('  Press ENTER to sort the crop fields')
-
-            # Put the crop type/source fields in order
-            # This will move non crop fields up to the front but keep
-            #   them in their respective order
-            logging.info('  Reordering the crop type/source fields')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            input_lyr_defn = input_layer.GetLayerDefn()
-            fields = [
-                input_lyr_defn.GetFieldDefn(i).GetNameRef()
-                for i in range(input_lyr_defn.GetFieldCount())
-            ]
-            crop_fields = sorted([
-                [field, i] for i, field in enumerate(fields)
-                if re.match('(CROP|CSRC)_\d{4}', field)
-            ])
-            crop_index = {field: i for field, i in crop_fields}
-            field_index = [
-                i for i, field in enumerate(fields)
-                if not re.match('(CROP|CSRC)_\d{4}', field)
-            ]
-            for field, i in crop_fields:
-                field_index.append(crop_index[field])
-            input_layer.ReorderFields(field_index)
-            input_ds = None
-
-
-        # Check for missing or duplicate OPENET_ID values
-        logging.info('  Checking for missing/duplicate OPENET_ID values')
-        input_ds = shp_driver.Open(shp_path, 0)
-        input_layer = input_ds.GetLayer()
-        openet_id_set = set()
-        for input_ftr in input_layer:
-            fid = input_ftr.GetFID()
-            openet_id = input_ftr.GetField('OPENET_ID')
-            if openet_id is None:
-                print(f'No ID value for FID {fid}')
-            elif openet_id in openet_id_set:
-                print(f'Duplicate ID {openet_id}')
-            else:
-                openet_id_set.add(openet_id)
-        input_ds = None
+        # Rewrite the shapefile if any fields are added, removed, or moved
+        #   or if the area/length/score or zone values are being computed
+        # Otherwise the features are only read for the ID check
+        rewrite_flag = (
+            overwrite_flag or zones_flag or
+            [f['name'] for f in schema] != [f['name'] for f in input_fields]
+        )
+        migrate_shapefile(
+            shp_path, schema,
+            area_fields=[area_field, length_field, score_field] if overwrite_flag else [],
+            area_osr=area_osr,
+            area_threshold=area_threshold,
+            zone_sources=zone_sources if zones_flag else [],
+            zone_method=zone_method,
+            workers=workers,
+            rewrite_flag=rewrite_flag,
+        )
+
+        # The field store is built from the shapefile on overwrite
+        # Otherwise the store crop type values are kept, the fields are
+        #   added/removed to match the shapefile, and the geometries, the new
+        #   crop type/source fields, and the other field values are copied
+        if overwrite_flag or not state_exists(store_ws, state):
+            logging.info('  Building the state field store')
+            shapefile_to_store(shp_path, store_ws, state)
+        else:
+            logging.info('  Updating the state field store')
+            store_columns = state_metadata(store_ws, state)[0].names
+            counts = sync_shapefile(
+                shp_path, store_ws, state,
+                columns=[
+                    f['name'] for f in schema
+                    if f['name'] != 'OPENET_ID' and (
+                        not re.match(r'(CROP|CSRC)_\d{4}', f['name']) or
+                        f['name'] not in store_columns
+                    )
+                ],
+                defaults={
+                    **{f: 0 for f in crop_type_fields}, **{f: '' for f in crop_src_fields}
+                },
+            )
+            logging.info(f'  Added: {counts["added"]}  Updated: {counts["updated"]}  '
+                         f'Removed: {counts["removed"]}')
 
 
         # # DEADBEEF
@@ -639,6 +458,376 @@ def main(states, years=[], overwrite_flag=False):
         #     output_ds = None
 
 
+def migration_schema(
+        input_fields,
+        state,
+        crop_type_fields,
+        crop_src_fields,
+        numeric_fields,
+        delete_fields=[],
+        overwrite_flag=False,
+        ):
+    """Build the target field list for a state shapefile
+
+    Parameters
+    ----------
+    input_fields : list
+        Field dictionaries ("name", "type", "width", "precision") in the
+        current shapefile field order.
+    state : str
+    crop_type_fields : list
+        Crop type field names (i.e. "CROP_2020") that must be present.
+    crop_src_fields : list
+        Crop source field names (i.e. "CSRC_2020") that must be present.
+    numeric_fields : list
+        [name, type] pairs of the area/length/score/count fields, where the
+        type is "real" or "integer".
+    delete_fields : list, optional
+        Field names to remove if overwrite_flag is True.
+    overwrite_flag : bool, optional
+        If True, remove the crop type/source fields and the delete fields,
+        and put the non-crop fields in the standard order
+        (the default is False).
+
+    Returns
+    -------
+    list, None : Target field dictionaries with the "source" field name
+        (None for new fields) and the "default" value of new fields, or None
+        if the state should be skipped
+
+    """
+    fields = [dict(f, source=f['name'], default=None) for f in input_fields]
+
+    if overwrite_flag:
+        logging.info('  Removing existing crop type/source fields')
+        fields = [
+            f for f in fields
+            if not re.match(r'(CROP|CSRC|CDL)_\d{4}', f['name'])
+            and f['name'] not in delete_fields
+        ]
+
+        # Put the OPENET_ID and the other non-crop fields at the front
+        field_names = [f['name'] for f in fields]
+        if 'OPENET_ID' not in field_names:
+            logging.info('  ID field not present - skipping state')
+            return None
+        reordered_fields = [
+            f for f in ['OPENET_ID', 'SOURCECODE', 'MOD_DATE', 'FIPS', 'HUC12', 'MGRS_TILE']
+            if f in field_names
+        ]
+        if set(reordered_fields) != set(field_names):
+            logging.info('  Field lists are not consistent, skipping state')
+            logging.info(f'  {field_names}')
+            logging.info(f'  {reordered_fields}')
+            pause()
+            return None
+        fields = [fields[field_names.index(f)] for f in reordered_fields]
+
+    # Add ancillary fields if not present
+    field_names = [f['name'] for f in fields]
+    for f_name, f_size, f_default in [
+            ['FIPS', 5, None],
+            ['HUC12', 12, None],
+            ['MGRS_TILE', 5, None],
+            ['MOD_DATE', 10, datetime.today().strftime('%Y-%m-%d')],
+            ['SOURCECODE', 80, None],
+            ['STATE', 2, state.upper()],
+            ]:
+        if f_name not in field_names:
+            logging.info(f'  Adding {f_name} field')
+            fields.append({
+                'name': f_name, 'type': ogr.OFTString, 'width': f_size, 'precision': 0,
+                'source': None, 'default': f_default,
+            })
+
+    # Add the area, length, score, and count fields if not present
+    for f_name, f_type in numeric_fields:
+        if f_name in field_names:
+            continue
+        logging.info(f'  Adding {f_name} field')
+        if f_type == 'real':
+            fields.append({
+                'name': f_name, 'type': ogr.OFTReal, 'width': 24, 'precision': 2,
+                'source': None, 'default': 0,
+            })
+        elif f_type == 'integer':
+            fields.append({
+                'name': f_name, 'type': ogr.OFTInteger, 'width': 0, 'precision': 0,
+                'source': None, 'default': 0,
+            })
+        else:
+            raise ValueError(f'unsupported type: {f_type}')
+
+    # Add new crop type fields (set to 0) and crop source fields (set to '')
+    new_crop_type_fields = [f for f in crop_type_fields if f not in field_names]
+    if new_crop_type_fields:
+        logging.info(f'  Adding crop type fields: {", ".join(new_crop_type_fields)}')
+    for f_name in new_crop_type_fields:
+        fields.append({
+            'name': f_name, 'type': ogr.OFTInteger, 'width': 0, 'precision': 0,
+            'source': None, 'default': 0,
+        })
+    new_crop_src_fields = [f for f in crop_src_fields if f not in field_names]
+    if new_crop_src_fields:
+        logging.info(f'  Adding crop source fields: {", ".join(new_crop_src_fields)}')
+    for f_name in new_crop_src_fields:
+        fields.append({
+            'name': f_name, 'type': ogr.OFTString, 'width': 64, 'precision': 0,
+            'source': None, 'default': '',
+        })
+
+    # Put the crop type/source fields in order
+    # This will move non crop fields up to the front but keep
+    #   them in their respective order
+    crop_fields = [f for f in fields if re.match(r'(CROP|CSRC)_\d{4}', f['name'])]
+    crop_names = [f['name'] for f in crop_fields]
+    if crop_names != sorted(crop_names):
+        logging.info('  Reordering the crop type/source fields')
+        fields = (
+            [f for f in fields if not re.match(r'(CROP|CSRC)_\d{4}', f['name'])] +
+            sorted(crop_fields, key=lambda f: f['name'])
+        )
+
+    return fields
+
+
+def migrate_shapefile(
+        shp_path,
+        schema,
+        area_fields=[],
+        area_osr=None,
+        area_threshold=0,
+        zone_sources=[],
+        zone_method='overlap',
+        workers=4,
+        rewrite_flag=True,
+        ):
+    """Rewrite a shapefile with the target schema in a single pass
+
+    Every feature is written once to a temporary shapefile with the fields
+    in the target order, the default values of the new fields, and the
+    area/length/score values (computed beforehand from a geometry only read
+    of the layer by field_measures()).  The temporary shapefile is written to
+    a folder next to the state folder, and the folders are swapped only after
+    all of the features have been written, so the shapefile files are never
+    a mix of the old and new files.  The
+    OPENET_ID values are checked for missing/duplicate values in the same
+    pass.
+
+    Parameters
+    ----------
+    shp_path : str
+    schema : list
+        Target field dictionaries from migration_schema().
+    area_fields : list, optional
+        Area, length, and PP score field names.  If not set, the values are
+        not computed (the default is []).
+    area_osr : osr.SpatialReference, optional
+        Equal area projection for computing the area and length.
+    area_threshold : float, optional
+        Fields smaller than this area (in square meters) are logged
+        (the default is 0).
+    zone_sources : list, optional
+        [output field, zone shapefile path, zone value field] for each zone
+        field to set from field_zones().  If not set, the zone values are
+        not changed (the default is []).
+    zone_method : {'overlap', 'centroid'}, optional
+        Zone assignment method (the default is 'overlap').
+    workers : int, optional
+        Number of processes for the zone spatial join (the default is 4).
+    rewrite_flag : bool, optional
+        If False, the features are only read for the ID check
+        (the default is True).
+
+    Returns
+    -------
+    None
+
+    """
+    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
+    input_ds = shp_driver.Open(shp_path, 0)
+    input_layer = input_ds.GetLayer()
+    input_lyr_defn = input_layer.GetLayerDefn()
+    input_names = [
+        input_lyr_defn.GetFieldDefn(i).GetNameRef()
+        for i in range(input_lyr_defn.GetFieldCount())
+    ]
+
+    if rewrite_flag:
+        logging.info('  Writing the migrated shapefile')
+        state_ws = os.path.dirname(shp_path)
+        temp_ws = f'{state_ws}_temp'
+        temp_path = os.path.join(temp_ws, os.path.basename(shp_path))
+        if os.path.isdir(temp_ws):
+            shutil.rmtree(temp_ws)
+        os.makedirs(temp_ws)
+        output_ds = shp_driver.CreateDataSource(temp_path)
+        output_layer = output_ds.CreateLayer(
+            os.path.splitext(os.path.basename(temp_path))[0],
+            srs=input_layer.GetSpatialRef(),
+            geom_type=input_layer.GetGeomType(),
+        )
+        for field in schema:
+            field_defn = ogr.FieldDefn(field['name'], field['type'])
+            field_defn.SetWidth(field['width'])
+            field_defn.SetPrecision(field['precision'])
+            output_layer.CreateField(field_defn)
+        output_lyr_defn = output_layer.GetLayerDefn()
+
+        # Index of the output field for each input field (-1 if removed)
+        source_names = [field['source'] for field in schema]
+        field_map = [
+            source_names.index(name) if name in source_names else -1
+            for name in input_names
+        ]
+        defaults = [
+            [i, field['default']] for i, field in enumerate(schema)
+            if field['source'] is None and field['default'] is not None
+        ]
+
+    if area_fields:
+        logging.info(f'  Computing area, length, and PP score')
+        measures = field_measures(shp_path, area_osr)
+
+    zones = {}
+    if zone_sources:
+        logging.info(f'  Joining {", ".join(f[0] for f in zone_sources)} zones')
+        zones = field_zones(shp_path, zone_sources, method=zone_method, workers=workers)
+
+    logging.info('  Checking for missing/duplicate OPENET_ID values')
+    openet_id_set = set()
+    for input_ftr in input_layer:
+        openet_id = input_ftr.GetField('OPENET_ID')
+        if openet_id is None:
+            logging.info(f'  No ID value for FID {input_ftr.GetFID()}')
+        elif openet_id in openet_id_set:
+            logging.info(f'  Duplicate ID {openet_id}')
+        else:
+            openet_id_set.add(openet_id)
+
+        if not rewrite_flag:
+            continue
+
+        output_ftr = ogr.Feature(output_lyr_defn)
+        output_ftr.SetFromWithMap(input_ftr, 1, field_map)
+        for field_i, default in defaults:
+            output_ftr.SetField(field_i, default)
+
+        fid = input_ftr.GetFID()
+        if area_fields and np.isnan(measures['area'][fid]):
+            logging.info(f'  {openet_id} - no geometry')
+        elif area_fields:
+            if not measures['valid'][fid]:
+                logging.info(f'  {openet_id} - invalid geometry')
+            if measures['area'][fid] < area_threshold:
+                logging.info(f'  {openet_id} - {measures["area"][fid]}')
+            output_ftr.SetField(area_fields[0], round(float(measures['area'][fid]), 2))
+            output_ftr.SetField(area_fields[1], round(float(measures['length'][fid]), 2))
+            output_ftr.SetField(area_fields[2], float(measures['score'][fid]))
+        # Fields that don't intersect a zone keep their current value
+        for field_name, field_values in zones.items():
+            if field_values[fid]:
+                output_ftr.SetField(field_name, field_values[fid])
+        output_layer.CreateFeature(output_ftr)
+    input_ds = None
+
+    if rewrite_flag:
+        output_ds = None
+        if os.path.isfile(temp_path.replace('.shp', '.cpg')):
+            os.remove(temp_path.replace('.shp', '.cpg'))
+
+        # Keep any other files in the state folder
+        shp_names = [
+            os.path.basename(shp_path).replace('.shp', f'.{ext}')
+            for ext in ['shp', 'shx', 'dbf', 'prj', 'cpg']
+        ]
+        for item_name in os.listdir(state_ws):
+            item_path = os.path.join(state_ws, item_name)
+            if item_name in shp_names:
+                continue
+            elif os.path.isdir(item_path):
+                shutil.copytree(item_path, os.path.join(temp_ws, item_name))
+            else:
+                shutil.copy2(item_path, temp_ws)
+
+        # Swap the state folder only after the temporary shapefile is complete
+        # The old folder is restored if the new folder can't be moved
+        old_ws = f'{state_ws}_old'
+        if os.path.isdir(old_ws):
+            shutil.rmtree(old_ws)
+        os.rename(state_ws, old_ws)
+        try:
+            os.rename(temp_ws, state_ws)
+        except Exception:
+            os.rename(old_ws, state_ws)
+            raise
+        shutil.rmtree(old_ws)
+
+
+def field_measures(shp_path, area_osr, batch_size=100000):
+    """Compute the area, perimeter, and PP score of each shapefile feature
+
+    The geometries are read in batches as WKB arrays (GDAL Arrow stream) and
+    are reprojected and measured with the vectorized shapely functions, so
+    only one batch of geometries is in memory at a time.
+
+    Parameters
+    ----------
+    shp_path : str
+    area_osr : osr.SpatialReference
+        Equal area projection for computing the area and length.
+    batch_size : int, optional
+        Number of features to read at a time (the default is 100000).
+
+    Returns
+    -------
+    dict : "area", "length", "score", and "valid" arrays indexed by FID
+        (the area, length, and score are NaN for features without a geometry)
+
+    """
+    input_ds = ogr.GetDriverByName('ESRI Shapefile').Open(shp_path, 0)
+    input_layer = input_ds.GetLayer()
+    input_lyr_defn = input_layer.GetLayerDefn()
+    transform = osr.CoordinateTransformation(input_layer.GetSpatialRef(), area_osr)
+
+    def transform_coords(coords):
+        if not len(coords):
+            return coords
+        return np.array(transform.TransformPoints(coords))[:, :2]
+
+    # Only the FID and geometry columns are read
+    input_layer.SetIgnoredFields([
+        input_lyr_defn.GetFieldDefn(i).GetNameRef()
+        for i in range(input_lyr_defn.GetFieldCount())
+    ])
+    geom_column = input_layer.GetGeometryColumn() or 'wkb_geometry'
+
+    # Shapefile FIDs are sequential starting at 0
+    feature_count = input_layer.GetFeatureCount()
+    areas = np.full(feature_count, np.nan)
+    lengths = np.full(feature_count, np.nan)
+    valid = np.ones(feature_count, dtype=bool)
+    stream = input_layer.GetArrowStreamAsNumPy(
+        options=['INCLUDE_FID=YES', f'MAX_FEATURES_IN_BATCH={batch_size}']
+    )
+    for batch in stream:
+        fids = batch['OGC_FID']
+        geoms = shapely.from_wkb(batch[geom_column])
+        valid[fids] = shapely.is_valid(geoms) | shapely.is_missing(geoms)
+        geoms = shapely.transform(geoms, transform_coords)
+        areas[fids] = shapely.area(geoms)
+        # The polygon length is the perimeter of all of the rings
+        lengths[fids] = shapely.length(geoms)
+    input_ds = None
+
+    # Score is computed as the polygon's area by 4pi dividing by the perimeter squared
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(lengths > 0, areas * math.pi * 4 / lengths ** 2, 0)
+    scores[np.isnan(areas)] = np.nan
+
+    return {'area': areas, 'length': lengths, 'score': scores, 'valid': valid}
+
+
 def arg_parse():
     """"""
     parser = argparse.ArgumentParser(
@@ -653,6 +842,16 @@ def arg_parse():
     parser.add_argument(
         '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--zones', default=False, action='store_true',
+        help='Set the FIPS, HUC12, and MGRS_TILE values from the zone shapefiles')
+    parser.add_argument(
+        '--workers', default=4, type=int,
+        help='Number of processes for the zone spatial join '
+             '(split between the states if --jobs is set)')
+    parser.add_argument(
+        '--jobs', default=1, type=int,
+        help='Number of states to process in parallel')
     parser.add_argument(
         '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -665,4 +864,7 @@ if __name__ == '__main__':
     args = arg_parse()
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
-    main(states=args.states, years=args.years, overwrite_flag=args.overwrite)
+    main(
+        states=args.states, years=args.years, overwrite_flag=args.overwrite,
+        zones_flag=args.zones, workers=args.workers, jobs=args.jobs,
+    )
@@ -1,12 +1,15 @@
 import argparse
 import logging
 import os
+import sys
 # import pprint
 
-from osgeo import ogr
-import pandas as pd
+import numpy as np
 
-ogr.UseExceptions()
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crop_type_remap
+from field_store import read_fields, write_fields
 
 
 def main(states=[]):
@@ -20,7 +23,7 @@ def main(states=[]):
     logging.info('\nReplace bad crop type values')
 
     field_ws = os.getcwd()
-    shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
 
     remap_path = os.path.join(os.path.dirname(field_ws), 'cdl_annual_crop_remap_table.csv')
 
@@ -32,12 +35,9 @@ def main(states=[]):
         )))
     logging.info(f'States: {", ".join(states)}')
 
-    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-
     # Load the CDL annual crop remap
     # Values not in the remap table will stay the same
-    remap_df = pd.read_csv(remap_path, comment='#')
-    cdl_annual_remap = dict(zip(remap_df.IN, remap_df.OUT))
+    cdl_annual_remap = crop_type_remap.load_remap_table(remap_path, identity=False).table
     # pprint.pprint(cdl_annual_remap)
     # input('ENTER')
 
@@ -45,97 +45,69 @@ def main(states=[]):
     if 'NM' in states:
         logging.info('\nReplace all 2008-2010 values in New Mexico HUC14 fields with the 2011 value')
         state = 'NM'
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.info(f'  {shp_path}')
-        # if not os.path.isfile(shp_path):
-        #     logging.info('  State shapefile does not exist - skipping')
-        # with shp_driver.Open(shp_path, 1) as :
-        output_ds = shp_driver.Open(shp_path, 1)
-        output_layer = output_ds.GetLayer()
-        # TODO: Test out filtering the layer instead of checking each feature HUC in the loop
-        # output_layer.SetAttributeFilter("HUC12 LIKE '14%'")
-        for output_ftr in output_layer:
-            huc = str(output_ftr.GetField(f'HUC12'))
-            if not huc.startswith('14'):
-                continue
-            src_year = 2011
-            crop_type = output_ftr.GetFieldAsInteger(f'CROP_{src_year}')
-            # crop_src = output_ftr.GetField(f'CSRC_{src_year}')
-            if crop_type == 0:
-                continue
-
-            # The fill tool should set the values back to 1997,
-            #   but applying here also in case this is run after the fill
-            for tgt_year in range(2008, 2011):
-                # TODO: Should these be set to remapped annual crop values?
-                if crop_type in cdl_annual_remap.keys():
-                    output_ftr.SetField(f'CROP_{tgt_year}', cdl_annual_remap[crop_type])
-                    output_ftr.SetField(f'CSRC_{tgt_year}', f'CROP_{src_year} - remapped annual crops')
-                else:
-                    output_ftr.SetField(f'CROP_{tgt_year}', crop_type)
-                    output_ftr.SetField(f'CSRC_{tgt_year}', f'CROP_{src_year}')
-            output_layer.SetFeature(output_ftr)
-        output_ds = None
+        fields_df = read_fields(store_ws, state)
+        src_year = 2011
+        crop_type = fields_df[f'CROP_{src_year}']
+        mask = fields_df['HUC12'].astype(str).str.startswith('14') & (crop_type != 0)
+
+        # The fill tool should set the values back to 1997,
+        #   but applying here also in case this is run after the fill
+        # TODO: Should these be set to remapped annual crop values?
+        remap_mask = crop_type.isin(cdl_annual_remap.keys())
+        for tgt_year in range(2008, 2011):
+            fields_df.loc[mask, f'CROP_{tgt_year}'] = (
+                crop_type.where(~remap_mask, crop_type.map(cdl_annual_remap))[mask]
+            )
+            fields_df.loc[mask, f'CSRC_{tgt_year}'] = np.where(
+                remap_mask[mask], f'CROP_{src_year} - remapped annual crops', f'CROP_{src_year}'
+            )
+        write_fields(store_ws, state, fields_df)
 
 
     if 'CO' in states:
         logging.info('\nReplace all 2009 values in Colorado San Luis Valley HUCs '
                      '(130100 and 130201) with the 2008 value')
         state = 'CO'
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.info(f'  {shp_path}')
-        output_ds = shp_driver.Open(shp_path, 1)
-        output_layer = output_ds.GetLayer()
-        # TODO: Test out filtering the layer instead of checking each feature HUC in the loop
-        # output_layer.SetAttributeFilter("HUC12 LIKE '1301%'")
-        for output_ftr in output_layer:
-            huc = str(output_ftr.GetField(f'HUC12'))
-            if not huc.startswith('130100') and not huc.startswith('130201'):
-                continue
-            tgt_year = 2009
-            crop_type_before = output_ftr.GetFieldAsInteger(f'CROP_{tgt_year-1}')
-            crop_type_after = output_ftr.GetFieldAsInteger(f'CROP_{tgt_year+1}')
-
-            # The main goal for this is to avoid remapping if the before and after crops match
-            # Default to using the crop type after the target year for all other cases
-            if (crop_type_after > 0) and (crop_type_before == crop_type_after):
-                # If the crop types before and after match, use that value directly
-                #   instead of remapping to generic annual crop
-                crop_type = crop_type_after
-                crop_src = f'CROP_{tgt_year + 1}'
-            elif crop_type_after in cdl_annual_remap.keys():
-                # If the crop type after is a remapped annual, set the target year
-                #   as a remapped annual and the source as the year after
-                crop_type = cdl_annual_remap[crop_type_after]
-                crop_src = f'CROP_{tgt_year + 1} - remapped annual crops'
-            elif crop_type_after > 0:
-                # Fallback on using the crop type after for all other fields
-                crop_type = crop_type_after
-                crop_src = f'CROP_{tgt_year + 1}'
-            else:
-                # This condition should only happen for very small polygons that should probably be removed
-                logging.info(f'  {output_ftr.GetField(f"OPENET_ID")} - no crop type')
-                continue
-
-            output_ftr.SetField(f'CROP_{tgt_year}', crop_type)
-            output_ftr.SetField(f'CSRC_{tgt_year}', crop_src)
-            output_layer.SetFeature(output_ftr)
-        output_ds = None
+        fields_df = read_fields(store_ws, state)
+        huc = fields_df['HUC12'].astype(str)
+        mask = huc.str.startswith('130100') | huc.str.startswith('130201')
+        tgt_year = 2009
+        crop_type_before = fields_df[f'CROP_{tgt_year-1}']
+        crop_type_after = fields_df[f'CROP_{tgt_year+1}']
+
+        # The main goal for this is to avoid remapping if the before and after crops match
+        # Default to using the crop type after the target year for all other cases
+        # If the crop types before and after match, use that value directly
+        #   instead of remapping to generic annual crop
+        # If the crop type after is a remapped annual, set the target year
+        #   as a remapped annual and the source as the year after
+        # Fallback on using the crop type after for all other fields
+        match_mask = (crop_type_after > 0) & (crop_type_before == crop_type_after)
+        remap_mask = ~match_mask & crop_type_after.isin(cdl_annual_remap.keys())
+        crop_type = crop_type_after.where(~remap_mask, crop_type_after.map(cdl_annual_remap))
+        crop_src = np.where(
+            remap_mask, f'CROP_{tgt_year + 1} - remapped annual crops', f'CROP_{tgt_year + 1}'
+        )
+
+        # This condition should only happen for very small polygons that should probably be removed
+        missing_mask = mask & ~remap_mask & (crop_type_after <= 0)
+        for openet_id in fields_df.loc[missing_mask, 'OPENET_ID']:
+            logging.info(f'  {openet_id} - no crop type')
+        mask &= ~missing_mask
+
+        fields_df.loc[mask, f'CROP_{tgt_year}'] = crop_type[mask]
+        fields_df.loc[mask, f'CSRC_{tgt_year}'] = crop_src[mask]
+        write_fields(store_ws, state, fields_df)
 
 
     if 'MX' in states:
         logging.info('\nSet all Mexico field values to 47')
         state = 'MX'
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.info(f'  {shp_path}')
-        output_ds = shp_driver.Open(shp_path, 1)
-        output_layer = output_ds.GetLayer()
-        for output_ftr in output_layer:
-            for tgt_year in range(1997, 2024):
-                output_ftr.SetField(f'CROP_{tgt_year}', 47)
-                output_ftr.SetField(f'CSRC_{tgt_year}', 'DEFAULT')
-            output_layer.SetFeature(output_ftr)
-        output_ds = None
+        fields_df = read_fields(store_ws, state)
+        for tgt_year in range(1997, 2024):
+            fields_df[f'CROP_{tgt_year}'] = 47
+            fields_df[f'CSRC_{tgt_year}'] = 'DEFAULT'
+        write_fields(store_ws, state, fields_df)
 
 
 def arg_parse():
@@ -0,0 +1,98 @@
+#--------------------------------
+# Name:         state_jobs.py
+# Purpose:      Run the field tools for multiple states in a process pool
+#--------------------------------
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import multiprocessing
+import os
+
+
+def run_state_jobs(main_fn, states, jobs, state_ws, **kwargs):
+    """Run a field tool main function for each state in a process pool
+
+    The states are independent, so each state is processed by a separate
+    call of the main function with a single state.  The states are started
+    from the largest state folder to the smallest so that the largest
+    states aren't the last to start.  The log messages from each state are
+    prefixed with the state abbreviation.
+
+    Parameters
+    ----------
+    main_fn : function
+        Tool main function with a "states" parameter.
+    states : list
+    jobs : int
+        Number of states to process at a time.
+    state_ws : str
+        Folder of the state folders (the shapefiles or the field store).
+    kwargs : dict
+        Additional main function parameters.
+
+    Returns
+    -------
+    dict : main function return value keyed by state (None if it failed)
+
+    """
+    states = sorted(
+        states, key=lambda state: state_size(state_ws, state), reverse=True
+    )
+    logging.info(f'\nProcessing {len(states)} states ({jobs} at a time)')
+    loglevel = logging.getLogger().getEffectiveLevel()
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(_run_state, main_fn, state, loglevel, kwargs): state
+            for state in states
+        }
+        for future in as_completed(futures):
+            state = futures[future]
+            try:
+                results[state] = future.result()
+            except Exception as e:
+                logging.exception(f'{state} - {e}')
+                results[state] = None
+                continue
+            logging.info(f'{state} - done')
+
+    return results
+
+
+def pause(message='ENTER'):
+    """Wait for the user to continue after a data problem
+
+    In a state job worker process stdin is not available (input() would
+    raise an EOFError and drop the state), so the problem is logged as a
+    warning and the tool continues.
+
+    Parameters
+    ----------
+    message : str, optional
+        Prompt message (the default is "ENTER").
+
+    Returns
+    -------
+    None
+
+    """
+    if multiprocessing.parent_process() is not None:
+        logging.warning('  Data problem (see the messages above), continuing')
+        return
+    input(message)
+
+
+def state_size(state_ws, state):
+    """Size of the files in a state folder in bytes"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, dirs, names in os.walk(os.path.join(state_ws, state))
+        for name in names
+    )
+
+
+def _run_state(main_fn, state, loglevel, kwargs):
+    """Run the main function for a single state in a worker process"""
+    logging.basicConfig(level=loglevel, format=f'{state}: %(message)s', force=True)
+    return main_fn(states=[state], **kwargs)
@@ -11,6 +11,9 @@ import pandas as pd
 
 import openet.core.utils as utils
 
+from field_store import read_fields, state_exists, write_fields
+from state_jobs import pause, run_state_jobs
+
 ogr.UseExceptions()
 
 # logging.getLogger('googleapiclient').setLevel(logging.INFO)
@@ -18,7 +21,7 @@ ogr.UseExceptions()
 # logging.getLogger('urllib3').setLevel(logging.INFO)
 
 
-def main(states, years=[], overwrite_flag=False):
+def main(states, years=[], overwrite_flag=False, jobs=1):
     """Update field crop type values by state
 
     Parameters
@@ -27,6 +30,8 @@ def main(states, years=[], overwrite_flag=False):
     years : list, optional
     overwrite_flag : bool, optional
         If True, overwrite existing crop type values with the new values.
+    jobs : int, optional
+        Number of states to process in parallel (the default is 1).
 
     Returns
     -------
@@ -47,7 +52,7 @@ def main(states, years=[], overwrite_flag=False):
     shell_flag = True
 
     field_ws = os.getcwd()
-    shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
     stats_ws = os.path.join(field_ws, output_format.lower())
     if not os.path.isdir(stats_ws):
         os.makedirs(stats_ws)
@@ -66,6 +71,11 @@ def main(states, years=[], overwrite_flag=False):
         )))
     logging.info(f'States: {", ".join(states)}')
 
+    if jobs > 1 and len(states) > 1:
+        return run_state_jobs(
+            main, states, jobs, store_ws, years=years, overwrite_flag=overwrite_flag,
+        )
+
     # This CDL start year is for the full CONUS images, but CDL does exist for
     #   some states back to 1997 (see cdl_year_states dictionary below)
     cdl_year_min = 2008
@@ -128,25 +138,19 @@ def main(states, years=[], overwrite_flag=False):
             continue
 
         logging.info(f'\nState: {state}')
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.debug(f'  {shp_path}')
-
-        if not os.path.isfile(shp_path):
-            logging.info('  State shapefile does not exist - skipping')
+        if not state_exists(store_ws, state):
+            logging.info('  State fields do not exist - skipping')
             continue
 
+        # The year values are all updated in the table and written once
+        fields_df = read_fields(store_ws, state)
+
         # if clear_existing_values:
         if overwrite_flag:
             logging.info('\nClearing all crop type and source values')
-            shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for input_ftr in input_layer:
-                for year in years:
-                    input_ftr.SetField(f'CROP_{year}', 0)
-                    input_ftr.SetField(f'CSRC_{year}', '')
-                input_layer.SetFeature(input_ftr)
-            input_ds = None
+            for year in years:
+                fields_df[f'CROP_{year}'] = 0
+                fields_df[f'CSRC_{year}'] = ''
 
         # output_path = shp_path.replace('.shp', '_update.shp')
         # if os.path.exists(output_path):
@@ -169,7 +173,7 @@ def main(states, years=[], overwrite_flag=False):
         # logging.debug(f'Fields: {", ".join(crop_src_fields)}')
 
 
-        logging.info(f'Reading stats {output_format} and updating shapefile (by year)')
+        logging.info(f'Reading stats {output_format} and updating fields (by year)')
         # update_features = {}
         for year in cdl_state_years[state]:
             logging.info(f'{year}')
@@ -223,42 +227,35 @@ def main(states, years=[], overwrite_flag=False):
                 if ftr[f'CROP_{year}'] is None:
                     logging.debug(f'  {ftr["OPENET_ID"]} - crop types is None')
                     # pprint.pprint(ftr)
-                    input('ENTER')
+                    pause()
                 elif ftr[f'CROP_{year}'] == 0:
                     logging.debug(f'  {ftr["OPENET_ID"]} - missing crop types')
                     # pprint.pprint(ftr)
                     # input('ENTER')
 
-            # TODO: Test if writing all years at once is any faster
-            logging.debug('  Writing field crop type values')
-            write_features(shp_path, update_features, year, overwrite_flag)
+            logging.debug('  Updating field crop type values')
+            write_features(fields_df, update_features, year, overwrite_flag)
+
+        logging.info('Writing field crop type values')
+        write_fields(store_ws, state, fields_df)
 
 
     if 'CA' in states:
         logging.info(f'\nProcessing LandIQ/CDL crop_type for California')
         state = 'CA'
 
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.debug(f'  {shp_path}')
-
-        if not os.path.isfile(shp_path):
-            logging.info('  State shapefile does not exist - skipping')
-        #     continue
+    if 'CA' in states and not state_exists(store_ws, 'CA'):
+        logging.info('  State fields do not exist - skipping')
+    elif 'CA' in states:
+        # The year values are all updated in the table and written once
+        fields_df = read_fields(store_ws, state)
 
         # if clear_existing_values:
         if overwrite_flag:
             logging.info('\nClearing all crop type and source values')
-            # print(years)
-            # input('Press ENTER to continue')
-            shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for input_ftr in input_layer:
-                for year in years:
-                    input_ftr.SetField(f'CROP_{year}', 0)
-                    input_ftr.SetField(f'CSRC_{year}', '')
-                input_layer.SetFeature(input_ftr)
-            input_ds = None
+            for year in years:
+                fields_df[f'CROP_{year}'] = 0
+                fields_df[f'CSRC_{year}'] = ''
 
         # # Only download stats files on overwrite or if not present
         # # if overwrite_flag:
@@ -330,9 +327,8 @@ def main(states, years=[], overwrite_flag=False):
             #         # pprint.pprint(ftr)
             #         # input('ENTER')
 
-            # TODO: Test if writing all years at once is any faster
-            logging.debug('  Writing field crop type values')
-            write_features(shp_path, update_features, year, overwrite_flag)
+            logging.debug('  Updating field crop type values')
+            write_features(fields_df, update_features, year, overwrite_flag)
 
 
         # Then update any missing values with the LandIQ/CDL composite values
@@ -384,15 +380,17 @@ def main(states, years=[], overwrite_flag=False):
                 if ftr[f'CROP_{year}'] is None:
                     logging.debug(f'  {ftr["OPENET_ID"]} - crop types is None')
                     # pprint.pprint(ftr)
-                    input('ENTER')
+                    pause()
                 elif ftr[f'CROP_{year}'] == 0:
                     logging.debug(f'  {ftr["OPENET_ID"]} - missing crop types')
                     # pprint.pprint(ftr)
                     # input('ENTER')
 
-            # TODO: Test if writing all years at once is any faster
-            logging.debug('  Writing field crop type values')
-            write_features(shp_path, update_features, year, overwrite=False)
+            logging.debug('  Updating field crop type values')
+            write_features(fields_df, update_features, year, overwrite=False)
+
+        logging.info('Writing field crop type values')
+        write_fields(store_ws, state, fields_df)
 
 
     # DEADBEEF - This isn't currently being used
@@ -424,39 +422,29 @@ def main(states, years=[], overwrite_flag=False):
     # logging.info(f'  Fields: {len(state_features)}')
 
 
-def write_features(shp_path, features, year, overwrite=False):
-    """Update crop type/source for a single year"""
-    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-    output_ds = shp_driver.Open(shp_path, 1)
-    output_layer = output_ds.GetLayer()
+def write_features(fields_df, features, year, overwrite=False):
+    """Update crop type/source for a single year (in place)"""
     crop_type_field = f'CROP_{year}'
     crop_src_field = f'CSRC_{year}'
-    for output_ftr in output_layer:
-        output_id = output_ftr.GetField('OPENET_ID')
-        crop_type = output_ftr.GetField(crop_type_field)
-        # crop_src = output_ftr.GetField(crop_src_field)
-
-        try:
-            values = features[output_id]
-        except KeyError:
-            continue
-        try:
-            new_crop_type = int(values[crop_type_field])
-        except:
-            new_crop_type = 0
-        try:
-            new_crop_src = values[crop_src_field]
-        except:
-            new_crop_src = ''
-
-        if new_crop_type == 0:
-            continue
-        elif crop_type > 0 and not overwrite:
-            continue
-        output_ftr.SetField(crop_type_field, new_crop_type)
-        output_ftr.SetField(crop_src_field, new_crop_src)
-        output_layer.SetFeature(output_ftr)
-    output_ds = None
+    if not features:
+        return
+    update_df = pd.DataFrame.from_dict(features, orient='index')
+
+    new_crop_type = (
+        pd.to_numeric(fields_df['OPENET_ID'].map(update_df[crop_type_field]), errors='coerce')
+        .fillna(0).astype(int)
+    )
+    if crop_src_field in update_df.columns:
+        new_crop_src = fields_df['OPENET_ID'].map(update_df[crop_src_field]).fillna('')
+    else:
+        new_crop_src = pd.Series('', index=fields_df.index)
+
+    # Only set the missing crop types unless overwriting
+    mask = new_crop_type != 0
+    if not overwrite:
+        mask &= fields_df[crop_type_field] <= 0
+    fields_df.loc[mask, crop_type_field] = new_crop_type[mask]
+    fields_df.loc[mask, crop_src_field] = new_crop_src[mask]
 
 
 def arg_parse():
@@ -473,6 +461,9 @@ def arg_parse():
     parser.add_argument(
         '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--jobs', default=1, type=int,
+        help='Number of states to process in parallel')
     parser.add_argument(
         '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -485,4 +476,5 @@ if __name__ == '__main__':
     args = arg_parse()
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
-    main(states=args.states, years=args.years, overwrite_flag=args.overwrite)
+    main(states=args.states, years=args.years, overwrite_flag=args.overwrite,
+         jobs=args.jobs)
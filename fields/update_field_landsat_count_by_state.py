@@ -12,6 +12,9 @@ import pandas as pd
 
 import openet.core.utils as utils
 
+from field_store import read_fields, state_exists, write_fields
+from state_jobs import pause, run_state_jobs
+
 ogr.UseExceptions()
 
 PROJECT_NAME = 'openet'
@@ -22,7 +25,7 @@ STORAGE_CLIENT = storage.Client(project=PROJECT_NAME)
 # logging.getLogger('urllib3').setLevel(logging.INFO)
 
 
-def main(states, overwrite_flag=False):
+def main(states, overwrite_flag=False, jobs=1):
     """Update field crop type values by state
 
     Parameters
@@ -30,6 +33,8 @@ def main(states, overwrite_flag=False):
     states : list
     overwrite_flag : bool, optional
         If True, overwrite existing crop type values with the new values.
+    jobs : int, optional
+        Number of states to process in parallel (the default is 1).
 
     Returns
     -------
@@ -50,10 +55,8 @@ def main(states, overwrite_flag=False):
     openet_id_field = 'OPENET_ID'
     pixel_count_field = 'PIXELCOUNT'
 
-    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-
     field_ws = os.getcwd()
-    shapefile_ws = os.path.join(field_ws, 'shapefiles')
+    store_ws = os.path.join(field_ws, 'parquet')
     stats_ws = os.path.join(field_ws, output_format.lower())
     if not os.path.isdir(stats_ws):
         os.makedirs(stats_ws)
@@ -72,6 +75,9 @@ def main(states, overwrite_flag=False):
         )))
     logging.info(f'States: {", ".join(states)}')
 
+    if jobs > 1 and len(states) > 1:
+        return run_state_jobs(main, states, jobs, store_ws, overwrite_flag=overwrite_flag)
+
 
     logging.info('\nGetting bucket file list')
     bucket = STORAGE_CLIENT.get_bucket(bucket_name)
@@ -87,26 +93,18 @@ def main(states, overwrite_flag=False):
 
     for state in states:
         logging.info(f'\nState: {state}')
-        shp_path = os.path.join(shapefile_ws, state, f'{state}.shp')
-        logging.debug(f'  {shp_path}')
-
-        if not os.path.isfile(shp_path):
-            logging.info('  State shapefile does not exist - skipping')
+        if not state_exists(store_ws, state):
+            logging.info('  State fields do not exist - skipping')
             continue
+        fields_df = read_fields(store_ws, state)
 
         # if clear_existing_values:
         if overwrite_flag:
             logging.info('\nClearing all PIXELCOUNT values')
-            shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-            input_ds = shp_driver.Open(shp_path, 1)
-            input_layer = input_ds.GetLayer()
-            for input_ftr in input_layer:
-                input_ftr.SetField(f'PIXELCOUNT', 0)
-                input_layer.SetFeature(input_ftr)
-            input_ds = None
+            fields_df[pixel_count_field] = 0
 
 
-        logging.info(f'Reading stats {output_format} and updating shapefile')
+        logging.info(f'Reading stats {output_format} and updating fields')
         # update_features = {}
 
         for utm_zone in range(10, 20):
@@ -158,22 +156,16 @@ def main(states, overwrite_flag=False):
                 if ftr[f'PIXELCOUNT'] is None:
                     logging.debug(f'  {ftr["OPENET_ID"]} - pixel count is None')
                     # pprint.pprint(ftr)
-                    input('ENTER')
+                    pause()
 
             logging.debug('  Writing field crop type values')
-            output_ds = shp_driver.Open(shp_path, 1)
-            output_layer = output_ds.GetLayer()
-            for output_ftr in output_layer:
-                output_id = output_ftr.GetField(openet_id_field)
-                try:
-                    output_ftr.SetField(
-                        pixel_count_field,
-                        int(round(update_features[output_id]['PIXELCOUNT']))
-                    )
-                except:
-                    continue
-                output_layer.SetFeature(output_ftr)
-            output_ds = None
+            pixel_counts = pd.to_numeric(fields_df[openet_id_field].map({
+                k: v['PIXELCOUNT'] for k, v in update_features.items()
+            }), errors='coerce')
+            mask = pixel_counts.notna()
+            fields_df.loc[mask, pixel_count_field] = pixel_counts[mask].round().astype(int)
+
+        write_fields(store_ws, state, fields_df)
 
 
 def arg_parse():
@@ -187,6 +179,9 @@ def arg_parse():
     parser.add_argument(
         '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--jobs', default=1, type=int,
+        help='Number of states to process in parallel')
     parser.add_argument(
         '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -199,4 +194,4 @@ if __name__ == '__main__':
     args = arg_parse()
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
-    main(states=args.states, overwrite_flag=args.overwrite)
+    main(states=args.states, overwrite_flag=args.overwrite, jobs=args.jobs)
@@ -0,0 +1,202 @@
+#--------------------------------
+# Name:         mgrs_state_table.py
+# Purpose:      Build the MGRS tile to state intersection table
+#--------------------------------
+
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import os
+
+import ee
+
+import openet.core.utils as utils
+
+logging.getLogger('earthengine-api').setLevel(logging.INFO)
+logging.getLogger('googleapiclient').setLevel(logging.INFO)
+
+# Increment if the structure of the table changes
+TABLE_VERSION = 1
+
+
+def main(overwrite_flag=False, gee_key_file=None):
+    """Build the MGRS tile to state intersection table
+
+    Parameters
+    ----------
+    overwrite_flag : bool, optional
+        If True, rebuild the table even if the inputs have not changed
+        (the default is False).
+    gee_key_file : str, None, optional
+        Earth Engine service account JSON key file (the default is None).
+
+    Returns
+    -------
+    None
+
+    """
+    # Importing here to avoid a circular import with the export tool
+    from crop_type_asset_mgrs_collection import mgrs_export_tiles
+
+    logging.info('\nBuild the MGRS tile to state intersection table')
+
+    # Hardcoded parameters
+    project_id = 'projects/openet/assets'
+    mgrs_ftr_coll_id = f'{project_id}/mgrs/global/era5land/zones'
+    states_coll_id = 'TIGER/2018/States'
+    states_name_property = 'STUSPS'
+    table_path = os.path.join(os.getcwd(), 'mgrs_state_table.json')
+
+    logging.info('\nInitializing Earth Engine')
+    if gee_key_file:
+        logging.info(f'  Using service account key file: {gee_key_file}')
+        ee.Initialize(ee.ServiceAccountCredentials('', key_file=gee_key_file))
+    else:
+        ee.Initialize()
+
+    export_list = mgrs_export_tiles(
+        study_area_coll_id=mgrs_ftr_coll_id,
+        mgrs_coll_id=mgrs_ftr_coll_id,
+    )
+
+    if overwrite_flag and os.path.isfile(table_path):
+        logging.info('\nRemoving existing table')
+        os.remove(table_path)
+
+    mgrs_states = load_mgrs_state_table(
+        table_path, export_list, mgrs_ftr_coll_id, states_coll_id, states_name_property,
+    )
+    for mgrs_tile, states in sorted(mgrs_states.items()):
+        logging.info(f'  {mgrs_tile}: {", ".join(states)}')
+
+
+def load_mgrs_state_table(
+        table_path,
+        export_list,
+        mgrs_coll_id,
+        states_coll_id,
+        states_name_property='STUSPS',
+        ):
+    """Read the MGRS tile to state table, rebuilding it if it is out of date
+
+    The table is rebuilt if it was built from different MGRS or state
+    collections or if either collection has been updated since the table was
+    built.  Any export tiles that are missing from the table are added.
+
+    Parameters
+    ----------
+    table_path : str
+        Table JSON file path.
+    export_list : list
+        MGRS tile export information from mgrs_export_tiles().
+    mgrs_coll_id : str
+        MGRS feature collection asset ID.
+    states_coll_id : str
+        States feature collection asset ID.
+    states_name_property : str, optional
+        State abbreviation property in the states collection
+        (the default is 'STUSPS').
+
+    Returns
+    -------
+    dict : sorted list of intersecting states keyed by MGRS tile
+
+    """
+    input_versions = {
+        'mgrs_coll_id': mgrs_coll_id,
+        'mgrs_update_time': ee.data.getAsset(mgrs_coll_id)['updateTime'],
+        'states_coll_id': states_coll_id,
+        'states_update_time': ee.data.getAsset(states_coll_id)['updateTime'],
+        'states_name_property': states_name_property,
+    }
+    table = None
+    if os.path.isfile(table_path):
+        with open(table_path) as f:
+            table = json.load(f)
+        if table.get('version') != TABLE_VERSION:
+            logging.info('  MGRS state table version has changed, rebuilding')
+            table = None
+        elif any(table.get(k) != v for k, v in input_versions.items()):
+            logging.info('  MGRS/state collections have changed, rebuilding table')
+            table = None
+
+    if table is None:
+        logging.info(f'  Building MGRS state table\n  {table_path}')
+        table = {'version': TABLE_VERSION, **input_versions, 'tiles': {}}
+
+    # Only compute the tiles that are not already in the table
+    missing_list = [
+        export_info for export_info in export_list
+        if export_info['index'].upper() not in table['tiles'].keys()
+    ]
+    if missing_list:
+        logging.info(f'  Adding {len(missing_list)} MGRS tiles to the state table')
+        table['tiles'].update(build_mgrs_state_table(
+            missing_list, states_coll_id, states_name_property
+        ))
+        table['date_built'] = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        with open(table_path, 'w') as f:
+            json.dump(table, f, indent=2, sort_keys=True)
+
+    return {k: v for k, v in table['tiles'].items()}
+
+
+def build_mgrs_state_table(export_list, states_coll_id, states_name_property='STUSPS'):
+    """Compute the states that intersect each MGRS tile extent
+
+    All of the tiles are computed in a single getInfo request.
+
+    Parameters
+    ----------
+    export_list : list
+        MGRS tile export information from mgrs_export_tiles().
+    states_coll_id : str
+        States feature collection asset ID.
+    states_name_property : str, optional
+        State abbreviation property in the states collection
+        (the default is 'STUSPS').
+
+    Returns
+    -------
+    dict : sorted list of intersecting states keyed by MGRS tile
+
+    """
+    states_coll = ee.FeatureCollection(states_coll_id)
+    mgrs_states = {}
+    for export_info in export_list:
+        mgrs_geom = ee.Geometry.Rectangle(
+            export_info['extent'], proj=export_info['crs'], geodesic=False
+        )
+        mgrs_states[export_info['index'].upper()] = (
+            states_coll.filterBounds(mgrs_geom)
+            .aggregate_array(states_name_property).distinct().sort()
+        )
+    return utils.get_info(ee.Dictionary(mgrs_states))
+
+
+def arg_parse():
+    """"""
+    parser = argparse.ArgumentParser(
+        description='Build the MGRS tile to state intersection table',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--key', type=utils.arg_valid_file, metavar='FILE',
+        help='JSON key file')
+    parser.add_argument(
+        '--overwrite', default=False, action='store_true',
+        help='Force rebuild of the table')
+    parser.add_argument(
+        '--debug', default=logging.INFO, const=logging.DEBUG,
+        help='Debug level logging', action='store_const', dest='loglevel')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    logging.basicConfig(level=args.loglevel, format='%(message)s')
+    logging.getLogger('googleapiclient').setLevel(logging.ERROR)
+
+    main(overwrite_flag=args.overwrite, gee_key_file=args.key)
@@ -0,0 +1,151 @@
+#--------------------------------
+# Name:         run_journal.py
+# Purpose:      Append-only journal of the export tool tile year states
+#--------------------------------
+
+from datetime import datetime, timezone
+import json
+import logging
+import os
+
+# Last journal events that don't need to be checked again when resuming
+SETTLED_EVENTS = ['completed', 'copied', 'skipped']
+
+
+class RunJournal:
+    """Append-only JSON lines journal of the planned and submitted exports
+
+    Each entry is flushed to disk as it is written so the journal is intact if
+    the tool is interrupted.  When resuming, the entries since the start of
+    the last run that was not a resume are read, and the last event for each
+    export ID is used to decide if the export needs to be evaluated again.
+    The task ID is journaled with each submitted export, so an export whose
+    task completed after the tool exited (the tool doesn't wait on the tasks
+    without a task limit) is also settled.
+
+    Parameters
+    ----------
+    journal_path : str
+        Journal file path.
+    resume : bool, optional
+        If True, read the state of the last run from the journal
+        (the default is False).
+    read_only : bool, optional
+        If True, entries are not written to the journal (the default is False).
+
+    """
+    def __init__(self, journal_path, resume=False, read_only=False):
+        self.journal_path = journal_path
+        self.read_only = read_only
+        self.events = {}
+        # Task ID of the last submitted task keyed by export ID
+        self.task_ids = {}
+        # Export manifest entries of the planned images keyed by image ID
+        self.manifest_entries = {}
+        if resume:
+            self._read()
+
+        # End an incomplete last line so the new entries can be read
+        if not read_only and os.path.isfile(journal_path) and os.path.getsize(journal_path):
+            with open(journal_path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+
+    def _read(self):
+        """Read the export states since the start of the last (non-resume) run"""
+        if not os.path.isfile(self.journal_path):
+            logging.info('  Journal does not exist, nothing to resume')
+            return
+        entries = []
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the tool was killed
+                    logging.debug('  Skipping incomplete journal entry')
+        run_starts = [
+            i for i, entry in enumerate(entries)
+            if entry['event'] == 'start' and not entry.get('resume')
+        ]
+        for entry in entries[run_starts[-1] if run_starts else 0:]:
+            if 'export_id' not in entry.keys():
+                continue
+            self.events[entry['export_id']] = entry['event']
+            if 'task_id' in entry.keys():
+                self.task_ids[entry['export_id']] = entry['task_id']
+            if 'manifest' in entry.keys():
+                self.manifest_entries[entry['image_id']] = entry['manifest']
+        logging.info(f'  Journal exports: {len(self.events)}')
+
+    def write(self, event, export_id=None, **kwargs):
+        """Append an entry to the journal
+
+        Parameters
+        ----------
+        event : str
+            "start", "end", "planned", "submitted", "completed", "failed",
+            "cancelled", "copied", or "skipped".
+        export_id : str, optional
+            Export task description.
+        kwargs : dict
+            Additional values to save in the entry.
+
+        Returns
+        -------
+        None
+
+        """
+        if export_id:
+            self.events[export_id] = event
+        if export_id and kwargs.get('task_id'):
+            self.task_ids[export_id] = kwargs['task_id']
+        if self.read_only:
+            return
+        entry = {
+            'time': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'event': event,
+            **({'export_id': export_id} if export_id else {}),
+            **kwargs,
+        }
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def task_state(self, export_id, state, task_id=None):
+        """Journal a task state change (for the ExportScheduler state_fn)"""
+        self.write(
+            'submitted' if state == 'READY' else state.lower(), export_id,
+            **({'task_id': task_id} if task_id else {}),
+        )
+
+    def settled(self, export_id, tasks={}, completed_tasks={}):
+        """Check if an export doesn't need to be evaluated again
+
+        Parameters
+        ----------
+        export_id : str
+            Export task description.
+        tasks : dict, optional
+            Active tasks keyed by description.  Submitted exports are
+            settled if the task is still active.
+        completed_tasks : dict, optional
+            Completed tasks keyed by description.  Submitted exports are
+            also settled if the journaled task has completed.
+
+        Returns
+        -------
+        bool
+
+        """
+        event = self.events.get(export_id)
+        if event in SETTLED_EVENTS:
+            return True
+        elif event != 'submitted':
+            return False
+        elif export_id in tasks.keys():
+            return True
+        task_id = self.task_ids.get(export_id)
+        return bool(task_id) and completed_tasks.get(export_id, {}).get('id') == task_id
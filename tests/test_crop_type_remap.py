@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crop_type_remap import RemapLUT, load_remap_table
+
+
+def test_remap_identity():
+    remap = RemapLUT([[1, 5], [2, 0]], identity=True)
+    assert remap.remap(np.array([0, 1, 2, 3, 255], dtype=np.uint8)).tolist() == [0, 5, 0, 3, 255]
+    remap_in, remap_out = remap.ee_remap_args()
+    assert len(remap_in) == 255
+    assert remap_out[:3] == [5, 0, 3]
+
+
+def test_remap_non_identity():
+    remap = RemapLUT([[1, 5], [2, 0]], identity=False)
+    assert remap.remap(np.array([0, 1, 2, 3, 255], dtype=np.uint8)).tolist() == [0, 5, 0, 0, 0]
+    assert remap.ee_remap_args() == ([1, 2], [5, 0])
+    assert remap.hash != RemapLUT([[1, 5], [2, 0]], identity=True).hash
+
+
+def test_load_remap_table_hash(tmp_path):
+    remap_path = tmp_path / 'remap.csv'
+    remap_path.write_text('# Test remap\nIN,OUT\n1,5\n2,6\n')
+    remap = load_remap_table(str(remap_path), identity=False)
+    assert remap.table == {1: 5, 2: 6}
+    assert load_remap_table(str(remap_path), identity=False) is remap
+
+    # Changing the table reloads it and changes the hash
+    remap_path.write_text('# Test remap\nIN,OUT\n1,5\n2,7\n')
+    new_remap = load_remap_table(str(remap_path), identity=False)
+    assert new_remap.table == {1: 5, 2: 7}
+    assert new_remap.hash != remap.hash
+
+    # A comment change doesn't change the lookup hash
+    remap_path.write_text('# Updated test remap\nIN,OUT\n1,5\n2,7\n')
+    assert load_remap_table(str(remap_path), identity=False).hash == new_remap.hash
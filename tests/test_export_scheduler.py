@@ -0,0 +1,166 @@
+import os
+import sys
+import types
+
+import pytest
+
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The scheduler only uses Earth Engine through the start/status functions,
+#   so minimal modules are used if the packages are not installed
+try:
+    import ee
+except ImportError:
+    ee = types.ModuleType('ee')
+    ee.data = types.SimpleNamespace(getTaskStatus=None)
+    sys.modules['ee'] = ee
+try:
+    import openet.core.utils
+except ImportError:
+    openet = types.ModuleType('openet')
+    openet.core = types.ModuleType('openet.core')
+    openet.core.utils = types.ModuleType('openet.core.utils')
+    openet.core.utils.ee_task_start = None
+    openet.core.utils.delay_task = lambda delay_time: None
+    sys.modules['openet'] = openet
+    sys.modules['openet.core'] = openet.core
+    sys.modules['openet.core.utils'] = openet.core.utils
+
+import export_scheduler
+from export_scheduler import ExportScheduler
+
+
+class FakeTask:
+    """Unstarted export task (the ee.batch.Task attributes the scheduler uses)"""
+    def __init__(self, export_id):
+        self.export_id = export_id
+        self.id = None
+
+
+class FakeEarthEngine:
+    """Local fake of the ee.batch task start and ee.data task status calls
+
+    Each started task is RUNNING for "polls" status requests and then
+    finishes with the next state in the outcome list of its export
+    (COMPLETED if the list is empty).
+
+    """
+    def __init__(self, outcomes={}, polls=1):
+        self.outcomes = {k: list(v) for k, v in outcomes.items()}
+        self.polls = polls
+        self.starts = []
+        self.running = {}
+        self.max_running = 0
+
+    def build_fn(self, export_id):
+        return lambda: FakeTask(export_id)
+
+    def start(self, task):
+        task.id = f'TASK_{len(self.starts)}'
+        self.starts.append(task.export_id)
+        outcomes = self.outcomes.get(task.export_id, [])
+        self.running[task.id] = [self.polls, outcomes.pop(0) if outcomes else 'COMPLETED']
+        self.max_running = max(self.max_running, len(self.running))
+
+    def status(self, task_ids):
+        statuses = []
+        for task_id in task_ids:
+            polls, state = self.running[task_id]
+            if polls > 0:
+                self.running[task_id][0] -= 1
+                statuses.append({'id': task_id, 'state': 'RUNNING'})
+            else:
+                del self.running[task_id]
+                statuses.append({'id': task_id, 'state': state, 'error_message': 'fake'})
+        return statuses
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the poll sleep times instead of sleeping"""
+    sleeps = []
+    monkeypatch.setattr(export_scheduler.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def scheduler(fake, **kwargs):
+    return ExportScheduler(start_fn=fake.start, status_fn=fake.status, workers=2, **kwargs)
+
+
+def test_max_tasks_limit(sleeps):
+    fake = FakeEarthEngine()
+    export_ids = [f'export_{i}' for i in range(10)]
+    tasks = scheduler(fake, max_tasks=3)
+    for export_id in export_ids:
+        tasks.submit(export_id, fake.build_fn(export_id))
+    states = tasks.run()
+    assert fake.max_running == 3
+    assert sorted(fake.starts) == sorted(export_ids)
+    assert states == {export_id: 'COMPLETED' for export_id in export_ids}
+
+
+def test_no_max_tasks_does_not_wait(sleeps):
+    fake = FakeEarthEngine()
+    tasks = scheduler(fake, max_tasks=0)
+    for i in range(5):
+        tasks.submit(f'export_{i}', fake.build_fn(f'export_{i}'))
+    states = tasks.run()
+    assert len(fake.starts) == 5
+    assert sleeps == []
+    assert set(states.values()) == {'READY'}
+
+
+def test_failed_task_is_resubmitted(sleeps):
+    fake = FakeEarthEngine(outcomes={'export_0': ['FAILED', 'COMPLETED']})
+    journal = []
+    tasks = scheduler(fake, max_tasks=2, max_retries=2,
+                      state_fn=lambda export_id, state, task_id: journal.append([export_id, state]))
+    tasks.submit('export_0', fake.build_fn('export_0'))
+    states = tasks.run()
+    assert fake.starts == ['export_0', 'export_0']
+    assert states == {'export_0': 'COMPLETED'}
+    assert journal == [
+        ['export_0', 'READY'], ['export_0', 'FAILED'],
+        ['export_0', 'READY'], ['export_0', 'COMPLETED'],
+    ]
+
+
+def test_retry_limit(sleeps):
+    fake = FakeEarthEngine(outcomes={'export_0': ['FAILED'] * 5})
+    tasks = scheduler(fake, max_tasks=2, max_retries=2)
+    tasks.submit('export_0', fake.build_fn('export_0'))
+    tasks.submit('export_1', fake.build_fn('export_1'))
+    states = tasks.run()
+    # The first attempt plus two retries
+    assert fake.starts.count('export_0') == 3
+    assert states == {'export_0': 'FAILED', 'export_1': 'COMPLETED'}
+
+
+def test_start_exception_is_retried(sleeps):
+    fake = FakeEarthEngine()
+    start_fn = fake.start
+    errors = []
+
+    def flaky_start(task):
+        if not errors:
+            errors.append(task.export_id)
+            raise Exception('quota exceeded')
+        start_fn(task)
+
+    fake.start = flaky_start
+    tasks = scheduler(fake, max_tasks=1, max_retries=1)
+    tasks.submit('export_0', fake.build_fn('export_0'))
+    assert tasks.run() == {'export_0': 'COMPLETED'}
+    assert errors == ['export_0']
+
+
+def test_poll_backoff(sleeps):
+    # The first task is running for 4 polls, so the poll time doubles up to
+    #   the maximum, and it resets to the minimum once the task finishes
+    fake = FakeEarthEngine(polls=4)
+    tasks = scheduler(fake, max_tasks=1, poll_min=1, poll_max=4)
+    tasks.submit('export_0', fake.build_fn('export_0'))
+    tasks.submit('export_1', fake.build_fn('export_1'))
+    tasks.run()
+    assert sleeps == [1, 2, 4, 4, 4, 1, 2, 4, 4, 4]
@@ -0,0 +1,122 @@
+import os
+import sys
+import types
+
+import pandas as pd
+import pytest
+import shapely
+
+# Field tools in the fields folder
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fields'
+))
+
+# The store only uses GDAL for the shapefile reading/writing, so minimal
+#   modules are used if the package is not installed
+try:
+    from osgeo import ogr
+except ImportError:
+    osgeo = types.ModuleType('osgeo')
+    osgeo.ogr = types.ModuleType('osgeo.ogr')
+    osgeo.ogr.UseExceptions = lambda: None
+    osgeo.osr = types.ModuleType('osgeo.osr')
+    sys.modules['osgeo'] = osgeo
+    sys.modules['osgeo.ogr'] = osgeo.ogr
+    sys.modules['osgeo.osr'] = osgeo.osr
+
+import field_store
+from field_store import read_fields, state_metadata, sync_shapefile, update_fields, write_fields
+
+CRS = {'id': {'authority': 'EPSG', 'code': 5070}}
+
+
+def fields_df(fields):
+    """Build a fields dataframe from [id, mgrs_tile, xmin, ymin] rows"""
+    return pd.DataFrame({
+        'OPENET_ID': [f[0] for f in fields],
+        'MGRS_TILE': [f[1] for f in fields],
+        'CROP_2021': [1] * len(fields),
+        'CROP_2020': [2] * len(fields),
+        'geometry': [
+            shapely.to_wkb(shapely.box(f[2], f[3], f[2] + 10, f[3] + 10)) for f in fields
+        ],
+    })
+
+
+@pytest.fixture
+def store_ws(tmp_path):
+    write_fields(str(tmp_path), 'CA', fields_df([
+        ['CA_1', '10SEG', 0, 0],
+        ['CA_2', '10SEG', 100, 100],
+        ['CA_3', '11SKA', 1000, 1000],
+    ]), crs=CRS, field_widths={'OPENET_ID': [24, 0]})
+    return str(tmp_path)
+
+
+def test_write_read_round_trip(store_ws):
+    output_df = read_fields(store_ws, 'CA').sort_values('OPENET_ID')
+    assert output_df['OPENET_ID'].tolist() == ['CA_1', 'CA_2', 'CA_3']
+    assert output_df['CROP_2020'].tolist() == [2, 2, 2]
+    assert shapely.from_wkb(output_df['geometry'].iloc[0]).bounds == (0, 0, 10, 10)
+    schema, geo, field_widths = state_metadata(store_ws, 'CA')
+    assert geo['columns']['geometry']['crs'] == CRS
+    assert field_widths == {'OPENET_ID': [24, 0]}
+
+
+def test_write_crop_column_order(store_ws):
+    fields = read_fields(store_ws, 'CA')
+    fields['CROP_2019'] = 0
+    fields['CSRC_2019'] = ''
+    write_fields(store_ws, 'CA', fields)
+    assert read_fields(store_ws, 'CA').columns.tolist() == [
+        'OPENET_ID', 'MGRS_TILE', 'geometry',
+        'CROP_2019', 'CROP_2020', 'CROP_2021', 'CSRC_2019',
+    ]
+
+
+def test_read_zone_bbox_filter(store_ws):
+    assert read_fields(store_ws, 'CA', mgrs_zones=['11S'])['OPENET_ID'].tolist() == ['CA_3']
+    assert read_fields(
+        store_ws, 'CA', columns=['OPENET_ID'], bbox=[95, 95, 200, 200]
+    )['OPENET_ID'].tolist() == ['CA_2']
+    assert read_fields(
+        store_ws, 'CA', mgrs_zones=['10S'], bbox=[900, 900, 2000, 2000]
+    ).empty
+
+
+def test_update_keeps_integer_types(store_ws):
+    # Only setting some of the fields converts the pandas column to floats
+    update_fields(store_ws, 'CA', pd.DataFrame({'CROP_2020': {'CA_1': 5}}))
+    schema = state_metadata(store_ws, 'CA')[0]
+    assert schema.field('CROP_2020').type == 'int64'
+    output_df = read_fields(store_ws, 'CA').set_index('OPENET_ID')
+    assert output_df['CROP_2020'].to_dict() == {'CA_1': 5, 'CA_2': 2, 'CA_3': 2}
+
+
+def test_sync_shapefile(store_ws, monkeypatch):
+    shp_df = fields_df([
+        ['CA_2', '10SEG', 200, 200],
+        ['CA_3', '11SKA', 1000, 1000],
+        ['CA_4', '11SKA', 2000, 2000],
+    ])
+    shp_df['CROP_2020'] = 9
+    shp_df = shp_df.drop(columns=['CROP_2021'])
+    shp_df['SOURCECODE'] = ['A', 'B', 'C']
+    monkeypatch.setattr(
+        field_store, 'read_shapefile',
+        lambda shp_path, batch_size: (shp_df, CRS, {'SOURCECODE': [80, 0]})
+    )
+    counts = sync_shapefile(
+        'CA.shp', store_ws, 'CA', columns=['SOURCECODE'], defaults={'CROP_2021': 0}
+    )
+    assert counts == {'removed': 1, 'updated': 1, 'added': 1}
+
+    output_df = read_fields(store_ws, 'CA').set_index('OPENET_ID').sort_index()
+    assert output_df.index.tolist() == ['CA_2', 'CA_3', 'CA_4']
+    assert output_df['SOURCECODE'].tolist() == ['A', 'B', 'C']
+    # The existing store crop types are kept and the new fields get the
+    #   shapefile values (or the defaults for the columns it doesn't have)
+    assert output_df['CROP_2020'].tolist() == [2, 2, 9]
+    assert output_df['CROP_2021'].tolist() == [1, 1, 0]
+    assert shapely.from_wkb(output_df.loc['CA_2', 'geometry']).bounds == (200, 200, 210, 210)
+    assert state_metadata(store_ws, 'CA')[2] == {'OPENET_ID': [24, 0], 'SOURCECODE': [80, 0]}
@@ -0,0 +1,73 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+import shapely
+
+# Field tools in the fields folder
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fields'
+))
+
+# The zone assignment only uses GDAL for the shapefile reading, so minimal
+#   modules are used if the package is not installed
+try:
+    from osgeo import ogr
+except ImportError:
+    osgeo = types.ModuleType('osgeo')
+    osgeo.ogr = types.ModuleType('osgeo.ogr')
+    osgeo.ogr.UseExceptions = lambda: None
+    osgeo.osr = types.ModuleType('osgeo.osr')
+    sys.modules['osgeo'] = osgeo
+    sys.modules['osgeo.ogr'] = osgeo.ogr
+    sys.modules['osgeo.osr'] = osgeo.osr
+
+import field_zones
+from field_zones import assign_zones
+
+
+@pytest.fixture
+def zones():
+    # Zone A only covers the center of the field and zone B covers most of it
+    zone_geoms = np.array([shapely.box(4, 4, 6, 6), shapely.box(6, -100, 100, 100)])
+    zone_values = np.array(['A', 'B'], dtype=object)
+    return shapely.STRtree(zone_geoms), zone_geoms, zone_values
+
+
+def test_assign_zones_overlap(zones):
+    geoms = np.array([shapely.box(0, 0, 10, 10), shapely.box(50, 0, 60, 10)])
+    assert assign_zones(geoms, *zones, method='overlap').tolist() == ['B', 'B']
+
+
+def test_assign_zones_centroid(zones):
+    geoms = np.array([shapely.box(0, 0, 10, 10), shapely.box(50, 0, 60, 10)])
+    assert assign_zones(geoms, *zones, method='centroid').tolist() == ['A', 'B']
+
+
+@pytest.mark.parametrize('method', ['overlap', 'centroid'])
+def test_assign_zones_no_zone(zones, method):
+    # Fields outside all of the zones and fields without a geometry get no zone
+    geoms = np.array([shapely.box(-50, -50, -40, -40), None, shapely.box(50, 0, 60, 10)])
+    assert assign_zones(geoms, *zones, method=method).tolist() == ['', '', 'B']
+
+
+def test_assign_zones_method():
+    with pytest.raises(ValueError):
+        assign_zones(np.array([]), None, None, None, method='nearest')
+
+
+def test_assign_batch(zones, monkeypatch):
+    tree, zone_geoms, zone_values = zones
+    monkeypatch.setattr(field_zones, '_ZONE_TREES', {})
+    field_zones._init_zone_trees({
+        'ZONE': [list(shapely.to_wkb(zone_geoms)), zone_values.tolist()]
+    })
+    # The bowtie polygon is invalid and is fixed before the intersection
+    bowtie = shapely.Polygon([[0, 0], [10, 10], [10, 0], [0, 10]])
+    fids, values = field_zones._assign_batch(
+        np.array([3, 7]), [shapely.to_wkb(bowtie), None]
+    )
+    assert fids.tolist() == [3, 7]
+    assert values['ZONE'].tolist() == ['B', '']
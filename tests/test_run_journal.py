@@ -0,0 +1,48 @@
+import os
+import sys
+
+# Shared tools in the repository root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_journal import RunJournal
+
+
+def test_resume_settled(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(journal_path)
+    journal.write('start', resume=False)
+    for export_id in ['export_0', 'export_1', 'export_2', 'export_3']:
+        journal.write('planned', export_id)
+    journal.write('skipped', 'export_0')
+    journal.task_state('export_1', 'READY', 'TASK_1')
+    journal.task_state('export_2', 'READY', 'TASK_2')
+
+    resumed = RunJournal(journal_path, resume=True)
+    assert resumed.task_ids == {'export_1': 'TASK_1', 'export_2': 'TASK_2'}
+    assert resumed.settled('export_0')
+    # The submitted exports are settled if the task is still active or if
+    #   the journaled task completed after the tool exited
+    tasks = {'export_1': {'id': 'TASK_1', 'state': 'RUNNING'}}
+    completed_tasks = {'export_2': {'id': 'TASK_2', 'state': 'COMPLETED'}}
+    assert resumed.settled('export_1', tasks, completed_tasks)
+    assert resumed.settled('export_2', tasks, completed_tasks)
+    assert not resumed.settled('export_2', tasks, {'export_2': {'id': 'TASK_0'}})
+    assert not resumed.settled('export_2')
+    assert not resumed.settled('export_3', tasks, completed_tasks)
+
+
+def test_resume_last_run(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(journal_path)
+    journal.write('start', resume=False)
+    journal.task_state('export_0', 'READY', 'TASK_0')
+    journal.task_state('export_0', 'COMPLETED', 'TASK_0')
+    journal.write('start', resume=False)
+    journal.write('planned', 'export_1')
+    journal.write('start', resume=True)
+    journal.task_state('export_1', 'READY', 'TASK_1')
+
+    # Only the entries since the start of the last non-resume run are read
+    resumed = RunJournal(journal_path, resume=True)
+    assert resumed.events == {'export_1': 'submitted'}
+    assert resumed.task_ids == {'export_1': 'TASK_1'}